@@ -0,0 +1,43 @@
+"""complaint number sequence and per-municipality counters
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - Create complaint_number_seq, started after the highest numeric complaint number
+  - Create complaint_number_series table (per-municipality counters)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE SEQUENCE complaint_number_seq")
+    # One-time scan so the sequence continues the existing numbering
+    op.execute(
+        "SELECT setval('complaint_number_seq', "
+        "COALESCE((SELECT MAX(CAST(complaint_number AS BIGINT)) FROM service_requests "
+        "WHERE complaint_number ~ '^\\d+$'), 0) + 1, false)"
+    )
+
+    op.create_table(
+        "complaint_number_series",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column("municipality_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("municipalities.id"), nullable=False),
+        sa.Column("last_value", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.UniqueConstraint("municipality_id", name="uq_complaint_number_series_municipality_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("complaint_number_series")
+    op.execute("DROP SEQUENCE complaint_number_seq")
@@ -0,0 +1,29 @@
+"""composite index for public request timelines
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - Add index on request_updates (request_id, is_internal, created_at)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0013"
+down_revision: Union[str, None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_request_updates_request_id_is_internal_created_at",
+        "request_updates",
+        ["request_id", "is_internal", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_request_updates_request_id_is_internal_created_at", table_name="request_updates")
@@ -0,0 +1,40 @@
+"""link duplicate complaints to the request they were merged into
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - Add service_requests.duplicate_of_id (self-referencing FK, indexed)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0016"
+down_revision: Union[str, None] = "0015"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "service_requests",
+        sa.Column("duplicate_of_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_foreign_key(
+        "fk_service_requests_duplicate_of_id",
+        "service_requests",
+        "service_requests",
+        ["duplicate_of_id"],
+        ["id"],
+    )
+    op.create_index("ix_service_requests_duplicate_of_id", "service_requests", ["duplicate_of_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_service_requests_duplicate_of_id", table_name="service_requests")
+    op.drop_constraint("fk_service_requests_duplicate_of_id", "service_requests", type_="foreignkey")
+    op.drop_column("service_requests", "duplicate_of_id")
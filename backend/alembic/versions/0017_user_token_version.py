@@ -0,0 +1,29 @@
+"""token version for revoking issued access tokens
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - Add users.token_version (INTEGER NOT NULL DEFAULT 0)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0017"
+down_revision: Union[str, None] = "0016"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "token_version")
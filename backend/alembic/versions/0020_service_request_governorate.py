@@ -0,0 +1,49 @@
+"""denormalize governorate_id onto service_requests
+
+Revision ID: 0020
+Revises: 0019
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - Add service_requests.governorate_id (FK governorates, indexed)
+  - Backfill it from municipalities.governorate_id
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0020"
+down_revision: Union[str, None] = "0019"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "service_requests",
+        sa.Column("governorate_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE service_requests AS sr
+        SET governorate_id = m.governorate_id
+        FROM municipalities AS m
+        WHERE m.id = sr.municipality_id
+        """
+    )
+    op.create_foreign_key(
+        "fk_service_requests_governorate_id",
+        "service_requests",
+        "governorates",
+        ["governorate_id"],
+        ["id"],
+    )
+    op.create_index("ix_service_requests_governorate_id", "service_requests", ["governorate_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_service_requests_governorate_id", table_name="service_requests")
+    op.drop_constraint("fk_service_requests_governorate_id", "service_requests", type_="foreignkey")
+    op.drop_column("service_requests", "governorate_id")
@@ -0,0 +1,57 @@
+"""composite and partial indexes for the hot service_requests queries
+
+Revision ID: 0021
+Revises: 0020
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - (governorate_id, status, created_at), (municipality_id, status, created_at)
+    and (district_id, status, created_at): scope + status filters, newest first
+  - sla_deadline over open requests only (closed_at IS NULL): overdue counts
+  - closed_at: monthly report and archive ranges
+
+Indexes are built with CREATE INDEX CONCURRENTLY so writes to
+service_requests are not blocked while they build; this runs outside the
+migration transaction.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0021"
+down_revision: Union[str, None] = "0020"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_service_requests_governorate_status_created", ["governorate_id", "status", "created_at"], None),
+    ("ix_service_requests_municipality_status_created", ["municipality_id", "status", "created_at"], None),
+    ("ix_service_requests_district_status_created", ["district_id", "status", "created_at"], None),
+    ("ix_service_requests_open_sla_deadline", ["sla_deadline"], "closed_at IS NULL"),
+    ("ix_service_requests_closed_at", ["closed_at"], None),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name,
+                "service_requests",
+                columns,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name="service_requests",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
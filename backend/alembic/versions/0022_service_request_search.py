@@ -0,0 +1,127 @@
+"""Arabic-normalized search column for service requests
+
+Revision ID: 0022
+Revises: 0021
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - Enable pg_trgm
+  - Add normalize_arabic(text): drops diacritics and tatweel, folds alef
+    (أ إ آ ٱ → ا), yaa (ى → ي), taa marbuta (ة → ه), hamza carriers
+    (ؤ → و, ئ → ي) and Arabic-Indic digits, lower-cases, collapses spaces
+  - Add service_requests.search_text over the complaint number, tracking
+    code, description and address, kept current by a BEFORE INSERT/UPDATE
+    trigger
+  - Backfill existing rows in committed batches
+  - Trigram GIN index on search_text (built concurrently)
+
+The column is added nullable with no default, so ADD COLUMN only touches the
+catalog. The backfill walks the primary key and commits every batch, so row
+locks are short and no long transaction holds back vacuum. A generated column would instead rewrite
+the table under an ACCESS EXCLUSIVE lock.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0022"
+down_revision: Union[str, None] = "0021"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_DIACRITICS = "".join(chr(c) for c in range(0x064B, 0x0653)) + "ٰـ"
+_FOLD_FROM = "أإآٱىةؤئ٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹"
+_FOLD_TO = "اااايهوي01234567890123456789"
+
+NORMALIZE_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION normalize_arabic(value text) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT btrim(regexp_replace(
+        lower(translate(regexp_replace(value, '[{_DIACRITICS}]', '', 'g'), '{_FOLD_FROM}', '{_FOLD_TO}')),
+        '\\s+', ' ', 'g'
+    ))
+$$
+"""
+
+SEARCH_TEXT = (
+    "normalize_arabic(coalesce({row}complaint_number, '') || ' ' || {row}tracking_code || ' ' "
+    "|| {row}description || ' ' || coalesce({row}address_text, ''))"
+)
+
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION service_requests_search_text() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_text := {SEARCH_TEXT.format(row="NEW.")};
+    RETURN NEW;
+END
+$$
+"""
+
+TRIGGER = """
+CREATE TRIGGER service_requests_search_text
+BEFORE INSERT OR UPDATE OF complaint_number, tracking_code, description, address_text
+ON service_requests
+FOR EACH ROW EXECUTE FUNCTION service_requests_search_text()
+"""
+
+BACKFILL_BATCH = 5000
+
+# Walks the primary key in batches, committing each one (COMMIT inside DO
+# needs the block to run outside a transaction, i.e. in autocommit)
+BACKFILL = f"""
+DO $$
+DECLARE
+    last_id uuid := '00000000-0000-0000-0000-000000000000';
+    next_id uuid;
+BEGIN
+    LOOP
+        WITH batch AS (
+            SELECT id FROM service_requests WHERE id > last_id ORDER BY id LIMIT {BACKFILL_BATCH}
+        ), filled AS (
+            UPDATE service_requests r
+            SET search_text = {SEARCH_TEXT.format(row="r.")}
+            FROM batch WHERE r.id = batch.id
+        )
+        SELECT id INTO next_id FROM batch ORDER BY id DESC LIMIT 1;
+        EXIT WHEN next_id IS NULL;
+        last_id := next_id;
+        COMMIT;
+    END LOOP;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(NORMALIZE_FUNCTION)
+    op.add_column("service_requests", sa.Column("search_text", sa.Text(), nullable=True))
+    op.execute(TRIGGER_FUNCTION)
+    op.execute(TRIGGER)
+    with op.get_context().autocommit_block():
+        op.execute(BACKFILL)
+        op.create_index(
+            "ix_service_requests_search_text_trgm",
+            "service_requests",
+            ["search_text"],
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_service_requests_search_text_trgm",
+            table_name="service_requests",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.execute("DROP TRIGGER IF EXISTS service_requests_search_text ON service_requests")
+    op.execute("DROP FUNCTION IF EXISTS service_requests_search_text()")
+    op.drop_column("service_requests", "search_text")
+    op.execute("DROP FUNCTION IF EXISTS normalize_arabic(text)")
@@ -0,0 +1,55 @@
+"""keyset pagination indexes for the admin request list
+
+Revision ID: 0023
+Revises: 0022
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - (governorate_id, created_at, id), (municipality_id, created_at, id)
+    and (district_id, created_at, id): the default newest-first list of each
+    role's scope, seekable by cursor without a status filter
+  - (updated_at, id) and (sla_deadline, id): the other sortable columns
+
+Indexes are built with CREATE INDEX CONCURRENTLY so writes to
+service_requests are not blocked while they build; this runs outside the
+migration transaction.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0023"
+down_revision: Union[str, None] = "0022"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_service_requests_governorate_created_id", ["governorate_id", "created_at", "id"]),
+    ("ix_service_requests_municipality_created_id", ["municipality_id", "created_at", "id"]),
+    ("ix_service_requests_district_created_id", ["district_id", "created_at", "id"]),
+    ("ix_service_requests_updated_id", ["updated_at", "id"]),
+    ("ix_service_requests_sla_deadline_id", ["sla_deadline", "id"]),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(
+                name,
+                "service_requests",
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name="service_requests",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
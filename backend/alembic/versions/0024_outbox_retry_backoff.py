@@ -0,0 +1,46 @@
+"""outbox retry backoff
+
+Revision ID: 0024
+Revises: 0023
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - outbox_events.next_attempt_at: a failed event is not picked up again
+    before this time (existing rows are due immediately)
+  - The pending index is keyed on next_attempt_at, the column the worker
+    now filters and orders by
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0024"
+down_revision: Union[str, None] = "0023"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "outbox_events",
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.drop_index("ix_outbox_events_pending", table_name="outbox_events")
+    op.create_index(
+        "ix_outbox_events_pending",
+        "outbox_events",
+        ["next_attempt_at"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_events_pending", table_name="outbox_events")
+    op.create_index(
+        "ix_outbox_events_pending",
+        "outbox_events",
+        ["created_at"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+    op.drop_column("outbox_events", "next_attempt_at")
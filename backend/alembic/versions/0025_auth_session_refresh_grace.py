@@ -0,0 +1,29 @@
+"""previous refresh-token hash for the rotation grace window
+
+Revision ID: 0025
+Revises: 0024
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - auth_sessions.previous_refresh_token_hash and rotated_at: the secret a
+    refresh replaced stays valid for refresh_token_reuse_grace_seconds
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0025"
+down_revision: Union[str, None] = "0024"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("auth_sessions", sa.Column("previous_refresh_token_hash", sa.String(length=64), nullable=True))
+    op.add_column("auth_sessions", sa.Column("rotated_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("auth_sessions", "rotated_at")
+    op.drop_column("auth_sessions", "previous_refresh_token_hash")
@@ -0,0 +1,33 @@
+"""complaint number series prefix
+
+Revision ID: 0026
+Revises: 0025
+Create Date: 2026-10-17 00:00:00.000000
+
+Changes:
+  - complaint_number_series.prefix: the leading part of every number in the
+    series, stored instead of being formatted from the row id. Existing rows
+    keep the two-digit prefix their numbers were issued with; new rows take
+    theirs from the municipality id (see app.numbering)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0026"
+down_revision: Union[str, None] = "0025"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("complaint_number_series", sa.Column("prefix", sa.String(16), nullable=True))
+    op.execute("UPDATE complaint_number_series SET prefix = lpad(id::text, greatest(length(id::text), 2), '0')")
+    op.alter_column("complaint_number_series", "prefix", nullable=False)
+    op.create_unique_constraint("uq_complaint_number_series_prefix", "complaint_number_series", ["prefix"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_complaint_number_series_prefix", "complaint_number_series", type_="unique")
+    op.drop_column("complaint_number_series", "prefix")
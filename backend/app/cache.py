@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import CacheVersion
+
+settings = get_settings()
+
+_caches: Dict[str, List["VersionedCache"]] = {}
+_lru_caches: Dict[str, "LRUCache"] = {}
+
+
+def read_cache_version(db: Session, name: str) -> int:
+    version = db.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+    return version or 0
+
+
+def bump_cache_version(db: Session, name: str) -> None:
+    """Increment `name`'s version in the caller's transaction.
+
+    Caches in this worker are marked stale once the caller commits (marking
+    them earlier would let a concurrent reader re-cache the old version);
+    other workers pick the new version up on their next recheck.
+    """
+    stmt = pg_insert(CacheVersion).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CacheVersion.name],
+        set_={"version": CacheVersion.version + 1},
+    )
+    db.execute(stmt)
+    db.info.setdefault("bumped_caches", set()).add(name)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _mark_stale_after_commit(session: Session) -> None:
+    for name in session.info.pop("bumped_caches", ()):
+        for cache in _caches.get(name, []):
+            cache.mark_stale()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_bumps_after_rollback(session: Session) -> None:
+    session.info.pop("bumped_caches", None)
+
+
+@dataclass
+class CacheEntry:
+    version: int
+    etag: str
+    body: bytes
+    checked_at: float
+
+
+class VersionedCache:
+    """One rendered payload, revalidated against a DB version counter.
+
+    Within ``cache_version_recheck_seconds`` of the last check the entry is
+    served without touching the database at all.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._entry: CacheEntry | None = None
+        self._lock = threading.Lock()
+        _caches.setdefault(name, []).append(self)
+
+    def get(self, db: Session, render: Callable[[Session], bytes]) -> CacheEntry:
+        now = time.monotonic()
+        entry = self._entry
+        if entry is not None and now - entry.checked_at < settings.cache_version_recheck_seconds:
+            return entry
+        with self._lock:
+            entry = self._entry
+            if entry is not None and now - entry.checked_at < settings.cache_version_recheck_seconds:
+                return entry
+            version = read_cache_version(db, self.name)
+            if entry is not None and entry.version == version:
+                entry.checked_at = now
+                return entry
+            entry = CacheEntry(
+                version=version,
+                etag=f'"{self.name}-{version}"',
+                body=render(db),
+                checked_at=now,
+            )
+            self._entry = entry
+            return entry
+
+    def mark_stale(self) -> None:
+        entry = self._entry
+        if entry is not None:
+            entry.checked_at = float("-inf")
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Evaluate an If-None-Match header against `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, name: str, maxsize: int, ttl_seconds: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so a load that raced a write is not stored
+        self.generation = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        _lru_caches[name] = self
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """Store `value`; skipped if anything was invalidated since `generation` was read."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self.generation += 1
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _lru_caches.items()}
@@ -1,24 +1,151 @@
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 from functools import lru_cache
-from typing import Union
+from typing import Optional, Union
 
 
 class Settings(BaseSettings):
     database_url: str = "postgresql://postgres:postgres@db:5432/municipal_requests"
     secret_key: str = "change-me-in-production-use-a-strong-random-key"
     algorithm: str = "HS256"
-    access_token_expire_minutes: int = 480  # 8 hours
+    access_token_expire_minutes: int = 15
+    refresh_token_expire_days: int = 14
+    # The secret a refresh replaced stays valid this long, so two tabs (or a
+    # retried request) racing on one rotation do not look like token theft
+    refresh_token_reuse_grace_seconds: int = 30
+    # How often each worker's background thread reloads the revoked-session
+    # set (events keep it current in between)
+    session_revocation_resync_seconds: float = 60.0
+
+    # Connection pool, per worker. Each worker opens up to
+    # (db_pool_size + db_max_overflow) + (db_async_pool_size +
+    # db_async_max_overflow) + rate_limit_pool_size + 1 LISTEN connection to
+    # the primary: 18 with these defaults, 36 for the two production workers. Keep
+    # workers * that total below Postgres max_connections (100 by default).
+    # Request threads beyond the pool wait up to db_pool_timeout_seconds;
+    # watch timeouts/max_wait_ms in /internal/metrics before raising it
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_pool_timeout_seconds: float = 10.0
+    db_pool_pre_ping: bool = True
+    db_pool_recycle_seconds: int = 1800
+    # Server-side cap per statement; 0 disables it
+    db_statement_timeout_ms: int = 30000
+    # Async engine for the read-heavy admin endpoints (asyncpg). The URL
+    # defaults to database_url with the asyncpg driver
+    async_database_url: str = ""
+    db_async_pool_size: int = 5
+    db_async_max_overflow: int = 0
+
+    # Read replica for dashboards, reports and exports; disabled when empty.
+    # Reads fall back to the primary when the replica lags past the limit or
+    # has not yet replayed the caller's last write (X-Read-After token)
+    replica_database_url: str = ""
+    replica_max_lag_seconds: float = 5.0
+    replica_status_interval_seconds: float = 1.0
 
     # File storage
     upload_dir: str = "/app/uploads"
 
-    # Rate limiting (public endpoints)
+    # Complaint numbering: one global series, or one series per municipality
+    complaint_number_per_municipality: bool = False
+
+    # Outbox worker (post-commit side effects such as notification fan-out)
+    outbox_worker_enabled: bool = True
+    outbox_poll_interval_seconds: float = 2.0
+    outbox_batch_size: int = 100
+    outbox_max_attempts: int = 5
+    # A failed event is retried after base * 2^(attempts - 1) seconds, capped
+    outbox_retry_base_seconds: float = 5.0
+    outbox_retry_max_seconds: float = 600.0
+
+    # In-process caches: how often a worker rechecks the shared version counter
+    cache_version_recheck_seconds: float = 5.0
+    public_districts_max_age_seconds: int = 60
+    tracking_cache_size: int = 10000
+    tracking_cache_ttl_seconds: float = 30.0
+    principal_cache_size: int = 5000
+    principal_cache_ttl_seconds: float = 30.0
+    # Admin request list totals (see app.counts): exact counts are cached per
+    # filter until a request is written, and for at most the TTL (the
+    # overdue total is reused within one TTL step); count=estimate trusts
+    # the planner's row estimate above the threshold and counts exactly below it
+    request_count_cache_size: int = 2000
+    request_count_cache_ttl_seconds: float = 30.0
+    request_count_estimate_threshold: int = 10000
+
+    # Cross-worker change events (PostgreSQL LISTEN/NOTIFY)
+    event_listener_enabled: bool = True
+    event_listener_retry_seconds: float = 5.0
+
+    # Live tracking streams (SSE), per worker
+    tracking_stream_max_connections: int = 5000
+    tracking_stream_queue_size: int = 32
+    tracking_stream_keepalive_seconds: float = 15.0
+    # Timeline entries get created_at when written, not when committed, so
+    # each fetch re-reads this far behind the newest entry seen and skips ids
+    # already delivered. Should exceed the longest request transaction
+    tracking_stream_overlap_seconds: float = 60.0
+
+    # Login brute-force throttling: failures per username / per IP until a
+    # quiet window passes; past the threshold each failure doubles the lockout
+    login_throttle_window_seconds: int = 900
+    login_throttle_user_threshold: int = 5
+    login_throttle_ip_threshold: int = 20
+    login_throttle_base_delay_seconds: float = 1.0
+    login_throttle_max_delay_seconds: float = 900.0
+    # A locked client IP only delays each attempt by up to this much instead
+    # of refusing it: many users can share an address (offices, carrier NAT,
+    # a misconfigured proxy). Set login_throttle_ip_hard_block once
+    # TRUSTED_PROXIES is verified to refuse locked IPs with 429 instead
+    login_throttle_ip_soft_delay_seconds: float = 3.0
+    login_throttle_ip_hard_block: bool = False
+    # Response delay for unknown usernames until the pool has measured bcrypt
+    login_unknown_user_delay_seconds: float = 0.25
+
+    # bcrypt runs in a bounded per-worker process pool (see app.password_pool)
+    password_pool_workers: int = 2
+    password_pool_queue_limit: int = 16
+    password_pool_timeout_seconds: float = 10.0
+
+    # Idempotency-Key replay store for write endpoints
+    idempotency_ttl_seconds: int = 86400
+    # A running request keeps renewing its claim; a crashed one frees it after this
+    idempotency_lock_seconds: int = 60
+    idempotency_purge_interval_seconds: float = 600.0
+
+    # Per-request statement counting (see app.querystats): a statement repeated
+    # this often in one request is flagged as an N+1 suspect. The X-DB-*
+    # response headers default to on in development only
+    query_stats_enabled: bool = True
+    query_repeat_threshold: int = 5
+    query_stats_headers: Optional[bool] = None
+
+    # Token for /internal/metrics; the endpoint is disabled when empty
+    metrics_token: str = ""
+
+    # Duplicate detection for public submissions (same category, nearby, recent)
+    duplicate_detection_enabled: bool = True
+    duplicate_radius_meters: float = 100.0
+    duplicate_window_hours: int = 72
+
+    # Rate limiting (public endpoints). "postgres" shares buckets across
+    # workers; "memory" is per process (single-worker development only)
     rate_limit_per_hour: int = 3
+    rate_limit_backend: str = "postgres"
+    rate_limit_retention_seconds: int = 86400
+    rate_limit_purge_interval_seconds: float = 600.0
+    # Dedicated autocommit connections per worker for the checks
+    rate_limit_pool_size: int = 2
 
     # CORS allowed origins (comma-separated in env var or a list in code)
     cors_origins: Union[list[str], str] = ["http://localhost:5173"]
 
+    # Reverse proxies (addresses or CIDR ranges, comma-separated) whose
+    # X-Forwarded-For / X-Real-IP headers name the client. Empty: the TCP
+    # peer is the client. Add the CDN's ranges too when one fronts nginx
+    trusted_proxies: Union[list[str], str] = []
+
     # Environment: "development" or "production"
     environment: str = "development"
 
@@ -29,6 +156,13 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in v.split(",") if origin.strip()]
         return v
 
+    @field_validator("trusted_proxies", mode="before")
+    @classmethod
+    def parse_trusted_proxies(cls, v: Union[str, list[str]]) -> list[str]:
+        if isinstance(v, str):
+            return [proxy.strip() for proxy in v.split(",") if proxy.strip()]
+        return v
+
     class Config:
         env_file = ".env"
 
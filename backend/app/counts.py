@@ -0,0 +1,126 @@
+"""Total counts for the admin request list.
+
+An exact ``COUNT(*)`` over a large scope costs about as much as the page
+itself, so ``list_requests`` takes a count strategy:
+
+- ``exact``: counted once per filter and cached for at most
+  ``request_count_cache_ttl_seconds``. The key is a fingerprint of the
+  compiled count query and its parameters, so the caller's scope is part of
+  it, prefixed with this worker's write version: every request write
+  (``request_changed`` / ``request_created`` events) moves the version on,
+  so totals never outlive a write. The version lives in memory rather than
+  in ``cache_versions`` so request writes do not all queue on one row lock.
+  The list query itself uses the real time; only the key rounds "now" down
+  to a TTL step, so the overdue total is reused within that step.
+- ``estimate``: the planner's row estimate from ``EXPLAIN``, which costs no
+  more than planning the query. Estimates are poor for small results, so
+  below ``request_count_estimate_threshold`` this falls back to ``exact``.
+- ``false``: no total at all; the caller relies on ``has_next``.
+"""
+import hashlib
+import itertools
+import json
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.cache import LRUCache
+from app.config import get_settings
+from app.events import publish, subscribe
+
+settings = get_settings()
+
+COUNT_STRATEGIES = ("exact", "estimate", "false")
+
+_count_cache = LRUCache(
+    "request_counts", settings.request_count_cache_size, settings.request_count_cache_ttl_seconds,
+)
+
+
+_versions = itertools.count(1)
+_write_version = 0
+
+
+def _bump_write_version(_data: str = "") -> None:
+    global _write_version
+    _write_version = next(_versions)
+
+
+subscribe("request_changed", _bump_write_version, on_reset=_bump_write_version)
+subscribe("request_created", _bump_write_version)
+
+
+def request_created(db: Session) -> None:
+    """Move every worker's count version on once the caller commits new requests."""
+    publish(db, "request_created", "")
+
+
+def _clock_step(now: datetime) -> datetime:
+    """`now` rounded down to a count-cache step."""
+    step = settings.request_count_cache_ttl_seconds
+    timestamp = now.timestamp()
+    if step > 0:
+        timestamp -= timestamp % step
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _fingerprint(db: AsyncSession, stmt, now: Optional[datetime] = None) -> str:
+    """Key for `stmt`; parameters equal to `now` are rounded to a clock step."""
+    compiled = stmt.compile(dialect=db.bind.dialect)
+    params = sorted(
+        (name, repr(_clock_step(value) if now is not None and value == now else value))
+        for name, value in compiled.params.items()
+    )
+    return hashlib.sha256(f"{compiled}\x00{params!r}".encode()).hexdigest()
+
+
+async def _exact_count(db: AsyncSession, q, now: Optional[datetime]) -> int:
+    stmt = select(func.count()).select_from(q.order_by(None).subquery())
+    key = f"{_write_version}:{_fingerprint(db, stmt, now)}"
+    cached = _count_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = _count_cache.generation
+    total = await db.scalar(stmt)
+    _count_cache.set(key, total, generation)
+    return total
+
+
+async def _estimated_count(db: AsyncSession, q) -> int:
+    plan = await db.scalar(_Explain(q.order_by(None)))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_requests(
+    db: AsyncSession, q, strategy: str, now: Optional[datetime] = None,
+) -> Tuple[Optional[int], bool]:
+    """Total rows of `q` under `strategy`, and whether it is an estimate.
+
+    `now` is the clock the caller's time-dependent filters compared against.
+    """
+    if strategy == "false":
+        return None, False
+    if strategy == "estimate":
+        estimate = await _estimated_count(db, q)
+        if estimate >= settings.request_count_estimate_threshold:
+            return estimate, True
+    return await _exact_count(db, q, now), False
@@ -1,20 +1,163 @@
+import threading
+import time
+from typing import Any, Dict
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url)
+
+class _MeteredPool:
+    """Pool mixin that records how long checkouts take (waiting for a free
+    connection or opening a new one) and how many time out."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self._checkouts += 1
+                self._wait_seconds += waited
+                self._max_wait_seconds = max(self._max_wait_seconds, waited)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                "size": self.size(),
+                "max_overflow": self._max_overflow,
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": max(0, self.overflow()),
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "mean_wait_ms": round(self._wait_seconds * 1000 / checkouts, 2) if checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait_seconds * 1000, 1),
+            }
+
+
+class _MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+
+class _MeteredAsyncPool(_MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+connect_args: Dict[str, Any] = {}
+if settings.db_statement_timeout_ms > 0:
+    connect_args["options"] = f"-c statement_timeout={settings.db_statement_timeout_ms}"
+
+engine = create_engine(
+    settings.database_url,
+    poolclass=_MeteredQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    connect_args=connect_args,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_url() -> str:
+    if settings.async_database_url:
+        return settings.async_database_url
+    return make_url(settings.database_url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+async_connect_args: Dict[str, Any] = {}
+if settings.db_statement_timeout_ms > 0:
+    async_connect_args["server_settings"] = {"statement_timeout": str(settings.db_statement_timeout_ms)}
+
+async_engine = create_async_engine(
+    _async_url(),
+    poolclass=_MeteredAsyncPool,
+    pool_size=settings.db_async_pool_size,
+    max_overflow=settings.db_async_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    connect_args=async_connect_args,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Rate-limit checks only: autocommit and no pre-ping, so a check costs the
+# single upsert round trip (app.ratelimit retries once after a dropped connection)
+ratelimit_engine = create_engine(
+    settings.database_url,
+    poolclass=_MeteredQueuePool,
+    pool_size=settings.rate_limit_pool_size,
+    max_overflow=0,
+    pool_timeout=settings.db_pool_timeout_seconds,
+    pool_pre_ping=False,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    pool_reset_on_return=None,
+    isolation_level="AUTOCOMMIT",
+    connect_args=connect_args,
+)
+
+replica_engine = None
+ReplicaSessionLocal = None
+if settings.replica_database_url:
+    replica_engine = create_engine(
+        settings.replica_database_url,
+        poolclass=_MeteredQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        connect_args=connect_args,
+    )
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
 Base = declarative_base()
 
 
+def pool_stats() -> Dict[str, Any]:
+    """Connection-pool usage of this worker's engines, for /internal/metrics."""
+    stats = {
+        "sync": engine.pool.stats(),
+        "async": async_engine.pool.stats(),
+        "ratelimit": ratelimit_engine.pool.stats(),
+    }
+    if replica_engine is not None:
+        stats["replica"] = replica_engine.pool.stats()
+    return stats
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,21 +1,103 @@
+import ipaddress
+import secrets
+from dataclasses import dataclass
 from typing import Optional
 from uuid import UUID
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.auth import decode_access_token
+from app.cache import LRUCache
+from app.config import get_settings
 from app.database import get_db
+from app.events import publish, subscribe
 from app.models import User
+from app.ratelimit import RateLimit, consume
+from app.sessions import revoke_user_sessions, revoked_sessions
 
+settings = get_settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
+@dataclass(frozen=True)
+class Principal:
+    """What authorization needs to know about the caller.
+
+    Session access tokens carry it as claims (``from_claims``), so they never
+    touch the database or the principal cache. Only legacy tokens, issued
+    before sessions existed, are loaded from the user row and cached per
+    worker (``_principal_cache``).
+    """
+    id: UUID
+    role: str
+    full_name: str
+    governorate_id: Optional[UUID]
+    municipality_id: Optional[UUID]
+    district_id: Optional[UUID]
+    is_active: bool
+    token_version: int
+    session_id: Optional[UUID] = None
+
+    @property
+    def name(self) -> str:
+        return self.full_name
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            role=user.role,
+            full_name=user.full_name,
+            governorate_id=user.governorate_id,
+            municipality_id=user.municipality_id,
+            district_id=user.district_id,
+            is_active=user.is_active,
+            token_version=user.token_version,
+        )
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Principal":
+        """Build the principal from a session access token, without the database."""
+        def _uuid(value: Optional[str]) -> Optional[UUID]:
+            return UUID(value) if value else None
+        return cls(
+            id=UUID(payload["sub"]),
+            role=payload["role"],
+            full_name=payload.get("name") or "",
+            governorate_id=_uuid(payload.get("gov")),
+            municipality_id=_uuid(payload.get("mun")),
+            district_id=_uuid(payload.get("dist")),
+            is_active=True,
+            token_version=payload.get("ver", 0),
+            session_id=UUID(payload["sid"]),
+        )
+
+
+# Tokens issued before sessions existed carry no claims and are resolved
+# through this cache. Keyed by user id; an entry only serves tokens carrying the same version
+_principal_cache = LRUCache("principals", settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+subscribe("principal_changed", _principal_cache.invalidate, on_reset=_principal_cache.clear)
+
+
+def principal_changed(db: Session, user: User, revoke_tokens: bool = False) -> None:
+    """Drop `user` from every worker's principal cache once the caller commits.
+
+    With `revoke_tokens` the user's sessions are revoked and the token version
+    is bumped, so tokens issued before this change stop working
+    (deactivation, scope or password change).
+    """
+    if revoke_tokens:
+        user.token_version = (user.token_version or 0) + 1
+        revoke_user_sessions(db, user.id)
+    publish(db, "principal_changed", str(user.id))
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
-) -> User:
+) -> Principal:
     credentials_exc = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -27,15 +109,30 @@ def get_current_user(
     user_id: Optional[str] = payload.get("sub")
     if user_id is None:
         raise credentials_exc
-    user = db.query(User).filter(User.id == UUID(user_id)).first()
-    if user is None or not user.is_active:
+    if payload.get("sid"):
+        # Session tokens are self-contained: only the in-memory revocation set is consulted
+        if revoked_sessions.is_revoked(payload["sid"]):
+            raise credentials_exc
+        return Principal.from_claims(payload)
+
+    token_version = payload.get("ver", 0)
+    principal = _principal_cache.get(user_id)
+    # A token newer than the cached entry (e.g. issued after a revocation) forces a reload
+    if principal is None or principal.token_version < token_version:
+        generation = _principal_cache.generation
+        user = db.query(User).filter(User.id == UUID(user_id)).first()
+        if user is None:
+            raise credentials_exc
+        principal = Principal.from_user(user)
+        _principal_cache.set(user_id, principal, generation)
+    if not principal.is_active or principal.token_version != token_version:
         raise credentials_exc
-    return user
+    return principal
 
 
 def require_roles(*roles: str):
     """Dependency factory: enforce that current user has one of the given roles."""
-    def _check(current_user: User = Depends(get_current_user)) -> User:
+    def _check(current_user: Principal = Depends(get_current_user)) -> Principal:
         if current_user.role not in roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -47,7 +144,7 @@ def require_roles(*roles: str):
 
 def require_district_scope(
     request_district_id: UUID,
-    current_user: User,
+    current_user: Principal,
 ) -> None:
     """Raise 403 if user is district_admin/mukhtar and the request is outside their district."""
     if current_user.role in ("district_admin", "mukhtar"):
@@ -60,7 +157,7 @@ def require_district_scope(
 
 def require_municipality_scope(
     request_municipality_id: UUID,
-    current_user: User,
+    current_user: Principal,
 ) -> None:
     """Raise 403 if user doesn't belong to the request's municipality."""
     if current_user.municipality_id and str(current_user.municipality_id) != str(request_municipality_id):
@@ -68,3 +165,61 @@ def require_municipality_scope(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access to this municipality is not allowed",
         )
+
+
+def require_metrics_token(x_metrics_token: Optional[str] = Header(None)) -> None:
+    """Guard internal metrics with the shared METRICS_TOKEN (404 when unset)."""
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not secrets.compare_digest(x_metrics_token or "", settings.metrics_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid metrics token")
+
+
+_trusted_proxies = [ipaddress.ip_network(net, strict=False) for net in settings.trusted_proxies]
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in net for net in _trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    """The caller's address, looking through trusted reverse proxies.
+
+    X-Forwarded-For / X-Real-IP are only believed when the connection comes
+    from a TRUSTED_PROXIES address; X-Forwarded-For is walked from the right
+    so hops a client prepended itself are never reached.
+    """
+    peer = request.client.host if request.client else "127.0.0.1"
+    if not _is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            try:
+                return str(ipaddress.ip_address(hop))
+            except ValueError:
+                break
+        peer = hop
+    real_ip = request.headers.get("x-real-ip", "").strip()
+    if not hops and real_ip:
+        try:
+            return str(ipaddress.ip_address(real_ip))
+        except ValueError:
+            pass
+    return peer
+
+
+def rate_limited(scope: str, limit: RateLimit):
+    """Dependency factory: per-client-IP token bucket shared by all workers."""
+    def _checker(request: Request) -> None:
+        if not consume(f"{scope}:{client_ip(request)}", limit):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="تم تجاوز الحد المسموح من الطلبات، يرجى المحاولة لاحقاً",
+                headers={"Retry-After": str(limit.retry_after_seconds)},
+            )
+    return _checker
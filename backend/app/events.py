@@ -0,0 +1,168 @@
+"""Cross-worker change events over PostgreSQL LISTEN/NOTIFY.
+
+``publish`` queues a NOTIFY inside the writer's transaction, so events are
+only delivered if the write commits. Subscribers in the publishing worker
+are called right after the commit; every other worker receives the event
+through its listener thread.
+"""
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy import event, func
+from sqlalchemy import select as sa_select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal, engine
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Identifies this process so it can skip its own notifications
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+EventCallback = Callable[[str], None]
+ResetCallback = Callable[[], None]
+
+_subscribers: Dict[str, List[EventCallback]] = {}
+_reset_callbacks: List[ResetCallback] = []
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(channel: str, callback: EventCallback, on_reset: Optional[ResetCallback] = None) -> None:
+    """Call `callback(data)` for every event on `channel`.
+
+    `on_reset` runs when the listener had to reconnect and may have missed
+    events, so local state derived from them should be dropped.
+    """
+    with _subscribers_lock:
+        _subscribers.setdefault(channel, []).append(callback)
+        if on_reset is not None:
+            _reset_callbacks.append(on_reset)
+
+
+def unsubscribe(channel: str, callback: EventCallback) -> None:
+    with _subscribers_lock:
+        callbacks = _subscribers.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+
+def publish(db: Session, channel: str, data: str) -> None:
+    """Queue an event in the caller's transaction (delivered on commit)."""
+    message = json.dumps({"o": ORIGIN, "d": data})
+    db.execute(sa_select(func.pg_notify(channel, message)))
+    db.info.setdefault("published_events", []).append((channel, data))
+
+
+def _dispatch(channel: str, data: str) -> None:
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(channel, []))
+    for callback in callbacks:
+        try:
+            callback(data)
+        except Exception:
+            logger.exception("Event subscriber failed on channel %s", channel)
+
+
+def _reset_all() -> None:
+    with _subscribers_lock:
+        callbacks = list(_reset_callbacks)
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception("Event reset callback failed")
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _dispatch_local_after_commit(session: Session) -> None:
+    for channel, data in session.info.pop("published_events", []):
+        _dispatch(channel, data)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_local_after_rollback(session: Session) -> None:
+    session.info.pop("published_events", None)
+
+
+class EventListener:
+    """Background thread holding one LISTEN connection for this worker."""
+
+    def __init__(self, channels: List[str]):
+        self._channels = channels
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="event-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _connect(self):
+        args = engine.url.translate_connect_args(username="user", database="dbname")
+        conn = psycopg2.connect(**args)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            for channel in self._channels:
+                cur.execute(f'LISTEN "{channel}"')
+        return conn
+
+    def _run(self) -> None:
+        first = True
+        while not self._stopping.is_set():
+            try:
+                conn = self._connect()
+            except Exception as exc:
+                logger.warning("Event listener could not connect: %s", exc)
+                self._stopping.wait(settings.event_listener_retry_seconds)
+                continue
+            if not first:
+                # Events may have been missed while disconnected
+                _reset_all()
+            first = False
+            try:
+                self._listen(conn)
+            except Exception as exc:
+                logger.warning("Event listener connection lost: %s", exc)
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def _listen(self, conn) -> None:
+        while not self._stopping.is_set():
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    message = json.loads(notify.payload)
+                except ValueError:
+                    continue
+                if message.get("o") == ORIGIN:
+                    continue  # already dispatched after our own commit
+                _dispatch(notify.channel, message.get("d", ""))
+
+
+CHANNELS = ["request_changed", "request_created", "open_requests", "principal_changed", "session_revoked"]
+
+listener = EventListener(CHANNELS)
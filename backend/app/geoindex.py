@@ -0,0 +1,194 @@
+"""In-memory spatial grid of recent open requests, for duplicate detection.
+
+Open, located requests created within ``duplicate_window_hours`` are bucketed
+by municipality, category and a lat/lng grid cell about
+``duplicate_radius_meters`` wide (a complaint is never linked across a
+municipal boundary, which merging forbids too), so
+a lookup only scans the handful of cells around the new complaint. Each worker
+loads the grid once from the database and then keeps it current from the
+``open_requests`` event channel, which writers feed through ``publish_geo``.
+"""
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.events import publish, subscribe
+from app.models import ServiceRequest
+
+settings = get_settings()
+
+OPEN_STATUSES = ("new", "under_review", "in_progress")
+METERS_PER_DEGREE = 111_320.0
+GEO_EVENT_BATCH = 30
+
+Cell = Tuple[UUID, str, int, int]
+
+
+@dataclass
+class _Entry:
+    request_id: UUID
+    municipality_id: UUID
+    category: str
+    lat: float
+    lng: float
+    created_at: float  # epoch seconds
+
+
+def _is_indexable(req: ServiceRequest) -> bool:
+    return (
+        req.status in OPEN_STATUSES
+        and not req.is_archived
+        and req.duplicate_of_id is None
+        and req.location_lat is not None
+        and req.location_lng is not None
+    )
+
+
+def _distance_meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    # Equirectangular approximation: exact enough at a few hundred meters
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6_371_000.0
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self._cells: Dict[Cell, Dict[UUID, _Entry]] = {}
+        self._entries: Dict[UUID, Cell] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def cell_degrees(self) -> float:
+        return settings.duplicate_radius_meters / METERS_PER_DEGREE
+
+    def _cell(self, municipality_id: UUID, category: str, lat: float, lng: float) -> Cell:
+        size = self.cell_degrees
+        return municipality_id, category, math.floor(lat / size), math.floor(lng / size)
+
+    def _add(self, entry: _Entry) -> None:
+        self._remove(entry.request_id)
+        cell = self._cell(entry.municipality_id, entry.category, entry.lat, entry.lng)
+        self._cells.setdefault(cell, {})[entry.request_id] = entry
+        self._entries[entry.request_id] = cell
+
+    def _remove(self, request_id: UUID) -> None:
+        cell = self._entries.pop(request_id, None)
+        if cell is None:
+            return
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(request_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _load(self, db: Session) -> None:
+        since = datetime.now(timezone.utc) - timedelta(hours=settings.duplicate_window_hours)
+        rows = db.query(
+            ServiceRequest.id,
+            ServiceRequest.municipality_id,
+            ServiceRequest.category,
+            ServiceRequest.location_lat,
+            ServiceRequest.location_lng,
+            ServiceRequest.created_at,
+        ).filter(
+            ServiceRequest.status.in_(OPEN_STATUSES),
+            ServiceRequest.is_archived.is_(False),
+            ServiceRequest.duplicate_of_id.is_(None),
+            ServiceRequest.location_lat.isnot(None),
+            ServiceRequest.location_lng.isnot(None),
+            ServiceRequest.created_at >= since,
+        ).all()
+        self._cells.clear()
+        self._entries.clear()
+        for row in rows:
+            self._add(_Entry(
+                row.id, row.municipality_id, row.category,
+                row.location_lat, row.location_lng, row.created_at.timestamp(),
+            ))
+        self._loaded = True
+
+    def find_duplicate(
+        self, db: Session, municipality_id: UUID, category: str, lat: float, lng: float,
+    ) -> Optional[UUID]:
+        """Closest open request of `category` in the municipality, within the radius and time window."""
+        cutoff = time.time() - settings.duplicate_window_hours * 3600
+        radius = settings.duplicate_radius_meters
+        # Longitude degrees shrink with latitude, so more columns may be in range
+        lng_span = math.ceil(1 / max(math.cos(math.radians(lat)), 0.01))
+        with self._lock:
+            if not self._loaded:
+                self._load(db)
+            _, _, row, col = self._cell(municipality_id, category, lat, lng)
+            best: Optional[Tuple[float, UUID]] = None
+            expired = []
+            for r in range(row - 1, row + 2):
+                for c in range(col - lng_span, col + lng_span + 1):
+                    for entry in self._cells.get((municipality_id, category, r, c), {}).values():
+                        if entry.created_at < cutoff:
+                            expired.append(entry.request_id)
+                            continue
+                        distance = _distance_meters(lat, lng, entry.lat, entry.lng)
+                        if distance <= radius and (best is None or distance < best[0]):
+                            best = (distance, entry.request_id)
+            for request_id in expired:
+                self._remove(request_id)
+        return best[1] if best else None
+
+    def apply(self, data: str) -> None:
+        """Event-bus callback for the ``open_requests`` channel."""
+        message = json.loads(data)
+        with self._lock:
+            if not self._loaded:
+                return
+            for item in message.get("add", []):
+                self._add(_Entry(
+                    UUID(item["id"]), UUID(item["municipality_id"]), item["category"],
+                    item["lat"], item["lng"], item["created_at"],
+                ))
+            for request_id in message.get("remove", []):
+                self._remove(UUID(request_id))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._entries.clear()
+            self._loaded = False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": len(self._entries), "cells": len(self._cells)}
+
+
+def publish_geo(db: Session, *reqs: ServiceRequest) -> None:
+    """Add `reqs` to (or drop them from) every worker's grid after the caller commits."""
+    if not settings.duplicate_detection_enabled:
+        return
+    # NOTIFY payloads are capped at 8000 bytes, so large batches are split
+    for start in range(0, len(reqs), GEO_EVENT_BATCH):
+        message: Dict[str, list] = {"add": [], "remove": []}
+        for req in reqs[start:start + GEO_EVENT_BATCH]:
+            if _is_indexable(req):
+                message["add"].append({
+                    "id": str(req.id),
+                    "municipality_id": str(req.municipality_id),
+                    "category": req.category,
+                    "lat": req.location_lat,
+                    "lng": req.location_lng,
+                    "created_at": req.created_at.timestamp(),
+                })
+            else:
+                message["remove"].append(str(req.id))
+        publish(db, "open_requests", json.dumps(message))
+
+
+duplicate_index = DuplicateIndex()
+subscribe("open_requests", duplicate_index.apply, on_reset=duplicate_index.reset)
@@ -0,0 +1,210 @@
+"""Idempotency-Key support for write endpoints.
+
+Routers built with ``route_class=IdempotentRoute`` accept an optional
+``Idempotency-Key`` header on POST/PATCH/PUT/DELETE. The first request with
+a key claims it in ``idempotency_keys``, runs normally and stores its
+response; a retry with the same key (same caller, method and path) gets the
+stored response back without running the write again. Keys are shared by
+all workers and expire after ``idempotency_ttl_seconds``. Authenticated
+keys are scoped per user, anonymous ones per client IP.
+
+Only successful (2xx) responses are stored: when the handler fails, the
+claim is released so the client can retry. While the handler runs the claim
+is extended every third of ``idempotency_lock_seconds``, so a slow request
+keeps it; a claim whose request never finished (worker crash) can be taken
+over once the lock lapses.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Coroutine, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import Row, and_, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.auth import decode_access_token
+from app.config import get_settings
+from app.database import engine
+from app.deps import client_ip
+from app.models import IdempotencyKey
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENT_METHODS = {"POST", "PATCH", "PUT", "DELETE"}
+MAX_KEY_LENGTH = 255
+
+_last_purge = time.monotonic()
+_purge_lock = threading.Lock()
+
+
+def _caller(request: Request) -> str:
+    """Keys are scoped per authenticated user, anonymous ones per client IP."""
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        payload = decode_access_token(auth[7:])
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{client_ip(request)}"
+
+
+def _claim(key: str, fingerprint: str) -> bool:
+    """Claim `key` for this request; False if another request owns or finished it."""
+    now = func.clock_timestamp()
+    stmt = pg_insert(IdempotencyKey).values(
+        key=key,
+        fingerprint=fingerprint,
+        locked_until=now + timedelta(seconds=settings.idempotency_lock_seconds),
+        expires_at=now + timedelta(seconds=settings.idempotency_ttl_seconds),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={
+            "fingerprint": stmt.excluded.fingerprint,
+            "status_code": None,
+            "media_type": None,
+            "body": None,
+            "locked_until": stmt.excluded.locked_until,
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=or_(
+            IdempotencyKey.expires_at < now,
+            and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.locked_until < now),
+        ),
+    ).returning(IdempotencyKey.key)
+    with engine.connect() as conn:
+        claimed = conn.execute(stmt).first() is not None
+        conn.commit()
+    return claimed
+
+
+def _extend_lock(key: str) -> None:
+    with engine.connect() as conn:
+        conn.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+            .values(locked_until=func.clock_timestamp() + timedelta(seconds=settings.idempotency_lock_seconds))
+        )
+        conn.commit()
+
+
+async def _hold_claim(key: str) -> None:
+    """Keep extending `key`'s lock until cancelled (the handler finished)."""
+    interval = settings.idempotency_lock_seconds / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(_extend_lock, key)
+        except Exception as exc:
+            logger.warning("Could not extend idempotency lock: %s", exc)
+
+
+def _load(key: str) -> Optional[Row]:
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(
+                IdempotencyKey.fingerprint,
+                IdempotencyKey.status_code,
+                IdempotencyKey.media_type,
+                IdempotencyKey.body,
+            ).where(IdempotencyKey.key == key)
+        ).first()
+    return row
+
+
+def _store(key: str, response: Response) -> None:
+    with engine.connect() as conn:
+        conn.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(status_code=response.status_code, media_type=response.media_type, body=bytes(response.body))
+        )
+        conn.commit()
+
+
+def _release(key: str) -> None:
+    with engine.connect() as conn:
+        conn.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)))
+        conn.commit()
+
+
+def _purge_expired_keys() -> None:
+    """Delete expired keys, at most once per purge interval per worker."""
+    global _last_purge
+    with _purge_lock:
+        now = time.monotonic()
+        if now - _last_purge < settings.idempotency_purge_interval_seconds:
+            return
+        _last_purge = now
+    try:
+        with engine.connect() as conn:
+            conn.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < func.clock_timestamp()))
+            conn.commit()
+    except Exception as exc:
+        logger.warning("Could not purge expired idempotency keys: %s", exc)
+
+
+class IdempotentRoute(APIRoute):
+    """APIRoute that honours the Idempotency-Key header on write methods."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[None, None, Response]]:
+        handler = super().get_route_handler()
+
+        async def _handler(request: Request) -> Response:
+            client_key = request.headers.get(IDEMPOTENCY_HEADER)
+            if request.method not in IDEMPOTENT_METHODS or not client_key:
+                return await handler(request)
+            if len(client_key) > MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail="مفتاح Idempotency-Key طويل جداً")
+
+            scope = f"{_caller(request)}\n{request.method}\n{request.url.path}\n{client_key}"
+            key = hashlib.sha256(scope.encode()).hexdigest()
+            fingerprint = hashlib.sha256(await request.body()).hexdigest()
+
+            await run_in_threadpool(_purge_expired_keys)
+            if not await run_in_threadpool(_claim, key, fingerprint):
+                stored = await run_in_threadpool(_load, key)
+                if stored is not None and stored.fingerprint != fingerprint:
+                    raise HTTPException(
+                        status_code=422,
+                        detail="تم استخدام مفتاح Idempotency-Key نفسه مع طلب مختلف",
+                    )
+                if stored is None or stored.status_code is None:
+                    raise HTTPException(
+                        status_code=409,
+                        detail="طلب بالمفتاح نفسه قيد المعالجة، يرجى المحاولة بعد قليل",
+                        headers={"Retry-After": "1"},
+                    )
+                return Response(
+                    content=stored.body,
+                    status_code=stored.status_code,
+                    media_type=stored.media_type,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+            heartbeat = asyncio.create_task(_hold_claim(key))
+            try:
+                response = await handler(request)
+            except BaseException:
+                await run_in_threadpool(_release, key)
+                raise
+            finally:
+                heartbeat.cancel()
+            if 200 <= response.status_code < 300 and hasattr(response, "body"):
+                try:
+                    await run_in_threadpool(_store, key, response)
+                except Exception as exc:
+                    # The write already committed; the claim expires after the lock window
+                    logger.warning("Could not store idempotent response: %s", exc)
+            else:
+                await run_in_threadpool(_release, key)
+            return response
+
+        return _handler
@@ -0,0 +1,121 @@
+"""Brute-force throttling for /auth/login, shared by every worker.
+
+Failed logins are counted per username and per client IP in
+``login_throttle``. A counter resets after ``login_throttle_window_seconds``
+without failures; once it reaches its threshold the key is locked for an
+exponentially growing delay (base * 2^(failures - threshold), capped). The
+locks are checked before any user lookup or bcrypt work, in one SELECT.
+
+A locked username is refused outright. A locked IP only slows each attempt
+down (``login_throttle_ip_soft_delay_seconds``) unless
+``login_throttle_ip_hard_block`` is set, because one address can stand for
+many users: an office, carrier NAT, or every client when the proxy's
+forwarded headers are not trusted (see ``app.deps.client_ip``).
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import get_settings
+from app.database import engine
+from app.models import LoginThrottle
+
+settings = get_settings()
+
+_last_purge = time.monotonic()
+_purge_lock = threading.Lock()
+
+
+def _user_key(username: str) -> str:
+    digest = hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+    return f"user:{digest}"
+
+
+def _ip_key(ip: str) -> str:
+    return f"ip:{ip}"
+
+
+def lockouts(username: str, ip: str) -> Tuple[Optional[int], Optional[int]]:
+    """Seconds until the username and the IP may try again (None where not locked)."""
+    user_key, ip_key = _user_key(username), _ip_key(ip)
+    with engine.connect() as conn:
+        locked = dict(conn.execute(
+            select(LoginThrottle.key, LoginThrottle.locked_until).where(
+                LoginThrottle.key.in_([user_key, ip_key]),
+                LoginThrottle.locked_until > func.clock_timestamp(),
+            )
+        ).all())
+    now = datetime.now(timezone.utc)
+
+    def _wait(key: str) -> Optional[int]:
+        if key not in locked:
+            return None
+        return max(1, int((locked[key] - now).total_seconds()) + 1)
+
+    return _wait(user_key), _wait(ip_key)
+
+
+def record_failure(username: str, ip: str) -> None:
+    """Count a failed attempt against both keys (one upsert)."""
+    now = func.clock_timestamp()
+    window = timedelta(seconds=settings.login_throttle_window_seconds)
+    stale = LoginThrottle.last_failure_at < now - window
+    failures = case((stale, 1), else_=LoginThrottle.failures + 1)
+    threshold = case(
+        (LoginThrottle.key.startswith("ip:"), settings.login_throttle_ip_threshold),
+        else_=settings.login_throttle_user_threshold,
+    )
+    delay_seconds = func.least(
+        settings.login_throttle_max_delay_seconds,
+        settings.login_throttle_base_delay_seconds * func.power(2, failures - threshold),
+    )
+    stmt = pg_insert(LoginThrottle).values([
+        {"key": _user_key(username), "failures": 1, "last_failure_at": now},
+        {"key": _ip_key(ip), "failures": 1, "last_failure_at": now},
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LoginThrottle.key],
+        set_={
+            "failures": failures,
+            "last_failure_at": now,
+            "locked_until": case(
+                (failures >= threshold, now + func.make_interval(0, 0, 0, 0, 0, 0, delay_seconds)),
+                else_=None,
+            ),
+        },
+    )
+    with engine.connect() as conn:
+        conn.execute(stmt)
+        conn.commit()
+    _purge_stale()
+
+
+def record_success(username: str) -> None:
+    """A correct password clears the username's counter (the IP's is kept)."""
+    with engine.connect() as conn:
+        conn.execute(delete(LoginThrottle).where(LoginThrottle.key == _user_key(username)))
+        conn.commit()
+
+
+def _purge_stale() -> None:
+    """Drop expired, unlocked counters (at most once per window per worker)."""
+    global _last_purge
+    with _purge_lock:
+        now = time.monotonic()
+        if now - _last_purge < settings.login_throttle_window_seconds:
+            return
+        _last_purge = now
+    with engine.connect() as conn:
+        conn.execute(
+            delete(LoginThrottle).where(
+                LoginThrottle.last_failure_at
+                < func.clock_timestamp() - timedelta(seconds=settings.login_throttle_window_seconds),
+                func.coalesce(LoginThrottle.locked_until, func.clock_timestamp()) <= func.clock_timestamp(),
+            )
+        )
+        conn.commit()
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
@@ -6,12 +7,17 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
-from slowapi.util import get_remote_address
 
 from app.config import get_settings
-from app.routers import auth, admin, public
+from app.database import async_engine
+from app.events import listener as event_listener
+from app.outbox import worker as outbox_worker
+from app.password_pool import pool as password_pool
+from app.querystats import QueryStatsMiddleware
+from app.replica import READ_AFTER_HEADER, ReadAfterWriteMiddleware, router as replica_router
+from app.routers import auth, admin, internal, public
+from app.sessions import revoked_sessions
+from app.streams import hub as tracking_streams
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,7 +26,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
-limiter = Limiter(key_func=get_remote_address)
 
 # When behind nginx at /api, tell FastAPI so Swagger UI references the correct URLs
 _root_path = "/api" if settings.environment == "production" else ""
@@ -32,8 +37,21 @@ async def lifespan(app: FastAPI):
     logger.info("Upload directory ready: %s", settings.upload_dir)
     # Mount uploads directory after ensuring it exists
     app.mount("/uploads", StaticFiles(directory=settings.upload_dir), name="uploads")
+    tracking_streams.attach(asyncio.get_running_loop())
+    if settings.event_listener_enabled:
+        event_listener.start()
+        logger.info("Event listener started")
+    if settings.outbox_worker_enabled:
+        outbox_worker.start()
+        logger.info("Outbox worker started")
+    revoked_sessions.start()
     logger.info("Application startup complete")
     yield
+    revoked_sessions.stop()
+    outbox_worker.stop()
+    event_listener.stop()
+    password_pool.shutdown()
+    await async_engine.dispose()
     logger.info("Application shutdown")
 
 
@@ -45,9 +63,6 @@ app = FastAPI(
     root_path=_root_path,
 )
 
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception) -> JSONResponse:
@@ -63,11 +78,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[READ_AFTER_HEADER],
 )
+if replica_router.enabled:
+    app.add_middleware(ReadAfterWriteMiddleware)
+if settings.query_stats_enabled:
+    app.add_middleware(QueryStatsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(admin.router)
 app.include_router(public.router)
+app.include_router(internal.router)
 
 
 @app.get("/health")
@@ -2,11 +2,11 @@ import uuid
 from datetime import datetime, timezone
 
 from sqlalchemy import (
-    Boolean, Column, DateTime, Enum, ForeignKey,
-    Float, String, Text, UniqueConstraint
+    BigInteger, Boolean, Column, DateTime, Enum, ForeignKey,
+    Float, Integer, LargeBinary, Sequence, String, Text, UniqueConstraint
 )
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import deferred, relationship
 
 from app.database import Base
 
@@ -96,6 +96,8 @@ class User(Base):
     is_active = Column(Boolean, default=True, nullable=False)
     created_by_user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
     must_change_password = Column(Boolean, default=True, nullable=False)
+    # Bumped to revoke every token issued before (deactivation, password change)
+    token_version = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
 
     # Keep `name` as a computed property for backward compatibility
@@ -124,6 +126,8 @@ class ServiceRequest(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     municipality_id = Column(UUID(as_uuid=True), ForeignKey("municipalities.id"), nullable=False)
+    # Copy of municipalities.governorate_id so governor scoping needs no subquery
+    governorate_id = Column(UUID(as_uuid=True), ForeignKey("governorates.id"), nullable=True, index=True)
     district_id = Column(UUID(as_uuid=True), ForeignKey("districts.id"), nullable=False)
     complaint_number = Column(String(50), nullable=True, unique=True, index=True)
     category = Column(
@@ -171,15 +175,31 @@ class ServiceRequest(Base):
     created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, nullable=False)
     closed_at = Column(DateTime(timezone=True), nullable=True)
-
-    municipality = relationship("Municipality", back_populates="service_requests")
-    district = relationship("District", back_populates="service_requests")
-    assigned_to = relationship("User", foreign_keys=[assigned_to_user_id])
-    updates = relationship("RequestUpdate", back_populates="request", cascade="all, delete-orphan")
-    assignments = relationship("Assignment", back_populates="request", cascade="all, delete-orphan")
-    attachments = relationship("Attachment", back_populates="request", cascade="all, delete-orphan")
-    materials_used = relationship("MaterialUsed", back_populates="request", cascade="all, delete-orphan")
-    responsible_team_entity = relationship("MunicipalTeam", back_populates="service_requests")
+    duplicate_of_id = Column(UUID(as_uuid=True), ForeignKey("service_requests.id"), nullable=True, index=True)
+    # Set by a database trigger on every insert/update (migration 0022, see
+    # app.search); never written or read back by the application
+    search_text = deferred(Column(Text, nullable=True))
+
+    # Hot-path relationships never lazy-load: queries that need them say so
+    # with joinedload/selectinload, and a forgotten one raises instead of
+    # quietly issuing a query per row
+    municipality = relationship("Municipality", back_populates="service_requests", lazy="raise")
+    district = relationship("District", back_populates="service_requests", lazy="raise")
+    assigned_to = relationship("User", foreign_keys=[assigned_to_user_id], lazy="raise")
+    updates = relationship(
+        "RequestUpdate", back_populates="request", cascade="all, delete-orphan",
+        order_by="RequestUpdate.created_at", lazy="raise",
+    )
+    assignments = relationship("Assignment", back_populates="request", cascade="all, delete-orphan", lazy="raise")
+    attachments = relationship(
+        "Attachment", back_populates="request", cascade="all, delete-orphan",
+        order_by="Attachment.created_at", lazy="raise",
+    )
+    materials_used = relationship(
+        "MaterialUsed", back_populates="request", cascade="all, delete-orphan",
+        order_by="MaterialUsed.created_at", lazy="raise",
+    )
+    responsible_team_entity = relationship("MunicipalTeam", back_populates="service_requests", lazy="raise")
 
     @property
     def municipality_name(self) -> str | None:
@@ -196,6 +216,21 @@ class ServiceRequest(Base):
         return None
 
 
+# Global complaint number series (see app.numbering)
+COMPLAINT_NUMBER_SEQ = Sequence("complaint_number_seq", metadata=Base.metadata)
+
+
+class ComplaintNumberSeries(Base):
+    """Per-municipality complaint number counter."""
+    __tablename__ = "complaint_number_series"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    municipality_id = Column(UUID(as_uuid=True), ForeignKey("municipalities.id"), nullable=False, unique=True)
+    # Leading part of every number in this series (see app.numbering)
+    prefix = Column(String(16), nullable=False, unique=True)
+    last_value = Column(BigInteger, nullable=False, default=0)
+
+
 class RequestUpdate(Base):
     __tablename__ = "request_updates"
 
@@ -227,8 +262,8 @@ class RequestUpdate(Base):
     is_internal = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
 
-    request = relationship("ServiceRequest", back_populates="updates")
-    actor = relationship("User", foreign_keys=[actor_user_id])
+    request = relationship("ServiceRequest", back_populates="updates", lazy="raise")
+    actor = relationship("User", foreign_keys=[actor_user_id], lazy="raise")
 
 
 class Assignment(Base):
@@ -257,7 +292,7 @@ class Attachment(Base):
     file_name = Column(String(255), nullable=False)
     created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
 
-    request = relationship("ServiceRequest", back_populates="attachments")
+    request = relationship("ServiceRequest", back_populates="attachments", lazy="raise")
 
 
 class MaterialUsed(Base):
@@ -270,7 +305,7 @@ class MaterialUsed(Base):
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
 
-    request = relationship("ServiceRequest", back_populates="materials_used")
+    request = relationship("ServiceRequest", back_populates="materials_used", lazy="raise")
 
 
 class AuditLog(Base):
@@ -301,3 +336,74 @@ class Notification(Base):
     is_read = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
     read_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    # Not picked up before this time; pushed back after every failed attempt
+    next_attempt_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class CacheVersion(Base):
+    """Version counters for in-process caches (see app.cache)."""
+    __tablename__ = "cache_versions"
+
+    name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class RateLimitBucket(Base):
+    """Token buckets shared by all workers (see app.ratelimit)."""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String(255), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    """Stored responses for Idempotency-Key replays (see app.idempotency)."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    media_type = Column(String(100), nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class LoginThrottle(Base):
+    """Failed-login counters per username/IP (see app.login_throttle)."""
+    __tablename__ = "login_throttle"
+
+    key = Column(String(100), primary_key=True)
+    failures = Column(Integer, nullable=False, default=0)
+    last_failure_at = Column(DateTime(timezone=True), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+
+
+class AuthSession(Base):
+    """A login session holding the current refresh-token hash (see app.sessions)."""
+    __tablename__ = "auth_sessions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    refresh_token_hash = Column(String(64), nullable=False)
+    # The hash the last rotation replaced, accepted until rotated_at + grace
+    previous_refresh_token_hash = Column(String(64), nullable=True)
+    rotated_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    last_used_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True, index=True)
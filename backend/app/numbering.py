@@ -0,0 +1,155 @@
+import secrets
+import threading
+from collections import deque
+from typing import Any
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import COMPLAINT_NUMBER_SEQ, ComplaintNumberSeries, Municipality, ServiceRequest
+
+settings = get_settings()
+
+# 32 symbols (no I, O, 0, 1) so one random byte maps onto one symbol via `& 31`
+TRACKING_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+TRACKING_CODE_LENGTH = 8
+TRACKING_CODE_BLOCK = 256
+TRACKING_CODE_ATTEMPTS = 10
+# Per-municipality series: "<prefix>-<number>"; the prefix is stored on the
+# counter row and never changes once the first number was issued
+SERIES_PREFIX_LENGTH = 6
+
+_code_pool: deque[str] = deque()
+_code_pool_lock = threading.Lock()
+
+
+def allocate_complaint_number(db: Session, municipality_id: UUID) -> str:
+    """Allocate the next complaint number without scanning service_requests.
+
+    The global series draws from a PostgreSQL sequence (no row locks, gaps are
+    possible on rollback). Per-municipality series use one counter row per
+    municipality, formatted as ``<prefix>-<number>`` to stay globally unique.
+    """
+    return allocate_complaint_numbers(db, municipality_id, 1)[0]
+
+
+def allocate_complaint_numbers(db: Session, municipality_id: UUID, count: int) -> list[str]:
+    """Allocate `count` complaint numbers in one round trip."""
+    if settings.complaint_number_per_municipality:
+        prefix, last = _advance_municipal_series(db, municipality_id, count)
+        return [f"{prefix}-{value:06d}" for value in range(last - count + 1, last + 1)]
+    values = db.execute(
+        select(COMPLAINT_NUMBER_SEQ.next_value()).select_from(func.generate_series(1, count))
+    ).scalars().all()
+    return [f"{value:06d}" for value in values]
+
+
+def _series_prefix(municipality_id: UUID) -> str:
+    """Prefix for a municipality's first counter row: taken from its id, so it
+    does not depend on which municipality happened to file first."""
+    return municipality_id.hex[:SERIES_PREFIX_LENGTH].upper()
+
+
+def _advance_municipal_series(db: Session, municipality_id: UUID, count: int) -> tuple[str, int]:
+    """Add `count` to the municipality's counter row (created on first use); return (prefix, new last value)."""
+    row = db.execute(
+        update(ComplaintNumberSeries)
+        .where(ComplaintNumberSeries.municipality_id == municipality_id)
+        .values(last_value=ComplaintNumberSeries.last_value + count)
+        .returning(ComplaintNumberSeries.prefix, ComplaintNumberSeries.last_value)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is not None:
+        return row[0], row[1]
+
+    # First complaint for this municipality: a concurrent first insert turns
+    # into an increment instead of failing on the unique constraint.
+    stmt = pg_insert(ComplaintNumberSeries).values(
+        municipality_id=municipality_id,
+        prefix=_series_prefix(municipality_id),
+        last_value=count,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ComplaintNumberSeries.municipality_id],
+        set_={"last_value": ComplaintNumberSeries.last_value + count},
+    ).returning(ComplaintNumberSeries.prefix, ComplaintNumberSeries.last_value)
+    row = db.execute(stmt).one()
+    return row[0], row[1]
+
+
+def next_tracking_code() -> str:
+    """Take a tracking code from this worker's pre-generated block."""
+    with _code_pool_lock:
+        if not _code_pool:
+            raw = secrets.token_bytes(TRACKING_CODE_LENGTH * TRACKING_CODE_BLOCK)
+            for i in range(0, len(raw), TRACKING_CODE_LENGTH):
+                chunk = raw[i:i + TRACKING_CODE_LENGTH]
+                _code_pool.append("".join(TRACKING_CHARS[b & 31] for b in chunk))
+        return _code_pool.popleft()
+
+
+def insert_service_request(db: Session, values: dict[str, Any]) -> ServiceRequest:
+    """INSERT a service request with a fresh tracking code in one statement.
+
+    Uniqueness is enforced by the tracking_code unique index: a colliding
+    code makes ``ON CONFLICT DO NOTHING`` return no row and we retry with the
+    next code, so the common case costs exactly one INSERT. The denormalized
+    governorate_id is filled in by the same statement.
+    """
+    if "governorate_id" not in values:
+        values = dict(values, governorate_id=(
+            select(Municipality.governorate_id)
+            .where(Municipality.id == values["municipality_id"])
+            .scalar_subquery()
+        ))
+    for _ in range(TRACKING_CODE_ATTEMPTS):
+        stmt = (
+            pg_insert(ServiceRequest)
+            .values(tracking_code=next_tracking_code(), **values)
+            .on_conflict_do_nothing(index_elements=[ServiceRequest.tracking_code])
+            .returning(ServiceRequest)
+        )
+        req = db.scalars(stmt).first()
+        if req is not None:
+            return req
+    raise HTTPException(status_code=500, detail="Could not generate unique tracking code")
+
+
+def insert_service_requests(db: Session, rows: list[dict[str, Any]]) -> list[ServiceRequest]:
+    """Multi-row variant of ``insert_service_request``.
+
+    Rows are sent as one batched INSERT; only rows whose tracking code hit the
+    unique index are retried. The result is in the same order as `rows`.
+    """
+    municipality_ids = {row["municipality_id"] for row in rows if "governorate_id" not in row}
+    if municipality_ids:
+        governorates = dict(
+            db.query(Municipality.id, Municipality.governorate_id)
+            .filter(Municipality.id.in_(municipality_ids))
+            .all()
+        )
+        rows = [
+            row if "governorate_id" in row
+            else dict(row, governorate_id=governorates.get(row["municipality_id"]))
+            for row in rows
+        ]
+    stmt = (
+        pg_insert(ServiceRequest)
+        .on_conflict_do_nothing(index_elements=[ServiceRequest.tracking_code])
+        .returning(ServiceRequest)
+    )
+    created: list[ServiceRequest | None] = [None] * len(rows)
+    pending = list(range(len(rows)))
+    for _ in range(TRACKING_CODE_ATTEMPTS):
+        codes = {next_tracking_code(): i for i in pending}
+        params = [dict(rows[i], tracking_code=code) for code, i in codes.items()]
+        for req in db.scalars(stmt, params).all():
+            created[codes[req.tracking_code]] = req
+        pending = [i for i in pending if created[i] is None]
+        if not pending:
+            return created
+    raise HTTPException(status_code=500, detail="Could not generate unique tracking code")
@@ -0,0 +1,160 @@
+"""Transactional outbox for side effects that can run after the response.
+
+Writers call ``enqueue`` inside their own transaction, so the outbox row
+commits (or rolls back) together with the business rows. A background
+thread per uvicorn worker drains pending rows with ``FOR UPDATE SKIP
+LOCKED``, which lets several workers share the table without double
+processing. A failed event is retried with exponential backoff through
+``next_attempt_at`` until ``outbox_max_attempts`` is reached.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import OutboxEvent
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+OutboxHandler = Callable[[Session, Dict[str, Any]], None]
+_handlers: Dict[str, OutboxHandler] = {}
+
+
+def register_handler(kind: str):
+    """Decorator: register the function that processes outbox events of `kind`."""
+    def _decorator(fn: OutboxHandler) -> OutboxHandler:
+        _handlers[kind] = fn
+        return fn
+    return _decorator
+
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any]) -> None:
+    """Add an outbox event to the caller's transaction."""
+    db.add(OutboxEvent(kind=kind, payload=payload))
+    db.info["outbox_pending"] = True
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next attempt of an event that has failed `attempts` times."""
+    seconds = settings.outbox_retry_base_seconds * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.outbox_retry_max_seconds))
+
+
+class OutboxWorker:
+    """Background thread that processes pending outbox events."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(settings.outbox_poll_interval_seconds)
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Outbox drain failed")
+
+    def drain(self) -> int:
+        """Process due events until none are left; return how many succeeded.
+
+        Stops early when a whole batch failed: those events are not due again
+        until their backoff has passed.
+        """
+        handled = 0
+        while not self._stopping.is_set():
+            fetched, succeeded = self._process_batch()
+            handled += succeeded
+            if fetched == 0 or succeeded == 0:
+                break
+        return handled
+
+    def _process_batch(self) -> Tuple[int, int]:
+        db = self._session_factory()
+        try:
+            events = (
+                db.query(OutboxEvent)
+                .filter(
+                    OutboxEvent.processed_at.is_(None),
+                    OutboxEvent.next_attempt_at <= datetime.now(timezone.utc),
+                )
+                .order_by(OutboxEvent.next_attempt_at)
+                .limit(settings.outbox_batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            succeeded = sum(self._process_event(db, evt) for evt in events)
+            db.commit()
+            return len(events), succeeded
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _process_event(self, db: Session, evt: OutboxEvent) -> bool:
+        handler = _handlers.get(evt.kind)
+        now = datetime.now(timezone.utc)
+        if handler is None:
+            logger.error("No outbox handler for kind=%s (event %s)", evt.kind, evt.id)
+            evt.last_error = "no handler registered"
+            evt.processed_at = now
+            return False
+        savepoint = db.begin_nested()
+        try:
+            handler(db, evt.payload or {})
+            savepoint.commit()
+            evt.processed_at = now
+            return True
+        except Exception as exc:
+            savepoint.rollback()
+            evt.attempts += 1
+            evt.last_error = str(exc)[:1000]
+            logger.warning("Outbox event %s (%s) failed: %s", evt.id, evt.kind, exc)
+            if evt.attempts >= settings.outbox_max_attempts:
+                logger.error("Outbox event %s gave up after %d attempts", evt.id, evt.attempts)
+                evt.processed_at = now
+            else:
+                evt.next_attempt_at = now + retry_delay(evt.attempts)
+            return False
+
+
+worker = OutboxWorker()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_worker_after_commit(session: Session) -> None:
+    if session.info.pop("outbox_pending", False):
+        worker.wake()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_pending_after_rollback(session: Session) -> None:
+    session.info.pop("outbox_pending", None)
@@ -0,0 +1,130 @@
+"""Bounded process pool for bcrypt hashing and verification.
+
+bcrypt is deliberately slow CPU work. Running it in the request threadpool
+lets a burst of logins starve every other sync endpoint, so it runs in a
+small per-worker process pool instead. Admission is bounded: once
+``password_pool_workers + password_pool_queue_limit`` jobs are in flight,
+new ones are rejected immediately with 503 rather than queueing behind them.
+A job counts as in flight until it actually finishes, even when its caller
+has already given up waiting for it.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from app import auth
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="الخادم مشغول حالياً، يرجى المحاولة بعد قليل",
+        headers={"Retry-After": "2"},
+    )
+
+
+class _PasswordPool:
+    def __init__(self):
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats: Dict[str, Dict[str, float]] = {
+            op: {"calls": 0, "rejected": 0, "seconds": 0.0, "max_seconds": 0.0}
+            for op in ("verify", "hash")
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: uvicorn workers are multi-threaded by the time we get here
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.password_pool_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def run(self, op: str, fn: Callable[..., Any], *args: Any) -> Any:
+        capacity = settings.password_pool_workers + settings.password_pool_queue_limit
+        with self._lock:
+            if self._in_flight >= capacity:
+                self._stats[op]["rejected"] += 1
+                raise _busy()
+            self._in_flight += 1
+            executor = self._get_executor()
+        started = time.perf_counter()
+        try:
+            try:
+                future = executor.submit(fn, *args)
+            except BaseException:
+                self._release()
+                raise
+            # The slot is freed when the job ends, not when this caller stops waiting
+            future.add_done_callback(self._release)
+            try:
+                return future.result(timeout=settings.password_pool_timeout_seconds)
+            except FutureTimeoutError:
+                future.cancel()  # only succeeds while the job is still queued
+                raise _busy()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                stats = self._stats[op]
+                stats["calls"] += 1
+                stats["seconds"] += elapsed
+                stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def mean_seconds(self, op: str) -> Optional[float]:
+        with self._lock:
+            stats = self._stats[op]
+            return stats["seconds"] / stats["calls"] if stats["calls"] else None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result: Dict[str, Any] = {
+                "workers": settings.password_pool_workers,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - settings.password_pool_workers),
+            }
+            for op, stats in self._stats.items():
+                calls = stats["calls"]
+                result[op] = {
+                    "calls": calls,
+                    "rejected": stats["rejected"],
+                    "mean_ms": round(stats["seconds"] * 1000 / calls, 1) if calls else 0.0,
+                    "max_ms": round(stats["max_seconds"] * 1000, 1),
+                }
+            return result
+
+
+pool = _PasswordPool()
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return pool.run("verify", auth.verify_password, plain, hashed)
+
+
+def hash_password(plain: str) -> str:
+    return pool.run("hash", auth.hash_password, plain)
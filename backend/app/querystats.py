@@ -0,0 +1,135 @@
+"""Per-request SQL statement counting and N+1 detection.
+
+Every statement executed while an HTTP request is being handled is counted
+against it (sync endpoints run in the threadpool with the request's context,
+so the context variable follows them). A statement text repeated
+``query_repeat_threshold`` times or more in one request is reported as an
+N+1 suspect: logged once per endpoint and statement per worker, and counted
+in the per-endpoint metrics on /internal/metrics. In development the counts
+are also returned as ``X-DB-*`` response headers.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_send_headers = (
+    settings.query_stats_headers
+    if settings.query_stats_headers is not None
+    else settings.environment == "development"
+)
+
+
+class _RequestQueries:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def suspects(self) -> Dict[str, int]:
+        threshold = settings.query_repeat_threshold
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+
+_current: ContextVar[Optional[_RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    if queries is None:
+        return
+    started = conn.info.get("query_started")
+    if started:
+        queries.seconds += time.perf_counter() - started.pop()
+    queries.count += 1
+    queries.statements[statement] += 1
+
+
+class _EndpointStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._reported: Set[Tuple[str, str]] = set()
+
+    def record(self, endpoint: str, queries: _RequestQueries) -> None:
+        suspects = queries.suspects()
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                "requests": 0, "queries": 0, "max_queries": 0, "db_seconds": 0.0, "n_plus_one_requests": 0,
+            })
+            stats["requests"] += 1
+            stats["queries"] += queries.count
+            stats["max_queries"] = max(stats["max_queries"], queries.count)
+            stats["db_seconds"] += queries.seconds
+            if suspects:
+                stats["n_plus_one_requests"] += 1
+            new = [(sql, n) for sql, n in suspects.items() if (endpoint, sql) not in self._reported]
+            self._reported.update((endpoint, sql) for sql, _ in new)
+        for sql, n in new:
+            logger.warning("Possible N+1 in %s: statement ran %d times: %s", endpoint, n, " ".join(sql.split())[:300])
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": stats["requests"],
+                    "mean_queries": round(stats["queries"] / stats["requests"], 1),
+                    "max_queries": stats["max_queries"],
+                    "mean_db_ms": round(stats["db_seconds"] * 1000 / stats["requests"], 1),
+                    "n_plus_one_requests": stats["n_plus_one_requests"],
+                }
+                for endpoint, stats in self._endpoints.items()
+            }
+
+
+endpoint_stats = _EndpointStats()
+
+
+class QueryStatsMiddleware:
+    """Count the statements of each HTTP request and record them per endpoint."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = _RequestQueries()
+        token = _current.set(queries)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and _send_headers:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(queries.count).encode()))
+                headers.append((b"x-db-time-ms", f"{queries.seconds * 1000:.1f}".encode()))
+                headers.append((b"x-db-repeated", str(len(queries.suspects())).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {getattr(route, 'path', 'unmatched')}"
+            endpoint_stats.record(endpoint, queries)
@@ -0,0 +1,149 @@
+"""Token-bucket rate limiting with counters shared by every worker.
+
+Each bucket is one row in ``rate_limit_buckets``. A check is a single
+``INSERT ... ON CONFLICT DO UPDATE ... WHERE ... RETURNING`` statement, so
+the refill, the limit test and the spend happen atomically in PostgreSQL:
+the limit holds across uvicorn workers and restarts. Checks run on their
+own autocommit pool without pre-ping (``ratelimit_engine``), so no BEGIN,
+COMMIT or ping surrounds the statement and a check costs one round trip.
+A rejected check updates nothing and returns no row.
+
+``RATE_LIMIT_BACKEND=memory`` keeps the buckets in the process instead
+(single-worker development only; each worker then counts separately).
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+
+from app.config import get_settings
+from app.database import ratelimit_engine
+from app.models import RateLimitBucket
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """`capacity` requests per `period_seconds`, refilled continuously."""
+    capacity: int
+    period_seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period_seconds
+
+    @property
+    def retry_after_seconds(self) -> int:
+        """Upper bound on the wait for one token once the bucket is empty."""
+        return math.ceil(self.period_seconds / self.capacity)
+
+
+_stats_lock = threading.Lock()
+_stats = {"checks": 0, "rejected": 0, "errors": 0, "seconds": 0.0}
+_memory_buckets: Dict[str, tuple[float, float]] = {}
+_memory_lock = threading.Lock()
+_last_purge = time.monotonic()
+
+
+def _consume_postgres(key: str, limit: RateLimit) -> bool:
+    elapsed = func.extract("epoch", func.clock_timestamp() - RateLimitBucket.updated_at)
+    refilled = func.least(limit.capacity, RateLimitBucket.tokens + elapsed * limit.refill_per_second)
+    stmt = (
+        pg_insert(RateLimitBucket)
+        .values(key=key, tokens=limit.capacity - 1, updated_at=func.clock_timestamp())
+        .on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={"tokens": refilled - 1, "updated_at": func.clock_timestamp()},
+            where=refilled >= 1,
+        )
+        .returning(RateLimitBucket.tokens)
+    )
+    try:
+        with ratelimit_engine.connect() as conn:
+            return conn.execute(stmt).first() is not None
+    except DBAPIError as exc:
+        # Without pre-ping a connection the server dropped fails on use; the
+        # pool has discarded it, so one retry gets a fresh one
+        if not exc.connection_invalidated:
+            raise
+    with ratelimit_engine.connect() as conn:
+        return conn.execute(stmt).first() is not None
+
+
+def _consume_memory(key: str, limit: RateLimit) -> bool:
+    now = time.monotonic()
+    with _memory_lock:
+        tokens, updated = _memory_buckets.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.refill_per_second)
+        if tokens < 1:
+            return False
+        _memory_buckets[key] = (tokens - 1, now)
+        return True
+
+
+def _purge_idle_buckets() -> None:
+    """Drop buckets idle for longer than the retention window (at most once per interval per worker)."""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < settings.rate_limit_purge_interval_seconds:
+        return
+    _last_purge = now
+    if settings.rate_limit_backend == "memory":
+        return
+    with ratelimit_engine.connect() as conn:
+        conn.execute(
+            delete(RateLimitBucket).where(
+                RateLimitBucket.updated_at
+                < func.clock_timestamp() - text(f"interval '{int(settings.rate_limit_retention_seconds)} seconds'")
+            )
+        )
+
+
+def consume(key: str, limit: RateLimit) -> bool:
+    """Spend one token from `key`'s bucket; False when the limit is exhausted.
+
+    If the store is unreachable the request is allowed (fail open): the
+    database outage will surface on the endpoint itself.
+    """
+    started = time.perf_counter()
+    error = False
+    try:
+        if settings.rate_limit_backend == "memory":
+            allowed = _consume_memory(key, limit)
+        else:
+            allowed = _consume_postgres(key, limit)
+    except Exception as exc:
+        logger.warning("Rate limit check for %s failed, allowing: %s", key, exc)
+        allowed, error = True, True
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        _stats["checks"] += 1
+        _stats["seconds"] += elapsed
+        _stats["rejected"] += not allowed
+        _stats["errors"] += error
+    try:
+        _purge_idle_buckets()
+    except Exception as exc:
+        logger.warning("Could not purge idle rate limit buckets: %s", exc)
+    return allowed
+
+
+def ratelimit_stats() -> Dict[str, Any]:
+    """Check counters and mean limiter latency for this worker."""
+    with _stats_lock:
+        checks = _stats["checks"]
+        return {
+            "backend": settings.rate_limit_backend,
+            "checks": checks,
+            "rejected": _stats["rejected"],
+            "errors": _stats["errors"],
+            "mean_ms": round(_stats["seconds"] * 1000 / checks, 3) if checks else 0.0,
+        }
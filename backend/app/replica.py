@@ -0,0 +1,214 @@
+"""Routing of read-only endpoints to a streaming replica.
+
+``get_read_db`` hands out a replica session when one is configured, healthy
+and within ``replica_max_lag_seconds`` of the primary; otherwise it falls
+back to the primary. Replica status is sampled at most once per
+``replica_status_interval_seconds`` per worker.
+
+Read-your-writes: an authenticated client that sends ``X-Read-After-Write``
+on a write gets the primary's WAL position back in ``X-Read-After`` when the
+request committed changes. A client that sends that position on later reads
+is only served from the replica once the replica has replayed past it. Other
+writes cost nothing extra.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import anyio
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from app.config import get_settings
+from app.database import ReplicaSessionLocal, SessionLocal, engine, replica_engine
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+READ_AFTER_HEADER = "X-Read-After"
+READ_AFTER_WRITE_HEADER = "X-Read-After-Write"
+_OPT_IN = READ_AFTER_WRITE_HEADER.lower().encode()
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+_REPLICA_STATUS_SQL = text(
+    "SELECT pg_last_wal_replay_lsn()::text, "
+    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def parse_lsn(value: Optional[str]) -> Optional[int]:
+    """Parse a PostgreSQL LSN such as ``16/B374D848``; None if malformed."""
+    if not value:
+        return None
+    high, sep, low = value.strip().partition("/")
+    if not sep:
+        return None
+    try:
+        return (int(high, 16) << 32) | int(low, 16)
+    except ValueError:
+        return None
+
+
+class _ReplicaRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._checked_at: Optional[float] = None
+        self._healthy = False
+        self._replay_lsn = 0
+        self._lag_seconds: Optional[float] = None
+        self._stats: Dict[str, int] = {
+            "replica": 0,
+            "primary_lag": 0,
+            "primary_read_after": 0,
+            "primary_unavailable": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return ReplicaSessionLocal is not None
+
+    def _refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        checked_at = self._checked_at
+        if not force and checked_at is not None and now - checked_at < settings.replica_status_interval_seconds:
+            return
+        # One sampler at a time; concurrent callers use the previous sample
+        if not self._lock.acquire(blocking=force or checked_at is None):
+            return
+        try:
+            try:
+                with replica_engine.connect() as conn:
+                    lsn, lag = conn.execute(_REPLICA_STATUS_SQL).one()
+                replay_lsn = parse_lsn(lsn)
+                self._healthy = replay_lsn is not None
+                self._replay_lsn = replay_lsn or 0
+                self._lag_seconds = float(lag) if lag is not None else None
+            except Exception as exc:
+                if self._healthy or self._checked_at is None:
+                    logger.warning("Read replica unavailable, using the primary: %s", exc)
+                self._healthy = False
+            self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _count(self, outcome: str) -> None:
+        with self._stats_lock:
+            self._stats[outcome] += 1
+
+    def use_replica(self, read_after: Optional[str]) -> bool:
+        if not self.enabled:
+            return False
+        self._refresh()
+        if not self._healthy:
+            self._count("primary_unavailable")
+            return False
+        if self._lag_seconds is None or self._lag_seconds > settings.replica_max_lag_seconds:
+            self._count("primary_lag")
+            return False
+        position = parse_lsn(read_after)
+        if position is not None and self._replay_lsn < position:
+            # The sample may just be old: look once more before giving up
+            self._refresh(force=True)
+            if self._replay_lsn < position:
+                self._count("primary_read_after")
+                return False
+        self._count("replica")
+        return True
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "healthy": self._healthy,
+                "lag_seconds": self._lag_seconds,
+                "reads": dict(self._stats),
+            }
+
+
+router = _ReplicaRouter()
+
+
+def get_read_db(request: Request):
+    """Session for read-only endpoints: the replica when it is fresh enough."""
+    use_replica = router.use_replica(request.headers.get(READ_AFTER_HEADER))
+    db = (ReplicaSessionLocal if use_replica else SessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Set by ReadAfterWriteMiddleware for opted-in requests; sessions append to
+# it when they commit changes. Thread-pool calls share the list through the
+# copied context
+_committed_writes: ContextVar[Optional[List[bool]]] = ContextVar("committed_writes", default=None)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _note_flush(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _note_dml(state: ORMExecuteState) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_committed_write(session: Session) -> None:
+    if session.info.pop("wrote", False):
+        writes = _committed_writes.get()
+        if writes is not None:
+            writes.append(True)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_rolled_back_write(session: Session) -> None:
+    session.info.pop("wrote", None)
+
+
+def _primary_wal_position() -> str:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+
+
+class ReadAfterWriteMiddleware:
+    """Attach the primary's WAL position to opted-in authenticated writes that committed."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] in SAFE_METHODS
+            or not {b"authorization", _OPT_IN} <= {name for name, _ in scope["headers"]}
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        writes: List[bool] = []
+
+        async def send_with_position(message):
+            if message["type"] == "http.response.start" and message["status"] < 400 and writes:
+                try:
+                    position = await anyio.to_thread.run_sync(_primary_wal_position)
+                except Exception as exc:
+                    logger.warning("Could not read the WAL position: %s", exc)
+                else:
+                    headers = list(message.get("headers", []))
+                    headers.append((READ_AFTER_HEADER.lower().encode(), position.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _committed_writes.set(writes)
+        try:
+            await self.app(scope, receive, send_with_position)
+        finally:
+            _committed_writes.reset(token)
@@ -7,15 +7,27 @@ from typing import Any, Dict, List, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
-from fastapi.responses import StreamingResponse
-from sqlalchemy import and_, case, func, or_
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import and_, case, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 
+from app.cache import bump_cache_version
 from app.config import get_settings
-from app.database import get_db
-from app.deps import get_current_user, require_roles, require_district_scope, require_municipality_scope
+from app.counts import COUNT_STRATEGIES, count_requests, request_created
+from app.database import get_async_db, get_db
+from app.deps import Principal, get_current_user, principal_changed, require_roles, require_district_scope, require_municipality_scope
 from app.models import Attachment, AuditLog, District, Governorate, MaterialUsed, MunicipalTeam, Municipality, Notification, RequestUpdate, ServiceRequest, User
-from app.auth import hash_password
+from app.events import publish
+from app.geoindex import OPEN_STATUSES, publish_geo
+from app.idempotency import IdempotentRoute
+from app.numbering import allocate_complaint_number, allocate_complaint_numbers, insert_service_request, insert_service_requests
+from app.outbox import enqueue, register_handler
+from app.pagination import SORT_COLUMNS, SORT_DIRECTIONS, InvalidCursor, after_cursor, decode_cursor, encode_cursor, sort_order
+from app.password_pool import hash_password
+from app.replica import get_read_db
+from app.search import search_condition, search_rank
 from app.schemas import (
     AccountabilityReport,
     AccountabilityTopEntity,
@@ -23,6 +35,9 @@ from app.schemas import (
     ArchiveRequest,
     AssignStaffRequest,
     AttachmentOut,
+    BulkServiceRequestCreate,
+    BulkServiceRequestItemResult,
+    BulkServiceRequestResult,
     CreateMayorRequest,
     CreateMukhtarRequest,
     DistrictCreate,
@@ -37,6 +52,7 @@ from app.schemas import (
     MayorPerformanceDashboard,
     MayorPerformanceHighlights,
     MayorTeamPerformance,
+    MergeRequestsRequest,
     MaterialUsedCreate,
     MaterialUsedOut,
     MunicipalTeamCreate,
@@ -60,7 +76,7 @@ from app.schemas import (
 from app.sla import calculate_sla_status, can_transition, get_sla_deadline, ROLE_TRANSITIONS
 
 settings = get_settings()
-router = APIRouter(prefix="/admin", tags=["admin"])
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=IdempotentRoute)
 
 ALLOWED_ROLES = ("district_admin", "municipal_admin", "staff", "governor", "mayor", "mukhtar")
 ALERT_THRESHOLDS = {
@@ -70,22 +86,41 @@ ALERT_THRESHOLDS = {
 }
 
 
-def _scoped_requests(db: Session, user: User):
+def _user_scope(user: Principal):
+    """The service-request predicate for the user's access level, if any.
+
+    Every column involved is on service_requests itself (governorate_id is
+    denormalized), so each scope is a single indexed equality.
+    """
+    if user.role == "governor":
+        return ServiceRequest.governorate_id == user.governorate_id
+    if user.role in ("municipal_admin", "mayor"):
+        return ServiceRequest.municipality_id == user.municipality_id
+    if user.role in ("district_admin", "mukhtar"):
+        return ServiceRequest.district_id == user.district_id
+    if user.role == "staff":
+        return ServiceRequest.assigned_to_user_id == user.id
+    return None
+
+
+def _scoped_requests(db: Session, user: Principal):
     """Return a base query scoped to the user's access level."""
     q = db.query(ServiceRequest)
-    if user.role == "governor":
-        from sqlalchemy import select
-        mun_subq = select(Municipality.id).where(Municipality.governorate_id == user.governorate_id)
-        q = q.filter(ServiceRequest.municipality_id.in_(mun_subq))
-    elif user.role in ("municipal_admin", "mayor"):
-        q = q.filter(ServiceRequest.municipality_id == user.municipality_id)
-    elif user.role in ("district_admin", "mukhtar"):
-        q = q.filter(ServiceRequest.district_id == user.district_id)
-    elif user.role == "staff":
-        q = q.filter(ServiceRequest.assigned_to_user_id == user.id)
+    scope = _user_scope(user)
+    if scope is not None:
+        q = q.filter(scope)
     return q
 
 
+def _scoped_select(user: Principal, *columns):
+    """select() counterpart of _scoped_requests, for AsyncSession endpoints."""
+    stmt = select(*columns) if columns else select(ServiceRequest)
+    scope = _user_scope(user)
+    if scope is not None:
+        stmt = stmt.where(scope)
+    return stmt
+
+
 def _log(db: Session, actor_id, action: str, entity_type: str, entity_id: str, details: str = None):
     entry = AuditLog(
         actor_user_id=actor_id,
@@ -97,6 +132,11 @@ def _log(db: Session, actor_id, action: str, entity_type: str, entity_id: str, d
     db.add(entry)
 
 
+def _request_changed(db: Session, req: ServiceRequest) -> None:
+    """Tell every worker that `req` changed (public tracking cache, live streams)."""
+    publish(db, "request_changed", req.tracking_code)
+
+
 def _create_notification(
     db: Session,
     user_id: UUID,
@@ -118,19 +158,13 @@ def _create_notification(
     ))
 
 
-def _notify_request_scope(
-    db: Session,
-    req: ServiceRequest,
-    kind: str,
-    title: str,
-    message: str,
-    severity: str = "info",
-):
+def _scope_recipient_ids(db: Session, municipality_id: UUID, district_id: UUID) -> list[UUID]:
+    """Active governors, mayors and mukhtars responsible for a municipality/district."""
     governor_users = (
         db.query(User.id)
         .join(Municipality, Municipality.governorate_id == User.governorate_id)
         .filter(
-            Municipality.id == req.municipality_id,
+            Municipality.id == municipality_id,
             User.role == "governor",
             User.is_active.is_(True),
         )
@@ -138,19 +172,29 @@ def _notify_request_scope(
     )
     mayor_users = db.query(User.id).filter(
         User.role == "mayor",
-        User.municipality_id == req.municipality_id,
+        User.municipality_id == municipality_id,
         User.is_active.is_(True),
     ).all()
     mukhtar_users = db.query(User.id).filter(
         User.role == "mukhtar",
-        User.district_id == req.district_id,
+        User.district_id == district_id,
         User.is_active.is_(True),
     ).all()
+    return [row[0] for row in governor_users + mayor_users + mukhtar_users]
+
 
-    for row in governor_users + mayor_users + mukhtar_users:
+def _notify_request_scope(
+    db: Session,
+    req: ServiceRequest,
+    kind: str,
+    title: str,
+    message: str,
+    severity: str = "info",
+):
+    for user_id in _scope_recipient_ids(db, req.municipality_id, req.district_id):
         _create_notification(
             db=db,
-            user_id=row[0],
+            user_id=user_id,
             kind=kind,
             title=title,
             message=message,
@@ -160,6 +204,69 @@ def _notify_request_scope(
         )
 
 
+@register_handler("request_created")
+def _handle_request_created(db: Session, payload: Dict[str, Any]) -> None:
+    """Outbox handler: notify the request's scope and write the audit entry."""
+    req = db.query(ServiceRequest).filter(ServiceRequest.id == UUID(payload["request_id"])).first()
+    if not req:
+        return
+    # Sent for likely duplicates too: the link is only a proximity guess
+    _notify_request_scope(
+        db,
+        req,
+        kind="new_complaint",
+        title="شكوى جديدة",
+        message=f"تم تسجيل شكوى جديدة برقم {req.complaint_number or req.tracking_code}",
+        severity="info",
+    )
+    if payload.get("actor_user_id"):
+        _log(db, UUID(payload["actor_user_id"]), "create_request", "service_request", req.id)
+
+
+@register_handler("requests_bulk_created")
+def _handle_requests_bulk_created(db: Session, payload: Dict[str, Any]) -> None:
+    """Outbox handler for bulk intake: one recipient lookup per scope, multi-row inserts."""
+    reqs = db.query(
+        ServiceRequest.id,
+        ServiceRequest.municipality_id,
+        ServiceRequest.district_id,
+        ServiceRequest.complaint_number,
+        ServiceRequest.tracking_code,
+    ).filter(ServiceRequest.id.in_([UUID(i) for i in payload["request_ids"]])).all()
+    if not reqs:
+        return
+    recipients: Dict[tuple, list[UUID]] = {}
+    notifications = []
+    for req in reqs:
+        scope = (req.municipality_id, req.district_id)
+        if scope not in recipients:
+            recipients[scope] = _scope_recipient_ids(db, *scope)
+        notifications.extend(
+            dict(
+                user_id=user_id,
+                kind="new_complaint",
+                severity="info",
+                title="شكوى جديدة",
+                message=f"تم تسجيل شكوى جديدة برقم {req.complaint_number or req.tracking_code}",
+                related_entity_type="service_request",
+                related_entity_id=str(req.id),
+            )
+            for user_id in recipients[scope]
+        )
+    if notifications:
+        db.execute(insert(Notification), notifications)
+    db.execute(insert(AuditLog), [
+        dict(
+            actor_user_id=UUID(payload["actor_user_id"]),
+            action="create_request",
+            entity_type="service_request",
+            entity_id=str(req.id),
+            details="bulk",
+        )
+        for req in reqs
+    ])
+
+
 def _signal_from_ratio(value: float, good_threshold: float, moderate_threshold: float, invert: bool = False) -> str:
     """Map metric ratio/avg into good/moderate/poor."""
     if invert:
@@ -192,38 +299,11 @@ def _extract_name_code(name: str, length: int = 3) -> str:
     return (result or "XXX")[:length].upper()
 
 
-def _generate_complaint_number(db: Session, district: District) -> str:
-    """Generate a unique numeric-only complaint number (zero-padded 6-digit sequence)."""
-    from sqlalchemy import func, cast, Integer
-
-    # Find the current max numeric complaint number (PostgreSQL regex operator)
-    max_num = (
-        db.query(func.max(cast(ServiceRequest.complaint_number, Integer)))
-        .filter(ServiceRequest.complaint_number.op("~")(r"^\d+$"))
-        .scalar()
-    )
-    seq = (max_num or 0) + 1
-
-    for attempt in range(100):
-        candidate = f"{(seq + attempt):06d}"
-        if not db.query(ServiceRequest).filter(
-            ServiceRequest.complaint_number == candidate
-        ).first():
-            return candidate
-
-    # Ultimate fallback (should not happen in normal operation)
-    import logging
-    logging.getLogger(__name__).warning(
-        "Complaint number generation required fallback at seq=%d", seq
-    )
-    return f"{seq + 100:06d}"
-
-
 # ─── Governorates ─────────────────────────────────────────────────────────────
 
 @router.get("/governorates", response_model=list[GovernorateOut])
 def list_governorates(
-    current_user: User = Depends(require_roles("governor")),
+    current_user: Principal = Depends(require_roles("governor")),
     db: Session = Depends(get_db),
 ):
     return db.query(Governorate).filter(Governorate.id == current_user.governorate_id).all()
@@ -233,7 +313,7 @@ def list_governorates(
 
 @router.get("/municipalities", response_model=list[MunicipalityOut])
 def list_municipalities(
-    current_user: User = Depends(require_roles("governor")),
+    current_user: Principal = Depends(require_roles("governor")),
     db: Session = Depends(get_db),
 ):
     return (
@@ -247,7 +327,7 @@ def list_municipalities(
 @router.post("/municipalities", response_model=MunicipalityOut, status_code=201)
 def create_municipality(
     payload: MunicipalityCreate,
-    current_user: User = Depends(require_roles("governor")),
+    current_user: Principal = Depends(require_roles("governor")),
     db: Session = Depends(get_db),
 ):
     mun = Municipality(
@@ -258,6 +338,7 @@ def create_municipality(
     db.add(mun)
     db.flush()
     _log(db, current_user.id, "create_municipality", "municipality", str(mun.id), payload.name)
+    bump_cache_version(db, "hierarchy")
     db.commit()
     db.refresh(mun)
     return mun
@@ -267,7 +348,7 @@ def create_municipality(
 def update_municipality(
     municipality_id: UUID,
     payload: MunicipalityUpdate,
-    current_user: User = Depends(require_roles("governor")),
+    current_user: Principal = Depends(require_roles("governor")),
     db: Session = Depends(get_db),
 ):
     mun = db.query(Municipality).filter(
@@ -281,6 +362,7 @@ def update_municipality(
     if payload.is_active is not None:
         mun.is_active = payload.is_active
     _log(db, current_user.id, "update_municipality", "municipality", str(municipality_id))
+    bump_cache_version(db, "hierarchy")
     db.commit()
     db.refresh(mun)
     return mun
@@ -289,7 +371,7 @@ def update_municipality(
 @router.delete("/municipalities/{municipality_id}", status_code=204)
 def delete_municipality(
     municipality_id: UUID,
-    current_user: User = Depends(require_roles("governor")),
+    current_user: Principal = Depends(require_roles("governor")),
     db: Session = Depends(get_db),
 ):
     mun = db.query(Municipality).filter(
@@ -300,6 +382,7 @@ def delete_municipality(
         raise HTTPException(status_code=404, detail="Municipality not found")
     mun.is_active = False
     _log(db, current_user.id, "deactivate_municipality", "municipality", str(municipality_id))
+    bump_cache_version(db, "hierarchy")
     db.commit()
 
 
@@ -307,7 +390,7 @@ def delete_municipality(
 
 @router.get("/districts", response_model=list[DistrictOut])
 def list_districts_admin(
-    current_user: User = Depends(require_roles("mayor", "governor")),
+    current_user: Principal = Depends(require_roles("mayor", "governor")),
     db: Session = Depends(get_db),
 ):
     if current_user.role == "mayor":
@@ -318,7 +401,6 @@ def list_districts_admin(
             .all()
         )
     # governor: list all districts in their governorate's municipalities
-    from sqlalchemy import select
     mun_subq = select(Municipality.id).where(Municipality.governorate_id == current_user.governorate_id)
     return (
         db.query(District)
@@ -331,7 +413,7 @@ def list_districts_admin(
 @router.post("/districts", response_model=DistrictOut, status_code=201)
 def create_district(
     payload: DistrictCreate,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     district = District(
@@ -342,6 +424,7 @@ def create_district(
     db.add(district)
     db.flush()
     _log(db, current_user.id, "create_district", "district", str(district.id), payload.name)
+    bump_cache_version(db, "hierarchy")
     db.commit()
     db.refresh(district)
     return district
@@ -351,7 +434,7 @@ def create_district(
 def update_district(
     district_id: UUID,
     payload: DistrictUpdate,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     district = db.query(District).filter(
@@ -365,6 +448,7 @@ def update_district(
     if payload.is_active is not None:
         district.is_active = payload.is_active
     _log(db, current_user.id, "update_district", "district", str(district_id))
+    bump_cache_version(db, "hierarchy")
     db.commit()
     db.refresh(district)
     return district
@@ -373,7 +457,7 @@ def update_district(
 @router.delete("/districts/{district_id}", status_code=204)
 def delete_district(
     district_id: UUID,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     district = db.query(District).filter(
@@ -384,6 +468,7 @@ def delete_district(
         raise HTTPException(status_code=404, detail="District not found")
     district.is_active = False
     _log(db, current_user.id, "deactivate_district", "district", str(district_id))
+    bump_cache_version(db, "hierarchy")
     db.commit()
 
 
@@ -392,14 +477,13 @@ def delete_district(
 @router.get("/teams", response_model=list[MunicipalTeamOut])
 def list_teams(
     municipality_id: Optional[UUID] = Query(None),
-    current_user: User = Depends(require_roles("mayor", "governor")),
+    current_user: Principal = Depends(require_roles("mayor", "governor")),
     db: Session = Depends(get_db),
 ):
     q = db.query(MunicipalTeam)
     if current_user.role == "mayor":
         q = q.filter(MunicipalTeam.municipality_id == current_user.municipality_id)
     else:
-        from sqlalchemy import select
         mun_subq = select(Municipality.id).where(Municipality.governorate_id == current_user.governorate_id)
         q = q.filter(MunicipalTeam.municipality_id.in_(mun_subq))
         if municipality_id:
@@ -410,7 +494,7 @@ def list_teams(
 @router.post("/teams", response_model=MunicipalTeamOut, status_code=201)
 def create_team(
     payload: MunicipalTeamCreate,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     team = MunicipalTeam(
@@ -433,7 +517,7 @@ def create_team(
 def update_team(
     team_id: UUID,
     payload: MunicipalTeamUpdate,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     team = db.query(MunicipalTeam).filter(
@@ -461,7 +545,7 @@ def update_team(
 @router.delete("/teams/{team_id}", status_code=204)
 def delete_team(
     team_id: UUID,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     team = db.query(MunicipalTeam).filter(
@@ -478,70 +562,67 @@ def delete_team(
 # ─── Dashboard ─────────────────────────────────────────────────────────────────
 
 @router.get("/dashboard")
-def get_dashboard(
-    current_user: User = Depends(require_roles(*ALLOWED_ROLES)),
-    db: Session = Depends(get_db),
+async def get_dashboard(
+    current_user: Principal = Depends(require_roles(*ALLOWED_ROLES)),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict[str, Any]:
     """Return role-scoped dashboard statistics."""
     now = datetime.now(timezone.utc)
-    base_q = _scoped_requests(db, current_user)
+
+    def _count_where(*criteria):
+        return func.count(ServiceRequest.id).filter(*criteria)
+
+    async def _top(column, *criteria):
+        stmt = (
+            _scoped_select(current_user, column, func.count(ServiceRequest.id).label("cnt"))
+            .where(*criteria)
+            .group_by(column)
+            .order_by(func.count(ServiceRequest.id).desc())
+            .limit(1)
+        )
+        return (await db.execute(stmt)).first()
 
     if current_user.role in ("mukhtar", "district_admin"):
-        open_count = base_q.filter(
-            ServiceRequest.status.in_(["new", "under_review"])
-        ).count()
-        in_progress_count = base_q.filter(
-            ServiceRequest.status == "in_progress"
-        ).count()
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        resolved_this_month = base_q.filter(
-            ServiceRequest.status == "resolved",
-            ServiceRequest.closed_at >= month_start,
-        ).count()
-        resolved_total = base_q.filter(ServiceRequest.status == "resolved").count()
+        counts = (await db.execute(_scoped_select(
+            current_user,
+            _count_where(ServiceRequest.status.in_(["new", "under_review"])),
+            _count_where(ServiceRequest.status == "in_progress"),
+            _count_where(ServiceRequest.status == "resolved", ServiceRequest.closed_at >= month_start),
+            _count_where(ServiceRequest.status == "resolved"),
+        ))).one()
         return {
             "role": "mukhtar",
-            "open": open_count,
-            "in_progress": in_progress_count,
-            "resolved_this_month": resolved_this_month,
-            "resolved": resolved_total,
+            "open": counts[0],
+            "in_progress": counts[1],
+            "resolved_this_month": counts[2],
+            "resolved": counts[3],
         }
 
     if current_user.role in ("mayor", "municipal_admin"):
-        open_count = base_q.filter(
-            ServiceRequest.status.in_(["new", "under_review", "in_progress"])
-        ).count()
-        urgent_count = base_q.filter(
-            ServiceRequest.priority == "urgent",
-            ServiceRequest.status.notin_(["resolved", "rejected", "deferred"]),
-        ).count()
-        overdue_count = base_q.filter(
-            ServiceRequest.closed_at.is_(None),
-            ServiceRequest.sla_deadline < now,
-        ).count()
-        district_result = (
-            db.query(District.name, func.count(ServiceRequest.id).label("cnt"))
+        counts = (await db.execute(_scoped_select(
+            current_user,
+            _count_where(ServiceRequest.status.in_(["new", "under_review", "in_progress"])),
+            _count_where(
+                ServiceRequest.priority == "urgent",
+                ServiceRequest.status.notin_(["resolved", "rejected", "deferred"]),
+            ),
+            _count_where(ServiceRequest.closed_at.is_(None), ServiceRequest.sla_deadline < now),
+        ))).one()
+        district_result = (await db.execute(
+            select(District.name, func.count(ServiceRequest.id).label("cnt"))
             .join(ServiceRequest, ServiceRequest.district_id == District.id)
-            .filter(ServiceRequest.municipality_id == current_user.municipality_id)
+            .where(ServiceRequest.municipality_id == current_user.municipality_id)
             .group_by(District.name)
             .order_by(func.count(ServiceRequest.id).desc())
-            .first()
-        )
-        category_result = (
-            base_q
-            .with_entities(
-                ServiceRequest.category,
-                func.count(ServiceRequest.id).label("cnt"),
-            )
-            .group_by(ServiceRequest.category)
-            .order_by(func.count(ServiceRequest.id).desc())
-            .first()
-        )
+            .limit(1)
+        )).first()
+        category_result = await _top(ServiceRequest.category)
         return {
             "role": "mayor",
-            "open": open_count,
-            "urgent": urgent_count,
-            "overdue": overdue_count,
+            "open": counts[0],
+            "urgent": counts[1],
+            "overdue": counts[2],
             "most_problematic_district": district_result[0] if district_result else None,
             "most_problematic_district_count": district_result[1] if district_result else 0,
             "most_common_category": category_result[0] if category_result else None,
@@ -549,63 +630,36 @@ def get_dashboard(
         }
 
     if current_user.role == "governor":
-        from sqlalchemy import select as sa_select
-        total = base_q.count()
-        open_count = base_q.filter(
-            ServiceRequest.status.in_(["new", "under_review"])
-        ).count()
-        in_progress_count = base_q.filter(
-            ServiceRequest.status == "in_progress"
-        ).count()
-        resolved_count = base_q.filter(ServiceRequest.status == "resolved").count()
-
-        mun_subq = sa_select(Municipality.id).where(
-            Municipality.governorate_id == current_user.governorate_id
-        )
-        by_municipality = (
-            db.query(Municipality.name, func.count(ServiceRequest.id).label("cnt"))
+        counts = (await db.execute(_scoped_select(
+            current_user,
+            func.count(ServiceRequest.id),
+            _count_where(ServiceRequest.status.in_(["new", "under_review"])),
+            _count_where(ServiceRequest.status == "in_progress"),
+            _count_where(ServiceRequest.status == "resolved"),
+        ))).one()
+        by_municipality = (await db.execute(
+            select(Municipality.name, func.count(ServiceRequest.id).label("cnt"))
             .join(ServiceRequest, ServiceRequest.municipality_id == Municipality.id)
-            .filter(Municipality.governorate_id == current_user.governorate_id)
+            .where(ServiceRequest.governorate_id == current_user.governorate_id)
             .group_by(Municipality.name)
             .order_by(func.count(ServiceRequest.id).desc())
-            .all()
-        )
-        by_district = (
-            db.query(District.name, func.count(ServiceRequest.id).label("cnt"))
+        )).all()
+        by_district = (await db.execute(
+            select(District.name, func.count(ServiceRequest.id).label("cnt"))
             .join(ServiceRequest, ServiceRequest.district_id == District.id)
-            .filter(ServiceRequest.municipality_id.in_(mun_subq))
+            .where(ServiceRequest.governorate_id == current_user.governorate_id)
             .group_by(District.name)
             .order_by(func.count(ServiceRequest.id).desc())
             .limit(10)
-            .all()
-        )
-        category_result = (
-            base_q
-            .with_entities(
-                ServiceRequest.category,
-                func.count(ServiceRequest.id).label("cnt"),
-            )
-            .group_by(ServiceRequest.category)
-            .order_by(func.count(ServiceRequest.id).desc())
-            .first()
-        )
-        team_result = (
-            base_q
-            .filter(ServiceRequest.responsible_team.isnot(None))
-            .with_entities(
-                ServiceRequest.responsible_team,
-                func.count(ServiceRequest.id).label("cnt"),
-            )
-            .group_by(ServiceRequest.responsible_team)
-            .order_by(func.count(ServiceRequest.id).desc())
-            .first()
-        )
+        )).all()
+        category_result = await _top(ServiceRequest.category)
+        team_result = await _top(ServiceRequest.responsible_team, ServiceRequest.responsible_team.isnot(None))
         return {
             "role": "governor",
-            "total": total,
-            "open": open_count,
-            "in_progress": in_progress_count,
-            "resolved": resolved_count,
+            "total": counts[0],
+            "open": counts[1],
+            "in_progress": counts[2],
+            "resolved": counts[3],
             "by_municipality": [{"name": r[0], "count": r[1]} for r in by_municipality],
             "by_district": [{"name": r[0], "count": r[1]} for r in by_district],
             "most_common_category": category_result[0] if category_result else None,
@@ -615,28 +669,30 @@ def get_dashboard(
         }
 
     # Staff / other roles — minimal stats
-    return {"role": current_user.role, "total": base_q.count()}
+    total = await db.scalar(_scoped_select(current_user, func.count(ServiceRequest.id)))
+    return {"role": current_user.role, "total": total}
 
 
 # ─── Notifications ────────────────────────────────────────────────────────────
 
 @router.get("/notifications", response_model=list[NotificationOut])
-def list_notifications(
+async def list_notifications(
     unread_only: bool = Query(False),
     limit: int = Query(100, ge=1, le=300),
-    current_user: User = Depends(require_roles(*ALLOWED_ROLES)),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles(*ALLOWED_ROLES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    q = db.query(Notification).filter(Notification.user_id == current_user.id)
+    stmt = select(Notification).where(Notification.user_id == current_user.id)
     if unread_only:
-        q = q.filter(Notification.is_read.is_(False))
-    return q.order_by(Notification.created_at.desc()).limit(limit).all()
+        stmt = stmt.where(Notification.is_read.is_(False))
+    stmt = stmt.order_by(Notification.created_at.desc()).limit(limit)
+    return (await db.scalars(stmt)).all()
 
 
 @router.post("/notifications/{notification_id}/read", status_code=204)
 def mark_notification_read(
     notification_id: UUID,
-    current_user: User = Depends(require_roles(*ALLOWED_ROLES)),
+    current_user: Principal = Depends(require_roles(*ALLOWED_ROLES)),
     db: Session = Depends(get_db),
 ):
     notif = db.query(Notification).filter(
@@ -652,7 +708,7 @@ def mark_notification_read(
 
 @router.post("/notifications/read-all", status_code=204)
 def mark_all_notifications_read(
-    current_user: User = Depends(require_roles(*ALLOWED_ROLES)),
+    current_user: Principal = Depends(require_roles(*ALLOWED_ROLES)),
     db: Session = Depends(get_db),
 ):
     now = datetime.now(timezone.utc)
@@ -665,7 +721,7 @@ def mark_all_notifications_read(
 
 @router.post("/notifications/generate-alerts", status_code=204)
 def generate_performance_alerts(
-    current_user: User = Depends(require_roles("governor", "mayor", "mukhtar")),
+    current_user: Principal = Depends(require_roles("governor", "mayor", "mukhtar")),
     db: Session = Depends(get_db),
 ):
     now = datetime.now(timezone.utc)
@@ -690,7 +746,7 @@ def generate_performance_alerts(
                 ).label("overdue_open"),
             )
             .join(ServiceRequest, ServiceRequest.municipality_id == Municipality.id)
-            .filter(Municipality.governorate_id == current_user.governorate_id)
+            .filter(ServiceRequest.governorate_id == current_user.governorate_id)
             .group_by(Municipality.name)
             .all()
         )
@@ -778,8 +834,8 @@ def generate_performance_alerts(
 def governor_performance_dashboard(
     sort_by: str = Query("open_complaints"),
     district_id: Optional[UUID] = Query(None),
-    current_user: User = Depends(require_roles("governor")),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles("governor")),
+    db: Session = Depends(get_read_db),
 ):
     now = datetime.now(timezone.utc)
     valid_sort = {"open_complaints", "overdue_complaints", "slowest_resolution_time", "best_resolution_rate", "municipality_name"}
@@ -789,7 +845,7 @@ def governor_performance_dashboard(
     q = (
         db.query(ServiceRequest, Municipality.name.label("municipality_name"))
         .join(Municipality, Municipality.id == ServiceRequest.municipality_id)
-        .filter(Municipality.governorate_id == current_user.governorate_id)
+        .filter(ServiceRequest.governorate_id == current_user.governorate_id)
     )
     if district_id is not None:
         district = (
@@ -947,8 +1003,8 @@ def governor_performance_dashboard(
 @router.get("/performance/mayor", response_model=MayorPerformanceDashboard)
 def mayor_performance_dashboard(
     district_id: Optional[UUID] = Query(None),
-    current_user: User = Depends(require_roles("mayor", "municipal_admin")),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles("mayor", "municipal_admin")),
+    db: Session = Depends(get_read_db),
 ):
     now = datetime.now(timezone.utc)
     requests_q = db.query(ServiceRequest).filter(ServiceRequest.municipality_id == current_user.municipality_id)
@@ -1089,7 +1145,7 @@ def mayor_performance_dashboard(
     )
 
 @router.get("/requests", response_model=PaginatedRequests)
-def list_requests(
+async def list_requests(
     municipality_id: Optional[UUID] = Query(None),
     district_id: Optional[UUID] = Query(None),
     status: Optional[List[str]] = Query(None),
@@ -1108,101 +1164,139 @@ def list_requests(
     sort_by: Optional[str] = Query("created_at"),
     sort_dir: Optional[str] = Query("desc"),
     assigned_to_me: Optional[bool] = Query(None),
+    pagination: str = Query("page"),
+    cursor: Optional[str] = Query(None),
+    count: str = Query("exact"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(require_roles(*ALLOWED_ROLES)),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles(*ALLOWED_ROLES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    q = _scoped_requests(db, current_user)
+    if sort_by != "relevance" and sort_by not in SORT_COLUMNS:
+        raise HTTPException(status_code=422, detail="sort_by غير صالح")
+    if sort_dir not in SORT_DIRECTIONS:
+        raise HTTPException(status_code=422, detail="sort_dir غير صالح")
+    if pagination not in ("page", "cursor"):
+        raise HTTPException(status_code=422, detail="pagination غير صالح")
+    if count not in COUNT_STRATEGIES:
+        raise HTTPException(status_code=422, detail="count غير صالح")
+    if pagination == "cursor" and sort_by == "relevance":
+        raise HTTPException(status_code=422, detail="لا يمكن الترتيب حسب الصلة عند التصفح بالمؤشر")
+
+    q = _scoped_select(current_user)
 
     if assigned_to_me and current_user.role != "staff":
-        q = q.filter(ServiceRequest.assigned_to_user_id == current_user.id)
+        q = q.where(ServiceRequest.assigned_to_user_id == current_user.id)
 
     # Multi-value filters
     if status:
-        q = q.filter(ServiceRequest.status.in_(status))
+        q = q.where(ServiceRequest.status.in_(status))
     if category:
-        q = q.filter(ServiceRequest.category.in_(category))
+        q = q.where(ServiceRequest.category.in_(category))
     if priority:
-        q = q.filter(ServiceRequest.priority.in_(priority))
+        q = q.where(ServiceRequest.priority.in_(priority))
     if responsible_team:
-        q = q.filter(ServiceRequest.responsible_team.in_(responsible_team))
+        q = q.where(ServiceRequest.responsible_team.in_(responsible_team))
 
     # Complaint number exact/partial match
     if complaint_number and complaint_number.strip():
         term = f"%{complaint_number.strip()}%"
-        q = q.filter(ServiceRequest.complaint_number.ilike(term))
+        q = q.where(ServiceRequest.complaint_number.ilike(term))
 
     # Scope filters (governor can drill into a specific municipality/district)
     if municipality_id and current_user.role in ("governor",):
-        q = q.filter(ServiceRequest.municipality_id == municipality_id)
+        q = q.where(ServiceRequest.municipality_id == municipality_id)
     if district_id and current_user.role in ("governor", "municipal_admin", "mayor"):
-        q = q.filter(ServiceRequest.district_id == district_id)
+        q = q.where(ServiceRequest.district_id == district_id)
 
     # Overdue: closed_at is null AND sla_deadline < now
+    now = datetime.now(timezone.utc)
     if overdue is True:
-        now = datetime.now(timezone.utc)
-        q = q.filter(
+        q = q.where(
             ServiceRequest.closed_at.is_(None),
             ServiceRequest.sla_deadline < now,
         )
 
     # SLA breached
     if sla_breached is True:
-        q = q.filter(ServiceRequest.sla_status == "breached")
+        q = q.where(ServiceRequest.sla_status == "breached")
 
     # Date range
     if date_from:
-        q = q.filter(ServiceRequest.created_at >= date_from)
+        q = q.where(ServiceRequest.created_at >= date_from)
     if date_to:
-        q = q.filter(ServiceRequest.created_at <= date_to)
-
-    # Full-text search on description, tracking_code, address_text, and complaint_number
-    if search and search.strip():
-        term = f"%{search.strip()}%"
-        q = q.filter(
-            or_(
-                ServiceRequest.description.ilike(term),
-                ServiceRequest.tracking_code.ilike(term),
-                ServiceRequest.address_text.ilike(term),
-                ServiceRequest.complaint_number.ilike(term),
-            )
-        )
+        q = q.where(ServiceRequest.created_at <= date_to)
+
+    # Arabic-normalized search over complaint number, tracking code, description and address
+    search = search.strip() if search else None
+    if search:
+        q = q.where(search_condition(search))
 
     if archived is not None:
-        q = q.filter(ServiceRequest.is_archived == archived)
+        q = q.where(ServiceRequest.is_archived == archived)
     if archive_month and archive_year:
         start, end_exclusive = _month_range(archive_year, archive_month)
-        q = q.filter(ServiceRequest.closed_at >= start, ServiceRequest.closed_at < end_exclusive)
+        q = q.where(ServiceRequest.closed_at >= start, ServiceRequest.closed_at < end_exclusive)
 
-    # Sorting
-    sort_column = getattr(ServiceRequest, sort_by, ServiceRequest.created_at)
-    if sort_dir == "asc":
-        q = q.order_by(sort_column.asc())
+    # Sorting ("relevance" ranks search matches, newest first among equals;
+    # without a search term it falls back to newest first)
+    if sort_by == "relevance":
+        if search:
+            q = q.order_by(search_rank(search).desc(), ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+        else:
+            q = q.order_by(*sort_order("created_at", "desc"))
     else:
-        q = q.order_by(sort_column.desc())
-
-    total = q.count()
-    items = q.offset((page - 1) * page_size).limit(page_size).all()
-    return PaginatedRequests(items=items, total=total, page=page, page_size=page_size)
+        q = q.order_by(*sort_order(sort_by, sort_dir))
+
+    # The total (per the count strategy) covers the whole filtered list, so
+    # in cursor mode it is only computed for the first page; clients keep it
+    # while paging on
+    total, total_is_estimate = None, False
+    if pagination == "page" or not cursor:
+        total, total_is_estimate = await count_requests(db, q, count, now=now)
+
+    # One row past the page tells whether another page follows
+    if pagination == "page":
+        q = q.offset((page - 1) * page_size)
+    elif cursor:
+        try:
+            q = q.where(after_cursor(decode_cursor(cursor, sort_by, sort_dir)))
+        except InvalidCursor:
+            raise HTTPException(status_code=422, detail="مؤشر الصفحة غير صالح")
+    rows = (await db.scalars(q.limit(page_size + 1))).all()
+    items = rows[:page_size]
+    has_next = len(rows) > page_size
+    return PaginatedRequests(
+        items=items,
+        total=total,
+        total_is_estimate=total_is_estimate,
+        page=page if pagination == "page" else None,
+        page_size=page_size,
+        has_next=has_next,
+        next_cursor=encode_cursor(sort_by, sort_dir, items[-1]) if pagination == "cursor" and has_next else None,
+    )
 
 
 @router.get("/requests/{request_id}", response_model=ServiceRequestDetail)
-def get_request(
+async def get_request(
     request_id: UUID,
-    current_user: User = Depends(require_roles(*ALLOWED_ROLES)),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles(*ALLOWED_ROLES)),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    from sqlalchemy.orm import joinedload
-    q = _scoped_requests(db, current_user)
-    req = (
-        q.options(
+    # Everything the response reads is loaded here: one query for the request
+    # with its names, one per collection, however long the timeline is
+    stmt = (
+        _scoped_select(current_user)
+        .options(
             joinedload(ServiceRequest.municipality).joinedload(Municipality.governorate),
             joinedload(ServiceRequest.district),
+            selectinload(ServiceRequest.updates),
+            selectinload(ServiceRequest.attachments),
+            selectinload(ServiceRequest.materials_used),
         )
-        .filter(ServiceRequest.id == request_id)
-        .first()
+        .where(ServiceRequest.id == request_id)
     )
+    req = (await db.scalars(stmt)).first()
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     return req
@@ -1211,7 +1305,7 @@ def get_request(
 @router.post("/requests", response_model=ServiceRequestOut, status_code=201)
 def create_request(
     payload: AdminServiceRequestCreate,
-    current_user: User = Depends(require_roles("mukhtar", "district_admin")),
+    current_user: Principal = Depends(require_roles("mukhtar", "district_admin")),
     db: Session = Depends(get_db),
 ):
     """MUKHTAR creates a service request manually for their district."""
@@ -1225,31 +1319,14 @@ def create_request(
     if not district:
         raise HTTPException(status_code=404, detail="District not found")
 
-    import secrets
-    TRACKING_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
-    for _ in range(10):
-        code = "".join(secrets.choice(TRACKING_CHARS) for _ in range(8))
-        if not db.query(ServiceRequest).filter(ServiceRequest.tracking_code == code).first():
-            break
-    else:
-        raise HTTPException(status_code=500, detail="Could not generate unique tracking code")
-
-    # Eagerly load municipality for complaint number generation
-    from sqlalchemy.orm import joinedload
-    district = (
-        db.query(District)
-        .options(joinedload(District.municipality))
-        .filter(District.id == payload.district_id)
-        .first()
-    )
-    complaint_number = _generate_complaint_number(db, district)
+    complaint_number = allocate_complaint_number(db, district.municipality_id)
 
     now = datetime.now(timezone.utc)
     sla_deadline = get_sla_deadline(now, payload.category, payload.priority)
     sla_st = calculate_sla_status(now, payload.category, payload.priority, "new",
                                    sla_deadline=sla_deadline)
 
-    req = ServiceRequest(
+    req = insert_service_request(db, dict(
         municipality_id=district.municipality_id,
         district_id=district.id,
         complaint_number=complaint_number,
@@ -1257,15 +1334,12 @@ def create_request(
         priority=payload.priority,
         status="new",
         description=payload.description,
-        tracking_code=code,
         address_text=payload.address_text,
         location_lat=payload.location_lat,
         location_lng=payload.location_lng,
         sla_deadline=sla_deadline,
         sla_status=sla_st,
-    )
-    db.add(req)
-    db.flush()
+    ))
 
     db.add(RequestUpdate(
         request_id=req.id,
@@ -1276,25 +1350,135 @@ def create_request(
         event_type="created",
         is_internal=False,
     ))
-    _notify_request_scope(
-        db,
-        req,
-        kind="new_complaint",
-        title="شكوى جديدة",
-        message=f"تم تسجيل شكوى جديدة برقم {req.complaint_number or req.tracking_code}",
-        severity="info",
-    )
-    _log(db, current_user.id, "create_request", "service_request", req.id)
+    # Notification fan-out and the audit entry run after the response
+    enqueue(db, "request_created", {
+        "request_id": str(req.id),
+        "actor_user_id": str(current_user.id),
+    })
+    publish_geo(db, req)
+    request_created(db)
     db.commit()
     db.refresh(req)
     return req
 
 
+BULK_INTAKE_MAX_ITEMS = 500
+
+
+@router.post(
+    "/requests/bulk",
+    response_model=BulkServiceRequestResult,
+    status_code=201,
+    responses={422: {"model": BulkServiceRequestResult}},
+)
+def bulk_create_requests(
+    payload: BulkServiceRequestCreate,
+    current_user: Principal = Depends(require_roles("mukhtar", "district_admin")),
+    db: Session = Depends(get_db),
+):
+    """MUKHTAR registers a batch of collected paper complaints in one transaction.
+
+    Each item is validated on its own and reported in `results`; valid items
+    share one complaint-number allocation and multi-row inserts for requests
+    and timeline entries. Notifications and audit entries are written by the
+    outbox worker. Responds 422 when no item was valid.
+    """
+    if not payload.items:
+        raise HTTPException(status_code=422, detail="لا توجد طلبات للتسجيل")
+    if len(payload.items) > BULK_INTAKE_MAX_ITEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"الحد الأقصى {BULK_INTAKE_MAX_ITEMS} طلب في الدفعة الواحدة",
+        )
+    district = db.query(District).filter(District.id == current_user.district_id).first()
+    if not district:
+        raise HTTPException(status_code=404, detail="District not found")
+
+    results: list[BulkServiceRequestItemResult] = []
+    valid: list[tuple[int, AdminServiceRequestCreate]] = []
+    for index, raw in enumerate(payload.items):
+        try:
+            item = AdminServiceRequestCreate.model_validate(raw)
+        except ValidationError as exc:
+            error = "; ".join(err["msg"] for err in exc.errors())
+            results.append(BulkServiceRequestItemResult(index=index, ok=False, error=error))
+            continue
+        if str(item.district_id) != str(current_user.district_id):
+            results.append(BulkServiceRequestItemResult(
+                index=index, ok=False, error="يمكنك إضافة طلبات في حيّك فقط",
+            ))
+            continue
+        valid.append((index, item))
+
+    if valid:
+        now = datetime.now(timezone.utc)
+        numbers = allocate_complaint_numbers(db, district.municipality_id, len(valid))
+        rows = []
+        for (_, item), complaint_number in zip(valid, numbers):
+            sla_deadline = get_sla_deadline(now, item.category, item.priority)
+            rows.append(dict(
+                municipality_id=district.municipality_id,
+                district_id=district.id,
+                complaint_number=complaint_number,
+                category=item.category,
+                priority=item.priority,
+                status="new",
+                description=item.description,
+                address_text=item.address_text,
+                location_lat=item.location_lat,
+                location_lng=item.location_lng,
+                sla_deadline=sla_deadline,
+                sla_status=calculate_sla_status(now, item.category, item.priority, "new",
+                                                sla_deadline=sla_deadline),
+                created_at=now,
+                updated_at=now,
+            ))
+        created = insert_service_requests(db, rows)
+
+        db.execute(insert(RequestUpdate), [
+            dict(
+                request_id=req.id,
+                actor_user_id=current_user.id,
+                actor_name=current_user.name,
+                message="تم تسجيل الطلب من قِبل المختار",
+                to_status="new",
+                event_type="created",
+                is_internal=False,
+            )
+            for req in created
+        ])
+        # Notification fan-out and audit entries run after the response, as
+        # one outbox event for the whole batch
+        enqueue(db, "requests_bulk_created", {
+            "request_ids": [str(req.id) for req in created],
+            "actor_user_id": str(current_user.id),
+        })
+        publish_geo(db, *[req for req in created if req.location_lat is not None])
+        request_created(db)
+        # Serialize before commit: the RETURNING rows are loaded, expired ones are not
+        for (index, _), req in zip(valid, created):
+            results.append(BulkServiceRequestItemResult(
+                index=index, ok=True, request=ServiceRequestOut.model_validate(req),
+            ))
+        db.commit()
+
+    results.sort(key=lambda r: r.index)
+    result = BulkServiceRequestResult(
+        created=len(valid),
+        failed=len(payload.items) - len(valid),
+        results=results,
+    )
+    if not valid:
+        # Nothing was created: report the per-item errors as a validation failure
+        return JSONResponse(status_code=422, content=result.model_dump(mode="json"))
+    return result
+
+
 @router.post("/requests/{request_id}/assign", response_model=ServiceRequestOut)
 def assign_staff(
     request_id: UUID,
     payload: AssignStaffRequest,
-    current_user: User = Depends(require_roles("district_admin", "municipal_admin", "mayor")),
+    current_user: Principal = Depends(require_roles("district_admin", "municipal_admin", "mayor")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1331,6 +1515,7 @@ def assign_staff(
         severity="info",
     )
     _log(db, current_user.id, "assign_staff", "service_request", req.id, str(staff.id))
+    _request_changed(db, req)
     db.commit()
     db.refresh(req)
     return req
@@ -1340,7 +1525,7 @@ def assign_staff(
 def update_status(
     request_id: UUID,
     payload: StatusUpdateRequest,
-    current_user: User = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
+    current_user: Principal = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1429,6 +1614,8 @@ def update_status(
 
     _log(db, current_user.id, "status_change", "service_request", req.id,
          f"{old_status} -> {payload.status}")
+    publish_geo(db, req)
+    _request_changed(db, req)
     db.commit()
     db.refresh(req)
     return req
@@ -1438,7 +1625,7 @@ def update_status(
 def update_priority(
     request_id: UUID,
     payload: PriorityUpdateRequest,
-    current_user: User = Depends(require_roles("district_admin", "municipal_admin", "mayor")),
+    current_user: Principal = Depends(require_roles("district_admin", "municipal_admin", "mayor")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1472,6 +1659,7 @@ def update_priority(
     ))
     _log(db, current_user.id, "priority_change", "service_request", req.id,
          f"{old_priority} -> {payload.priority}")
+    _request_changed(db, req)
     db.commit()
     db.refresh(req)
     return req
@@ -1481,7 +1669,7 @@ def update_priority(
 def add_internal_note(
     request_id: UUID,
     payload: InternalNoteRequest,
-    current_user: User = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
+    current_user: Principal = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1497,6 +1685,7 @@ def add_internal_note(
         is_internal=True,
     ))
     _log(db, current_user.id, "add_note", "service_request", req.id)
+    _request_changed(db, req)
     db.commit()
     db.refresh(req)
     return req
@@ -1506,7 +1695,7 @@ def add_internal_note(
 def archive_request(
     request_id: UUID,
     payload: ArchiveRequest,
-    current_user: User = Depends(require_roles("governor", "mayor", "municipal_admin")),
+    current_user: Principal = Depends(require_roles("governor", "mayor", "municipal_admin")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1530,16 +1719,136 @@ def archive_request(
         is_internal=True,
     ))
     _log(db, current_user.id, "archive_change", "service_request", req.id, str(payload.is_archived))
+    publish_geo(db, req)
+    _request_changed(db, req)
     db.commit()
     db.refresh(req)
     return req
 
 
+@router.post("/requests/{request_id}/merge", response_model=ServiceRequestOut)
+def merge_requests(
+    request_id: UUID,
+    payload: MergeRequestsRequest,
+    current_user: Principal = Depends(require_roles("mayor", "municipal_admin")),
+    db: Session = Depends(get_db),
+):
+    """Collapse duplicate complaints into `request_id`.
+
+    Each duplicate is closed as rejected, linked through duplicate_of_id and
+    tells its citizen which tracking code to follow instead. Rejecting goes
+    through the same role transitions, audit entries and notifications as
+    the status endpoint, so merging cannot close what the caller could not.
+    """
+    target = (
+        _scoped_requests(db, current_user)
+        .filter(ServiceRequest.id == request_id)
+        .with_for_update()
+        .first()
+    )
+    if not target:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if target.duplicate_of_id is not None:
+        raise HTTPException(status_code=422, detail="لا يمكن الدمج في طلب مدموج مسبقاً")
+    if target.status not in OPEN_STATUSES or target.is_archived:
+        # Citizens are sent to follow the target; it must still be worked on
+        raise HTTPException(status_code=422, detail="لا يمكن الدمج في طلب مغلق أو مؤرشف")
+    if request_id in payload.duplicate_ids:
+        raise HTTPException(status_code=422, detail="لا يمكن دمج الطلب مع نفسه")
+
+    duplicates = (
+        _scoped_requests(db, current_user)
+        .filter(ServiceRequest.id.in_(payload.duplicate_ids))
+        .with_for_update()
+        .all()
+    )
+    if len(duplicates) != len(payload.duplicate_ids):
+        raise HTTPException(status_code=404, detail="Request not found")
+    for dup in duplicates:
+        if dup.municipality_id != target.municipality_id:
+            raise HTTPException(status_code=422, detail="لا يمكن دمج طلبات من بلديات مختلفة")
+        if dup.status not in OPEN_STATUSES:
+            raise HTTPException(
+                status_code=422,
+                detail=f"الطلب {dup.complaint_number or dup.tracking_code} مغلق ولا يمكن دمجه",
+            )
+        if not can_transition(dup.status, "rejected", current_user.role):
+            raise HTTPException(
+                status_code=403,
+                detail=(
+                    f"لا يُسمح بتغيير حالة الطلب {dup.complaint_number or dup.tracking_code} "
+                    f"من '{dup.status}' إلى 'rejected' لدورك الحالي"
+                ),
+            )
+
+    now = datetime.now(timezone.utc)
+    target_label = target.complaint_number or target.tracking_code
+    note = (payload.note or "").strip() or None
+    for dup in duplicates:
+        old_status = dup.status
+        dup.duplicate_of_id = target.id
+        dup.status = "rejected"
+        dup.rejection_reason = f"طلب مكرر — تم دمجه مع الطلب {target_label}"
+        dup.closed_at = now
+        dup.updated_at = now
+        dup.sla_status = calculate_sla_status(
+            dup.created_at, dup.category, dup.priority, dup.status,
+            dup.closed_at, dup.sla_deadline
+        )
+        db.add(RequestUpdate(
+            request_id=dup.id,
+            actor_user_id=current_user.id,
+            actor_name=current_user.name,
+            message=(
+                f"تم دمج طلبك مع الطلب {target_label} لأنه يخص المشكلة نفسها. "
+                f"يمكنك متابعة المعالجة برمز التتبع {target.tracking_code}"
+            ),
+            event_type="merged",
+            from_status=old_status,
+            to_status="rejected",
+            is_internal=False,
+        ))
+        _notify_request_scope(
+            db,
+            dup,
+            kind="rejected",
+            title="تحديث حالة شكوى",
+            message="تم تغيير الحالة إلى rejected",
+            severity="warning",
+        )
+        _log(db, current_user.id, "status_change", "service_request", dup.id,
+             f"{old_status} -> rejected")
+        _request_changed(db, dup)
+
+    # Requests already linked to a merged duplicate now point at the target
+    db.query(ServiceRequest).filter(
+        ServiceRequest.duplicate_of_id.in_(payload.duplicate_ids)
+    ).update({ServiceRequest.duplicate_of_id: target.id}, synchronize_session=False)
+
+    labels = "، ".join(dup.complaint_number or dup.tracking_code for dup in duplicates)
+    target.updated_at = now
+    db.add(RequestUpdate(
+        request_id=target.id,
+        actor_user_id=current_user.id,
+        actor_name=current_user.name,
+        message=f"تم دمج الطلبات المكررة: {labels}" + (f" — {note}" if note else ""),
+        event_type="merged",
+        is_internal=True,
+    ))
+    _log(db, current_user.id, "merge_requests", "service_request", target.id,
+         ",".join(str(dup.id) for dup in duplicates))
+    publish_geo(db, *duplicates)
+    _request_changed(db, target)
+    db.commit()
+    db.refresh(target)
+    return target
+
+
 @router.post("/requests/{request_id}/responsible-team", response_model=ServiceRequestOut)
 def update_responsible_team(
     request_id: UUID,
     payload: ResponsibleTeamUpdateRequest,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     """Mayor can assign/change the responsible municipal team for a request."""
@@ -1585,6 +1894,7 @@ def update_responsible_team(
     )
     _log(db, current_user.id, "update_responsible_team", "service_request", req.id,
          f"{old_team} -> {new_label}")
+    _request_changed(db, req)
     db.commit()
     db.refresh(req)
     return req
@@ -1593,20 +1903,25 @@ def update_responsible_team(
 @router.get("/requests/{request_id}/materials", response_model=list[MaterialUsedOut])
 def list_materials(
     request_id: UUID,
-    current_user: User = Depends(require_roles(*ALLOWED_ROLES)),
+    current_user: Principal = Depends(require_roles(*ALLOWED_ROLES)),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
-    return req.materials_used
+    return (
+        db.query(MaterialUsed)
+        .filter(MaterialUsed.request_id == req.id)
+        .order_by(MaterialUsed.created_at)
+        .all()
+    )
 
 
 @router.post("/requests/{request_id}/materials", response_model=MaterialUsedOut, status_code=201)
 def add_material(
     request_id: UUID,
     payload: MaterialUsedCreate,
-    current_user: User = Depends(require_roles("mayor", "municipal_admin", "district_admin")),
+    current_user: Principal = Depends(require_roles("mayor", "municipal_admin", "district_admin")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1630,6 +1945,7 @@ def add_material(
     ))
     _log(db, current_user.id, "add_material", "service_request", req.id,
          f"{payload.name} x {payload.quantity}")
+    _request_changed(db, req)
     db.commit()
     db.refresh(material)
     return material
@@ -1639,7 +1955,7 @@ def add_material(
 def delete_material(
     request_id: UUID,
     material_id: UUID,
-    current_user: User = Depends(require_roles("mayor", "municipal_admin", "district_admin")),
+    current_user: Principal = Depends(require_roles("mayor", "municipal_admin", "district_admin")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1655,6 +1971,7 @@ def delete_material(
 
     db.delete(material)
     _log(db, current_user.id, "delete_material", "service_request", req.id, str(material_id))
+    _request_changed(db, req)
     db.commit()
 
 
@@ -1682,7 +1999,7 @@ async def upload_attachment(
     request_id: UUID,
     file: UploadFile = File(...),
     kind: str = Query("other"),
-    current_user: User = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
+    current_user: Principal = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
     db: Session = Depends(get_db),
 ):
     req = _scoped_requests(db, current_user).filter(ServiceRequest.id == request_id).first()
@@ -1734,6 +2051,7 @@ async def upload_attachment(
     db.add(attachment)
     _log(db, current_user.id, "upload_attachment", "service_request", req.id,
          f"{filename} (kind={kind})")
+    _request_changed(db, req)
     db.commit()
     db.refresh(attachment)
     return attachment
@@ -1742,7 +2060,7 @@ async def upload_attachment(
 @router.get("/staff", response_model=list[UserOut])
 def list_staff(
     district_id: Optional[UUID] = Query(None),
-    current_user: User = Depends(require_roles("district_admin", "municipal_admin", "mayor")),
+    current_user: Principal = Depends(require_roles("district_admin", "municipal_admin", "mayor")),
     db: Session = Depends(get_db),
 ):
     """List staff members accessible to the current admin for assignment purposes."""
@@ -1761,7 +2079,7 @@ def list_staff(
 @router.post("/users/mayors", response_model=UserOut, status_code=201)
 def create_mayor(
     payload: CreateMayorRequest,
-    current_user: User = Depends(require_roles("governor")),
+    current_user: Principal = Depends(require_roles("governor")),
     db: Session = Depends(get_db),
 ):
     """Governor creates a Mayor account scoped to a municipality within their governorate."""
@@ -1800,7 +2118,7 @@ def create_mayor(
 @router.post("/users/mukhtars", response_model=UserOut, status_code=201)
 def create_mukhtar(
     payload: CreateMukhtarRequest,
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     """Mayor creates a Mukhtar account scoped to a district within their municipality."""
@@ -1839,7 +2157,7 @@ def create_mukhtar(
 
 @router.get("/users/mayors", response_model=list[UserOut])
 def list_mayors(
-    current_user: User = Depends(require_roles("governor")),
+    current_user: Principal = Depends(require_roles("governor")),
     db: Session = Depends(get_db),
 ):
     return (
@@ -1856,7 +2174,7 @@ def list_mayors(
 
 @router.get("/users/mukhtars", response_model=list[UserOut])
 def list_mukhtars(
-    current_user: User = Depends(require_roles("mayor")),
+    current_user: Principal = Depends(require_roles("mayor")),
     db: Session = Depends(get_db),
 ):
     return (
@@ -1874,7 +2192,7 @@ def list_mukhtars(
 def update_user_admin(
     user_id: UUID,
     payload: UserAdminUpdate,
-    current_user: User = Depends(require_roles("governor", "mayor")),
+    current_user: Principal = Depends(require_roles("governor", "mayor")),
     db: Session = Depends(get_db),
 ):
     q = db.query(User).filter(User.id == user_id)
@@ -1885,6 +2203,7 @@ def update_user_admin(
     target = q.first()
     if not target:
         raise HTTPException(status_code=404, detail="User not found")
+    old_scope = (target.municipality_id, target.district_id)
 
     if payload.username is not None and payload.username != target.username:
         exists = db.query(User.id).filter(User.username == payload.username, User.id != target.id).first()
@@ -1913,6 +2232,9 @@ def update_user_admin(
         if not district:
             raise HTTPException(status_code=404, detail="District not found")
         target.district_id = payload.district_id
+    # Session tokens embed the scope, so a scope change signs the user out
+    scope_changed = (target.municipality_id, target.district_id) != old_scope
+    principal_changed(db, target, revoke_tokens=payload.is_active is False or scope_changed)
     _log(db, current_user.id, "update_user", "user", str(target.id))
     db.commit()
     db.refresh(target)
@@ -1922,7 +2244,7 @@ def update_user_admin(
 @router.delete("/users/{user_id}", status_code=204)
 def delete_user_admin(
     user_id: UUID,
-    current_user: User = Depends(require_roles("governor", "mayor")),
+    current_user: Principal = Depends(require_roles("governor", "mayor")),
     db: Session = Depends(get_db),
 ):
     q = db.query(User).filter(User.id == user_id)
@@ -1935,6 +2257,7 @@ def delete_user_admin(
         raise HTTPException(status_code=404, detail="User not found")
 
     target.is_active = False
+    principal_changed(db, target, revoke_tokens=True)
     _log(db, current_user.id, "deactivate_user", "user", str(target.id))
     db.commit()
 
@@ -1966,12 +2289,15 @@ def export_dataset(
     dataset: str,
     month: Optional[int] = Query(None, ge=1, le=12),
     year: Optional[int] = Query(None, ge=2000, le=2100),
-    current_user: User = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles("governor", "mayor", "municipal_admin", "mukhtar", "district_admin")),
+    db: Session = Depends(get_read_db),
 ):
     now = datetime.now(timezone.utc)
     if dataset == "complaints":
-        q = _scoped_requests(db, current_user)
+        q = _scoped_requests(db, current_user).options(
+            joinedload(ServiceRequest.municipality).joinedload(Municipality.governorate),
+            joinedload(ServiceRequest.district),
+        )
         rows = [["رقم الشكوى", "رمز التتبع", "المحافظة", "البلدية", "الحي", "الفئة", "الأولوية", "الحالة", "تاريخ الإنشاء", "تاريخ الإغلاق", "مؤرشف"]]
         for req in q.order_by(ServiceRequest.created_at.desc()).all():
             rows.append([req.complaint_number or "", req.tracking_code, req.governorate_name or "", req.municipality_name or "", req.district_name or "", req.category, req.priority, req.status, req.created_at.isoformat(), req.closed_at.isoformat() if req.closed_at else "", "نعم" if req.is_archived else "لا"])
@@ -2158,17 +2484,15 @@ def accountability_report(
     year: int = Query(..., ge=2000, le=2100),
     municipality_id: Optional[UUID] = Query(None),
     district_id: Optional[UUID] = Query(None),
-    current_user: User = Depends(require_roles("governor", "mayor", "municipal_admin")),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles("governor", "mayor", "municipal_admin")),
+    db: Session = Depends(get_read_db),
 ):
     start, end_exclusive = _month_range(year, month)
     now = datetime.now(timezone.utc)
     base_q = db.query(ServiceRequest)
 
     if current_user.role == "governor":
-        from sqlalchemy import select as sa_select
-        mun_subq = sa_select(Municipality.id).where(Municipality.governorate_id == current_user.governorate_id)
-        base_q = base_q.filter(ServiceRequest.municipality_id.in_(mun_subq))
+        base_q = base_q.filter(ServiceRequest.governorate_id == current_user.governorate_id)
         if municipality_id:
             mun = db.query(Municipality).filter(
                 Municipality.id == municipality_id,
@@ -2301,8 +2625,8 @@ def district_monthly_report(
     month: int = Query(..., ge=1, le=12),
     year: int = Query(..., ge=2000, le=2100),
     district_id: Optional[UUID] = Query(None),
-    current_user: User = Depends(require_roles("mukhtar", "district_admin", "mayor", "municipal_admin", "governor")),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles("mukhtar", "district_admin", "mayor", "municipal_admin", "governor")),
+    db: Session = Depends(get_read_db),
 ):
     """Return monthly report for a specific district."""
     now_year = datetime.now(timezone.utc).year
@@ -2350,8 +2674,8 @@ def municipality_monthly_report(
     month: int = Query(..., ge=1, le=12),
     year: int = Query(..., ge=2000, le=2100),
     municipality_id: Optional[UUID] = Query(None),
-    current_user: User = Depends(require_roles("mayor", "municipal_admin", "governor")),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles("mayor", "municipal_admin", "governor")),
+    db: Session = Depends(get_read_db),
 ):
     """Return monthly report for a specific municipality."""
     now_year = datetime.now(timezone.utc).year
@@ -2426,20 +2750,16 @@ def municipality_monthly_report(
 def governorate_monthly_report(
     month: int = Query(..., ge=1, le=12),
     year: int = Query(..., ge=2000, le=2100),
-    current_user: User = Depends(require_roles("governor")),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_roles("governor")),
+    db: Session = Depends(get_read_db),
 ):
     """Return monthly report for the entire governorate."""
     now_year = datetime.now(timezone.utc).year
     if year > now_year + 1:
         raise HTTPException(status_code=422, detail="السنة المحددة غير صالحة")
 
-    from sqlalchemy import select as sa_select
-    mun_subq = sa_select(Municipality.id).where(
-        Municipality.governorate_id == current_user.governorate_id
-    )
     base_q = db.query(ServiceRequest).filter(
-        ServiceRequest.municipality_id.in_(mun_subq)
+        ServiceRequest.governorate_id == current_user.governorate_id
     )
 
     def top_district_fn(start, end_exclusive):
@@ -2447,7 +2767,7 @@ def governorate_monthly_report(
             db.query(District.name, func.count(ServiceRequest.id).label("cnt"))
             .join(ServiceRequest, ServiceRequest.district_id == District.id)
             .filter(
-                ServiceRequest.municipality_id.in_(mun_subq),
+                ServiceRequest.governorate_id == current_user.governorate_id,
                 ServiceRequest.created_at >= start,
                 ServiceRequest.created_at < end_exclusive,
             )
@@ -2463,7 +2783,7 @@ def governorate_monthly_report(
             db.query(Municipality.name, func.count(ServiceRequest.id).label("resolved_cnt"))
             .join(ServiceRequest, ServiceRequest.municipality_id == Municipality.id)
             .filter(
-                Municipality.governorate_id == current_user.governorate_id,
+                ServiceRequest.governorate_id == current_user.governorate_id,
                 ServiceRequest.status == "resolved",
                 ServiceRequest.created_at >= start,
                 ServiceRequest.created_at < end_exclusive,
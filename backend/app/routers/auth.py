@@ -1,32 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.auth import verify_password, create_access_token
+from app import login_throttle
+from app.config import get_settings
 from app.database import get_db
-from app.deps import get_current_user
-from app.models import User
-from app.schemas import LoginRequest, TokenResponse, UserOut
+from app.deps import Principal, client_ip, get_current_user
+from app.models import AuthSession, User
+from app.password_pool import pool as password_pool, verify_password
+from app.schemas import LoginRequest, RefreshRequest, TokenResponse, UserOut
+from app.sessions import create_session, revoke_session, rotate_session
 
+settings = get_settings()
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _invalid_credentials() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="اسم المستخدم أو كلمة المرور غير صحيحة",
+    )
+
+
 @router.post("/login", response_model=TokenResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == payload.username).first()
-    if not user or not verify_password(payload.password, user.password_hash):
+async def login(payload: LoginRequest, request: Request, db: Session = Depends(get_db)):
+    """Open a session and issue its access and refresh tokens.
+
+    Async so that throttled and unknown-username attempts cost no thread:
+    the lockout check runs before any lookup or bcrypt work, and unknown
+    usernames are answered after a sleep matching a real verification
+    instead of hashing a dummy password.
+    """
+    ip = client_ip(request)
+    retry_after, ip_wait = await run_in_threadpool(login_throttle.lockouts, payload.username, ip)
+    if ip_wait is not None and settings.login_throttle_ip_hard_block:
+        retry_after = max(retry_after or 0, ip_wait)
+    if retry_after is not None:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="اسم المستخدم أو كلمة المرور غير صحيحة",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="محاولات دخول كثيرة، يرجى المحاولة لاحقاً",
+            headers={"Retry-After": str(retry_after)},
         )
+    if ip_wait is not None:
+        await asyncio.sleep(min(ip_wait, settings.login_throttle_ip_soft_delay_seconds))
+
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.username == payload.username).first()
+    )
+    if user is None:
+        await run_in_threadpool(login_throttle.record_failure, payload.username, ip)
+        await asyncio.sleep(password_pool.mean_seconds("verify") or settings.login_unknown_user_delay_seconds)
+        raise _invalid_credentials()
+    if not await run_in_threadpool(verify_password, payload.password, user.password_hash):
+        await run_in_threadpool(login_throttle.record_failure, payload.username, ip)
+        raise _invalid_credentials()
+    await run_in_threadpool(login_throttle.record_success, payload.username)
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="الحساب معطّل",
         )
-    token = create_access_token({"sub": str(user.id), "role": user.role})
-    return TokenResponse(access_token=token)
+
+    def _open_session() -> TokenResponse:
+        tokens = create_session(db, user)
+        db.commit()
+        return tokens
+
+    return await run_in_threadpool(_open_session)
+
+
+@router.post("/refresh", response_model=TokenResponse)
+def refresh(payload: RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access/refresh pair (the old one stops working)."""
+    tokens = rotate_session(db, payload.refresh_token)
+    # Commit even on failure: reuse of a rotated token revokes the session
+    db.commit()
+    if tokens is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="انتهت الجلسة، يرجى تسجيل الدخول مجدداً",
+        )
+    return tokens
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    if current_user.session_id is not None:
+        session = db.query(AuthSession).filter(AuthSession.id == current_user.session_id).first()
+        if session is not None:
+            revoke_session(db, session)
+            db.commit()
 
 
 @router.get("/me", response_model=UserOut)
-def me(current_user: User = Depends(get_current_user)):
-    return current_user
+def me(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    return db.query(User).filter(User.id == current_user.id).first()
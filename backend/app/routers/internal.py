@@ -0,0 +1,34 @@
+import os
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from app.cache import cache_stats
+from app.database import pool_stats
+from app.deps import require_metrics_token
+from app.geoindex import duplicate_index
+from app.password_pool import pool as password_pool
+from app.querystats import endpoint_stats
+from app.ratelimit import ratelimit_stats
+from app.replica import router as replica_router
+from app.sessions import revoked_sessions
+from app.streams import hub as tracking_streams
+
+router = APIRouter(prefix="/internal", tags=["internal"], include_in_schema=False)
+
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_token)])
+def metrics() -> Dict[str, Any]:
+    """Per-worker runtime metrics (each call is answered by one uvicorn worker)."""
+    return {
+        "pid": os.getpid(),
+        "db_pool": pool_stats(),
+        "replica": replica_router.stats(),
+        "queries": endpoint_stats.snapshot(),
+        "caches": cache_stats(),
+        "tracking_streams": tracking_streams.stats(),
+        "rate_limit": ratelimit_stats(),
+        "duplicate_index": duplicate_index.stats(),
+        "password_pool": password_pool.stats(),
+        "revoked_sessions": len(revoked_sessions),
+    }
@@ -1,49 +1,78 @@
+import asyncio
 import os
 import string
-import secrets
 import uuid
 from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
+from app.cache import LRUCache, VersionedCache, etag_matches
 from app.config import get_settings
+from app.counts import request_created
 from app.database import get_db
-from app.models import District, RequestUpdate, ServiceRequest
+from app.deps import rate_limited
+from app.events import publish, subscribe
+from app.geoindex import duplicate_index, publish_geo
+from app.idempotency import IdempotentRoute
+from app.models import Attachment, District, Governorate, Municipality, RequestUpdate, ServiceRequest
+from app.numbering import allocate_complaint_number, insert_service_request
+from app.outbox import enqueue
+from app.ratelimit import RateLimit
 from app.schemas import (
+    AttachmentOut,
     DistrictOut,
     PublicCitizenUpdate,
     PublicSubmitRequest,
+    RequestUpdateOut,
     ServiceRequestDetail,
     ServiceRequestOut,
 )
 from app.sla import calculate_sla_status, get_sla_deadline
+from app.streams import StreamsFull, TrackingStream, hub as tracking_streams, resolve_stream_start
 
 settings = get_settings()
-router = APIRouter(prefix="/public", tags=["public"])
-limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(prefix="/public", tags=["public"], route_class=IdempotentRoute)
+public_write_limit = RateLimit(capacity=settings.rate_limit_per_hour, period_seconds=3600)
 
-TRACKING_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+_districts_adapter = TypeAdapter(list[DistrictOut])
+_districts_cache = VersionedCache("hierarchy")
 
 
-@router.get("/districts", response_model=list[DistrictOut])
-def list_districts(db: Session = Depends(get_db)):
-    """Return all districts (used by the public submission form)."""
-    return db.query(District).order_by(District.name).all()
+def _render_districts(db: Session) -> bytes:
+    districts = db.query(District).order_by(District.name).all()
+    return _districts_adapter.dump_json(_districts_adapter.validate_python(districts, from_attributes=True))
+
 
+@router.get("/districts", response_model=list[DistrictOut])
+def list_districts(request: Request, db: Session = Depends(get_db)):
+    """Return all districts (used by the public submission form).
 
-def _generate_tracking_code(length: int = 8) -> str:
-    return "".join(secrets.choice(TRACKING_CHARS) for _ in range(length))
+    The serialized list is cached per hierarchy version; a matching
+    If-None-Match is answered with 304.
+    """
+    entry = _districts_cache.get(db, _render_districts)
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={settings.public_districts_max_age_seconds}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 
-@router.post("/requests", response_model=ServiceRequestOut, status_code=201)
-@limiter.limit(f"{settings.rate_limit_per_hour}/hour")
+@router.post(
+    "/requests",
+    response_model=ServiceRequestOut,
+    status_code=201,
+    dependencies=[Depends(rate_limited("public_submit", public_write_limit))],
+)
 def submit_request(
-    request: Request,
     payload: PublicSubmitRequest,
     db: Session = Depends(get_db),
 ):
@@ -53,31 +82,24 @@ def submit_request(
     if not district.is_active:
         raise HTTPException(status_code=422, detail="الحي غير نشط حالياً، يرجى اختيار حي آخر")
 
-    # Generate unique tracking code
-    for _ in range(10):
-        code = _generate_tracking_code()
-        if not db.query(ServiceRequest).filter(ServiceRequest.tracking_code == code).first():
-            break
-    else:
-        raise HTTPException(status_code=500, detail="Could not generate unique tracking code")
-
-    # Eagerly load municipality for complaint number generation
-    from sqlalchemy.orm import joinedload
-    from app.routers.admin import _generate_complaint_number, _notify_request_scope
-    district = (
-        db.query(District)
-        .options(joinedload(District.municipality))
-        .filter(District.id == payload.district_id)
-        .first()
-    )
-    complaint_number = _generate_complaint_number(db, district)
+    duplicate_of_id = None
+    if (
+        settings.duplicate_detection_enabled
+        and payload.location_lat is not None
+        and payload.location_lng is not None
+    ):
+        duplicate_of_id = duplicate_index.find_duplicate(
+            db, district.municipality_id, payload.category, payload.location_lat, payload.location_lng
+        )
+
+    complaint_number = allocate_complaint_number(db, district.municipality_id)
 
     now = datetime.now(timezone.utc)
     sla_deadline = get_sla_deadline(now, payload.category, "normal")
     sla_status = calculate_sla_status(now, payload.category, "normal", "new",
                                        sla_deadline=sla_deadline)
 
-    new_req = ServiceRequest(
+    new_req = insert_service_request(db, dict(
         municipality_id=district.municipality_id,
         district_id=district.id,
         complaint_number=complaint_number,
@@ -85,15 +107,13 @@ def submit_request(
         priority="normal",
         status="new",
         description=payload.description,
-        tracking_code=code,
         address_text=payload.address_text,
         location_lat=payload.location_lat,
         location_lng=payload.location_lng,
         sla_deadline=sla_deadline,
         sla_status=sla_status,
-    )
-    db.add(new_req)
-    db.flush()  # get new_req.id
+        duplicate_of_id=duplicate_of_id,
+    ))
 
     db.add(RequestUpdate(
         request_id=new_req.id,
@@ -102,52 +122,149 @@ def submit_request(
         to_status="new",
         is_internal=False,
     ))
-    _notify_request_scope(
-        db,
-        new_req,
-        kind="new_complaint",
-        title="شكوى جديدة",
-        message=f"تم تسجيل شكوى جديدة برقم {new_req.complaint_number or new_req.tracking_code}",
-    )
+    # Notification fan-out runs after the response (see admin._handle_request_created)
+    enqueue(db, "request_created", {"request_id": str(new_req.id)})
+    publish_geo(db, new_req)
+    request_created(db)
     db.commit()
     db.refresh(new_req)
     return new_req
 
 
+# Columns the public payload exposes; nothing else is read from the row
+_PUBLIC_REQUEST_COLUMNS = [ServiceRequest.__table__.c[name] for name in ServiceRequestOut.model_fields]
+_PUBLIC_UPDATE_COLUMNS = [RequestUpdate.__table__.c[name] for name in RequestUpdateOut.model_fields]
+_PUBLIC_ATTACHMENT_COLUMNS = [Attachment.__table__.c[name] for name in AttachmentOut.model_fields]
+
+
+def _load_public_detail(db: Session, tracking_code: str) -> Optional[ServiceRequestDetail]:
+    """Build the citizen-facing view of a request.
+
+    Only public timeline entries are fetched (filtered and ordered in SQL).
+    Materials are internal bookkeeping and are not exposed.
+    """
+    row = (
+        db.query(
+            *_PUBLIC_REQUEST_COLUMNS,
+            Municipality.name.label("municipality_name"),
+            District.name.label("district_name"),
+            Governorate.name.label("governorate_name"),
+        )
+        .select_from(ServiceRequest)
+        .outerjoin(Municipality, Municipality.id == ServiceRequest.municipality_id)
+        .outerjoin(District, District.id == ServiceRequest.district_id)
+        .outerjoin(Governorate, Governorate.id == Municipality.governorate_id)
+        .filter(ServiceRequest.tracking_code == tracking_code.upper())
+        .first()
+    )
+    if row is None:
+        return None
+    updates = (
+        db.query(*_PUBLIC_UPDATE_COLUMNS)
+        .filter(RequestUpdate.request_id == row.id, RequestUpdate.is_internal.is_(False))
+        .order_by(RequestUpdate.created_at)
+        .all()
+    )
+    attachments = (
+        db.query(*_PUBLIC_ATTACHMENT_COLUMNS)
+        .filter(Attachment.request_id == row.id)
+        .order_by(Attachment.created_at)
+        .all()
+    )
+    return ServiceRequestDetail(
+        **row._mapping,
+        updates=[RequestUpdateOut(**u._mapping) for u in updates],
+        attachments=[AttachmentOut(**a._mapping) for a in attachments],
+    )
+
+
+# Rendered public payloads by tracking code; writers invalidate via the
+# "request_changed" event so every worker drops its copy
+_tracking_cache = LRUCache("public_tracking", settings.tracking_cache_size, settings.tracking_cache_ttl_seconds)
+subscribe("request_changed", _tracking_cache.invalidate, on_reset=_tracking_cache.clear)
+
+
 @router.get("/requests/{tracking_code}", response_model=ServiceRequestDetail)
 def track_request(tracking_code: str, db: Session = Depends(get_db)):
-    req = db.query(ServiceRequest).filter(
-        ServiceRequest.tracking_code == tracking_code.upper()
-    ).first()
-    if not req:
-        raise HTTPException(status_code=404, detail="Tracking code not found")
+    code = tracking_code.upper()
+    body = _tracking_cache.get(code)
+    if body is None:
+        generation = _tracking_cache.generation
+        detail = _load_public_detail(db, code)
+        if detail is None:
+            raise HTTPException(status_code=404, detail="Tracking code not found")
+        body = detail.model_dump_json().encode()
+        _tracking_cache.set(code, body, generation)
+    return Response(content=body, media_type="application/json")
+
+
+def _sse_event(update: RequestUpdateOut) -> str:
+    return f"id: {update.id}\nevent: update\ndata: {update.model_dump_json()}\n\n"
 
-    # Filter out internal updates before returning
-    req.updates = [u for u in req.updates if not u.is_internal]
-    return req
 
+async def _tracking_events(stream: TrackingStream, backlog: list[RequestUpdateOut]):
+    try:
+        yield "retry: 5000\n\n"
+        for update in backlog:
+            yield _sse_event(update)
+        while not (stream.overflowed and stream.queue.empty()):
+            try:
+                update = await asyncio.wait_for(stream.queue.get(), settings.tracking_stream_keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse_event(update)
+    finally:
+        tracking_streams.close(stream)
 
-@router.post("/requests/{tracking_code}/update", response_model=ServiceRequestDetail)
-@limiter.limit(f"{settings.rate_limit_per_hour}/hour")
+
+@router.get("/requests/{tracking_code}/events")
+async def track_request_events(tracking_code: str, last_event_id: Optional[str] = Header(None)):
+    """Server-sent events: one ``update`` event per new public timeline entry.
+
+    Reconnecting clients send Last-Event-ID and receive what they missed.
+    No database connection is held while the stream is idle.
+    """
+    code = tracking_code.upper()
+    start = await run_in_threadpool(resolve_stream_start, code, last_event_id)
+    if start is None:
+        raise HTTPException(status_code=404, detail="Tracking code not found")
+    request_id, cursor, backlog, seen = start
+    try:
+        stream = tracking_streams.open(code, request_id, cursor, seen)
+    except StreamsFull:
+        raise HTTPException(
+            status_code=503,
+            detail="عدد الاتصالات المباشرة كبير حالياً، يرجى المحاولة لاحقاً",
+            headers={"Retry-After": "30"},
+        )
+    return StreamingResponse(
+        _tracking_events(stream, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/requests/{tracking_code}/update",
+    response_model=ServiceRequestDetail,
+    dependencies=[Depends(rate_limited("public_update", public_write_limit))],
+)
 def citizen_update(
-    request: Request,
     tracking_code: str,
     payload: PublicCitizenUpdate,
     db: Session = Depends(get_db),
 ):
-    req = db.query(ServiceRequest).filter(
-        ServiceRequest.tracking_code == tracking_code.upper()
-    ).first()
-    if not req:
+    code = tracking_code.upper()
+    request_id = db.query(ServiceRequest.id).filter(ServiceRequest.tracking_code == code).scalar()
+    if request_id is None:
         raise HTTPException(status_code=404, detail="Tracking code not found")
 
     db.add(RequestUpdate(
-        request_id=req.id,
+        request_id=request_id,
         message=payload.message,
         is_internal=False,
     ))
+    publish(db, "request_changed", code)
     db.commit()
-    db.refresh(req)
-
-    req.updates = [u for u in req.updates if not u.is_internal]
-    return req
+    return _load_public_detail(db, tracking_code)
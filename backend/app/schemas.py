@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, field_validator
@@ -31,6 +31,12 @@ class LoginRequest(BaseModel):
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class UserOut(BaseModel):
@@ -171,6 +177,7 @@ class ServiceRequestOut(BaseModel):
     created_at: datetime
     updated_at: datetime
     closed_at: Optional[datetime] = None
+    duplicate_of_id: Optional[UUID] = None
 
     class Config:
         from_attributes = True
@@ -281,13 +288,38 @@ class AdminServiceRequestCreate(BaseModel):
         return v.strip()
 
 
+class BulkServiceRequestCreate(BaseModel):
+    # Items are validated one by one so a bad row is reported, not fatal
+    items: list[dict[str, Any]]
+
+
+class BulkServiceRequestItemResult(BaseModel):
+    index: int
+    ok: bool
+    request: Optional[ServiceRequestOut] = None
+    error: Optional[str] = None
+
+
+class BulkServiceRequestResult(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkServiceRequestItemResult]
+
+
 # ─── Paginated responses ──────────────────────────────────────────────────────
 
 class PaginatedRequests(BaseModel):
     items: list[ServiceRequestOut]
-    total: int
-    page: int
+    # None with count=false and on cursor pages after the first
+    total: Optional[int] = None
+    # True when total is the planner's estimate (count=estimate on a large scope)
+    total_is_estimate: bool = False
+    # Set in page mode only
+    page: Optional[int] = None
     page_size: int
+    has_next: bool = False
+    # Cursor mode: pass back as `cursor` for the next page; None on the last page
+    next_cursor: Optional[str] = None
 
 
 # ─── User management ──────────────────────────────────────────────────────────
@@ -312,6 +344,18 @@ class ResponsibleTeamUpdateRequest(BaseModel):
     responsible_team_id: Optional[UUID] = None
 
 
+class MergeRequestsRequest(BaseModel):
+    duplicate_ids: list[UUID]
+    note: Optional[str] = None
+
+    @field_validator("duplicate_ids")
+    @classmethod
+    def validate_duplicate_ids(cls, v: list[UUID]) -> list[UUID]:
+        if not v:
+            raise ValueError("يجب تحديد طلب مكرر واحد على الأقل")
+        return list(dict.fromkeys(v))
+
+
 class MunicipalTeamOut(BaseModel):
     id: UUID
     municipality_id: UUID
@@ -0,0 +1,42 @@
+"""Arabic-aware search over service requests.
+
+``service_requests.search_text`` is kept by a trigger and holds the
+complaint number, tracking code, description and address passed through the
+``normalize_arabic`` SQL function (migration 0022): diacritics and tatweel
+removed, alef / yaa / taa-marbuta / hamza forms and Arabic-Indic digits
+folded, lower-cased. Search terms go through the same function, so
+"مدرسة" finds "مدرسه" and "إنارة" finds "انارة". Every word of the term
+must appear as a substring; the trigram GIN index on search_text serves
+these LIKE patterns, and results can be ranked by trigram word similarity.
+"""
+from typing import List
+
+from sqlalchemy import and_, func, literal
+
+from app.models import ServiceRequest
+
+MAX_SEARCH_WORDS = 8
+
+
+def _words(term: str) -> List[str]:
+    return term.split()[:MAX_SEARCH_WORDS]
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_condition(term: str):
+    """Every word of `term` occurs in the normalized search text."""
+    return and_(*(
+        ServiceRequest.search_text.like(
+            literal("%") + func.normalize_arabic(_escape_like(word)) + literal("%"),
+            escape="\\",
+        )
+        for word in _words(term)
+    ))
+
+
+def search_rank(term: str):
+    """Trigram similarity between `term` and the closest part of the search text."""
+    return func.word_similarity(func.normalize_arabic(" ".join(_words(term))), ServiceRequest.search_text)
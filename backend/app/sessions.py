@@ -0,0 +1,228 @@
+"""Login sessions: rotating refresh tokens and the revoked-session set.
+
+Each login creates an ``auth_sessions`` row. The client receives a
+short-lived access token (carrying the session id and the principal's
+claims) and an opaque refresh token ``<session id>.<secret>``; only a hash of
+the secret is stored and it is replaced on every refresh. The secret just
+replaced is still accepted for ``refresh_token_reuse_grace_seconds`` (two
+tabs refreshing at once); presenting any other rotated secret revokes the
+whole session (the token was copied).
+
+Access tokens are checked without touching the database: every worker keeps
+the ids of sessions revoked within the last access-token lifetime in memory,
+loaded from the table and kept current through the ``session_revoked`` event,
+with a periodic resync on a background thread as a safety net.
+"""
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.auth import create_access_token
+from app.config import get_settings
+from app.database import SessionLocal
+from app.events import publish, subscribe
+from app.models import AuthSession, User
+from app.schemas import TokenResponse
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def _hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def issue_tokens(user: User, session: AuthSession, secret: str) -> TokenResponse:
+    access_token = create_access_token({
+        "sub": str(user.id),
+        "ver": user.token_version,
+        "sid": str(session.id),
+        "role": user.role,
+        "name": user.full_name,
+        "gov": str(user.governorate_id) if user.governorate_id else None,
+        "mun": str(user.municipality_id) if user.municipality_id else None,
+        "dist": str(user.district_id) if user.district_id else None,
+    })
+    return TokenResponse(
+        access_token=access_token,
+        refresh_token=f"{session.id}.{secret}",
+        expires_in=settings.access_token_expire_minutes * 60,
+    )
+
+
+def create_session(db: Session, user: User) -> TokenResponse:
+    """Open a session for `user` and return its first token pair (caller commits)."""
+    secret = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    session = AuthSession(
+        user_id=user.id,
+        refresh_token_hash=_hash_secret(secret),
+        created_at=now,
+        last_used_at=now,
+        expires_at=now + timedelta(days=settings.refresh_token_expire_days),
+    )
+    db.add(session)
+    db.flush()
+    return issue_tokens(user, session, secret)
+
+
+def rotate_session(db: Session, refresh_token: str) -> Optional[TokenResponse]:
+    """Exchange a refresh token for a new pair; None if it is not valid (caller commits)."""
+    session_id, _, secret = refresh_token.partition(".")
+    try:
+        sid = UUID(session_id)
+    except ValueError:
+        return None
+    now = datetime.now(timezone.utc)
+    session = db.query(AuthSession).filter(
+        AuthSession.id == sid,
+        AuthSession.revoked_at.is_(None),
+        AuthSession.expires_at > now,
+    ).with_for_update().first()
+    if session is None:
+        return None
+    presented = _hash_secret(secret)
+    if not secrets.compare_digest(session.refresh_token_hash, presented) and not _within_grace(session, presented, now):
+        # An old secret came back: someone else holds a copy of this session
+        revoke_session(db, session)
+        return None
+    user = db.query(User).filter(User.id == session.user_id).first()
+    if user is None or not user.is_active:
+        revoke_session(db, session)
+        return None
+    new_secret = secrets.token_urlsafe(32)
+    session.previous_refresh_token_hash = session.refresh_token_hash
+    session.refresh_token_hash = _hash_secret(new_secret)
+    session.rotated_at = now
+    session.last_used_at = now
+    return issue_tokens(user, session, new_secret)
+
+
+def _within_grace(session: AuthSession, presented: str, now: datetime) -> bool:
+    """`presented` is the secret the last rotation replaced, and that rotation was recent."""
+    return (
+        session.previous_refresh_token_hash is not None
+        and session.rotated_at is not None
+        and now - session.rotated_at <= timedelta(seconds=settings.refresh_token_reuse_grace_seconds)
+        and secrets.compare_digest(session.previous_refresh_token_hash, presented)
+    )
+
+
+def revoke_session(db: Session, session: AuthSession) -> None:
+    if session.revoked_at is None:
+        session.revoked_at = datetime.now(timezone.utc)
+        publish(db, "session_revoked", str(session.id))
+
+
+def revoke_user_sessions(db: Session, user_id: UUID) -> None:
+    """Revoke every open session of `user_id` (deactivation, scope change, password change)."""
+    revoked = db.execute(
+        update(AuthSession)
+        .where(AuthSession.user_id == user_id, AuthSession.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+        .returning(AuthSession.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    for sid in revoked:
+        publish(db, "session_revoked", str(sid))
+
+
+class RevokedSessions:
+    """Per-worker set of recently revoked session ids.
+
+    ``session_revoked`` events keep it current; a background thread reloads
+    it every ``session_revocation_resync_seconds`` and after the event
+    listener reconnects, so checks never wait on the database. Until the
+    thread runs (scripts, tests) the set is loaded on first use.
+    """
+
+    def __init__(self):
+        # session id -> monotonic time after which its access tokens have all expired
+        self._revoked: Dict[str, float] = {}
+        self._synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def _horizon(self) -> float:
+        return settings.access_token_expire_minutes * 60
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="revoked-sessions", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                self._sync()
+            except Exception:
+                logger.exception("Could not reload revoked sessions")
+            self._wakeup.wait(settings.session_revocation_resync_seconds)
+
+    def _load(self) -> List[Tuple[UUID, datetime]]:
+        since = datetime.now(timezone.utc) - timedelta(seconds=self._horizon)
+        db = SessionLocal()
+        try:
+            return db.query(AuthSession.id, AuthSession.revoked_at).filter(AuthSession.revoked_at >= since).all()
+        finally:
+            db.close()
+
+    def _sync(self) -> None:
+        rows = self._load()
+        now_wall = datetime.now(timezone.utc)
+        now = time.monotonic()
+        revoked = {
+            str(sid): now + self._horizon - (now_wall - revoked_at).total_seconds()
+            for sid, revoked_at in rows
+        }
+        with self._lock:
+            # Keep live entries added by events while the query ran
+            revoked.update({sid: exp for sid, exp in self._revoked.items() if exp > now})
+            self._revoked = revoked
+            self._synced_at = now
+
+    def is_revoked(self, session_id: str) -> bool:
+        if self._synced_at is None:
+            self._sync()
+        expires = self._revoked.get(session_id)
+        return expires is not None and expires > time.monotonic()
+
+    def add(self, session_id: str) -> None:
+        with self._lock:
+            self._revoked[session_id] = time.monotonic() + self._horizon
+
+    def reset(self) -> None:
+        """Events may have been missed: reload now (on first use when the thread is not running)."""
+        if self._thread is None:
+            with self._lock:
+                self._synced_at = None
+        self._wakeup.set()
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+revoked_sessions = RevokedSessions()
+subscribe("session_revoked", revoked_sessions.add, on_reset=revoked_sessions.reset)
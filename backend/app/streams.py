@@ -0,0 +1,268 @@
+"""Live citizen tracking streams (server-sent events).
+
+Each open stream is an ``asyncio.Queue`` on the worker's event loop, so an
+idle connection costs a coroutine and a queue rather than a thread or a
+database connection. Writers already publish ``request_changed`` for every
+change (see ``app.events``); when one arrives for a tracking code that has
+listeners, the hub fetches the new public timeline entries once and fans
+them out to every stream on that code. Internal notes never leave the hub
+because only ``is_internal = false`` rows are read.
+
+``created_at`` is assigned by the writer before its transaction commits, so
+entries can become visible out of ``created_at`` order. Fetches therefore
+re-read ``tracking_stream_overlap_seconds`` behind the newest entry seen, and
+each stream de-duplicates by id, instead of trusting a strict
+``created_at >`` cursor. Every open triggers a fetch, so an entry committed
+between a stream's snapshot (``resolve_stream_start``) and its registration is
+not lost; a stream joining a busy topic rewinds that fetch to its own start.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.events import subscribe
+from app.models import RequestUpdate, ServiceRequest
+from app.schemas import RequestUpdateOut
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_PUBLIC_UPDATE_COLUMNS = [RequestUpdate.__table__.c[name] for name in RequestUpdateOut.model_fields]
+
+
+class StreamsFull(Exception):
+    """Raised when this worker already holds the maximum number of streams."""
+
+
+@dataclass(eq=False)
+class TrackingStream:
+    tracking_code: str
+    queue: "asyncio.Queue[RequestUpdateOut]"
+    # Entries at or before `floor` count as delivered; newer ones the client
+    # has are in `seen` (id -> created_at), pruned to the overlap window
+    floor: Optional[datetime] = None
+    seen: Dict[UUID, datetime] = field(default_factory=dict)
+    overflowed: bool = False
+
+    def has(self, update: RequestUpdateOut) -> bool:
+        return update.id in self.seen or (self.floor is not None and update.created_at <= self.floor)
+
+    def prune(self, horizon: datetime) -> None:
+        if self.floor is None or horizon > self.floor:
+            self.floor = horizon
+            self.seen = {i: at for i, at in self.seen.items() if at > horizon}
+
+
+@dataclass
+class _Topic:
+    request_id: UUID
+    # Newest created_at fetched; the next fetch starts an overlap before it
+    cursor: Optional[datetime]
+    streams: Set[TrackingStream] = field(default_factory=set)
+    fetching: bool = False
+    dirty: bool = False
+    # A stream joined: the next fetch also covers everything after its start
+    # (None with rewind set: from the first entry)
+    rewind: bool = False
+    rewind_to: Optional[datetime] = None
+
+
+def _overlap() -> timedelta:
+    return timedelta(seconds=settings.tracking_stream_overlap_seconds)
+
+
+def load_public_updates(db: Session, request_id: UUID, since: Optional[datetime]) -> List[RequestUpdateOut]:
+    query = db.query(*_PUBLIC_UPDATE_COLUMNS).filter(
+        RequestUpdate.request_id == request_id,
+        RequestUpdate.is_internal.is_(False),
+    )
+    if since is not None:
+        query = query.filter(RequestUpdate.created_at > since)
+    return [RequestUpdateOut(**u._mapping) for u in query.order_by(RequestUpdate.created_at).all()]
+
+
+def _fetch_updates(request_id: UUID, since: Optional[datetime]) -> List[RequestUpdateOut]:
+    db = SessionLocal()
+    try:
+        return load_public_updates(db, request_id, since - _overlap() if since is not None else None)
+    finally:
+        db.close()
+
+
+def resolve_stream_start(
+    tracking_code: str, last_event_id: Optional[str]
+) -> Optional[tuple[UUID, Optional[datetime], List[RequestUpdateOut], Dict[UUID, datetime]]]:
+    """Return (request id, cursor, backlog, seen) for a new stream, or None if the code is unknown.
+
+    With a valid Last-Event-ID the backlog holds the public updates after that
+    event; otherwise the stream starts at the newest existing update. `seen`
+    maps the ids the client already has within the overlap window before the
+    cursor (plus the backlog) to their created_at.
+    """
+    db = SessionLocal()
+    try:
+        request_id = db.query(ServiceRequest.id).filter(ServiceRequest.tracking_code == tracking_code).scalar()
+        if request_id is None:
+            return None
+        since = None
+        if last_event_id:
+            try:
+                event_id = UUID(last_event_id)
+            except ValueError:
+                event_id = None
+            if event_id is not None:
+                since = db.query(RequestUpdate.created_at).filter(
+                    RequestUpdate.id == event_id,
+                    RequestUpdate.request_id == request_id,
+                    RequestUpdate.is_internal.is_(False),
+                ).scalar()
+        if since is not None:
+            backlog = load_public_updates(db, request_id, since)
+            cursor = backlog[-1].created_at if backlog else since
+        else:
+            backlog = []
+            cursor = db.query(func.max(RequestUpdate.created_at)).filter(
+                RequestUpdate.request_id == request_id,
+                RequestUpdate.is_internal.is_(False),
+            ).scalar()
+        seen: Dict[UUID, datetime] = {}
+        if cursor is not None:
+            boundary = since if since is not None else cursor
+            seen = dict(db.query(RequestUpdate.id, RequestUpdate.created_at).filter(
+                RequestUpdate.request_id == request_id,
+                RequestUpdate.is_internal.is_(False),
+                RequestUpdate.created_at > boundary - _overlap(),
+                RequestUpdate.created_at <= boundary,
+            ).all())
+        seen.update((update.id, update.created_at) for update in backlog)
+        return request_id, cursor, backlog, seen
+    finally:
+        db.close()
+
+
+class TrackingStreamHub:
+    """Per-worker registry of open tracking streams, keyed by tracking code."""
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._topics: Dict[str, _Topic] = {}
+        self._count = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def stats(self) -> Dict[str, int]:
+        return {"streams": self._count, "tracking_codes": len(self._topics)}
+
+    def open(
+        self, tracking_code: str, request_id: UUID, cursor: Optional[datetime], seen: Dict[UUID, datetime],
+    ) -> TrackingStream:
+        """Register a stream (must run on the event loop)."""
+        if self._count >= settings.tracking_stream_max_connections:
+            raise StreamsFull()
+        stream = TrackingStream(
+            tracking_code=tracking_code,
+            queue=asyncio.Queue(maxsize=settings.tracking_stream_queue_size),
+            # Everything up to an overlap before the cursor is in `seen` or
+            # was already delivered (see resolve_stream_start)
+            floor=cursor - _overlap() if cursor is not None else None,
+            seen=dict(seen),
+        )
+        topic = self._topics.get(tracking_code)
+        if topic is None:
+            topic = self._topics[tracking_code] = _Topic(request_id=request_id, cursor=cursor)
+        elif not topic.rewind:
+            topic.rewind, topic.rewind_to = True, cursor
+        elif topic.rewind_to is not None:
+            topic.rewind_to = min(topic.rewind_to, cursor) if cursor is not None else None
+        topic.streams.add(stream)
+        self._count += 1
+        # Entries committed since the stream's snapshot may already have
+        # been fetched (or announced) before it was registered
+        self._on_change(tracking_code)
+        return stream
+
+    def close(self, stream: TrackingStream) -> None:
+        topic = self._topics.get(stream.tracking_code)
+        if topic is None or stream not in topic.streams:
+            return
+        topic.streams.discard(stream)
+        self._count -= 1
+        if not topic.streams:
+            del self._topics[stream.tracking_code]
+
+    def deliver(self, stream: TrackingStream, update: RequestUpdateOut) -> None:
+        if stream.has(update):
+            return
+        try:
+            stream.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # A client this far behind is dropped; it can reconnect with Last-Event-ID
+            stream.overflowed = True
+            return
+        stream.seen[update.id] = update.created_at
+
+    def notify(self, tracking_code: str) -> None:
+        """Event-bus callback; may run on any thread."""
+        loop = self._loop
+        if loop is None or tracking_code not in self._topics:
+            return
+        loop.call_soon_threadsafe(self._on_change, tracking_code)
+
+    def _on_change(self, tracking_code: str) -> None:
+        topic = self._topics.get(tracking_code)
+        if topic is None:
+            return
+        if topic.fetching:
+            # Coalesce: one more fetch runs after the current one
+            topic.dirty = True
+            return
+        topic.fetching = True
+        task = asyncio.create_task(self._refresh(tracking_code, topic))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, tracking_code: str, topic: _Topic) -> None:
+        try:
+            while True:
+                topic.dirty = False
+                since = topic.cursor
+                if topic.rewind:
+                    if since is not None:
+                        since = min(since, topic.rewind_to) if topic.rewind_to is not None else None
+                    topic.rewind, topic.rewind_to = False, None
+                # Streams that join during the fetch keep their floor until
+                # their own rewind has been fetched
+                covered = list(topic.streams)
+                try:
+                    updates = await run_in_threadpool(_fetch_updates, topic.request_id, since)
+                except Exception:
+                    logger.exception("Could not load updates for tracking stream %s", tracking_code)
+                    return
+                for update in updates:
+                    if topic.cursor is None or update.created_at > topic.cursor:
+                        topic.cursor = update.created_at
+                    for stream in list(topic.streams):
+                        self.deliver(stream, update)
+                if topic.cursor is not None:
+                    horizon = topic.cursor - _overlap()
+                    for stream in covered:
+                        stream.prune(horizon)
+                if not topic.dirty or self._topics.get(tracking_code) is not topic:
+                    return
+        finally:
+            topic.fetching = False
+
+
+hub = TrackingStreamHub()
+subscribe("request_changed", hub.notify)
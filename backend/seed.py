@@ -228,6 +228,7 @@ def _seed_demo_requests(db, mun, districts):
                                        sr_data["status"], sla_deadline=sla_dl)
         req = ServiceRequest(
             municipality_id=mun.id,
+            governorate_id=mun.governorate_id,
             district_id=dist.id,
             category=sr_data["category"],
             priority=sr_data["priority"],
@@ -0,0 +1,238 @@
+"""Shared fixtures.
+
+With ``TEST_DATABASE_URL`` set, the suite runs against that PostgreSQL
+database: the schema is built by the Alembic migrations once per run and
+emptied after every test. Without it the tests run against a throwaway
+SQLite file per test, which covers the application logic but not the
+PostgreSQL-only statements (sequences, ON CONFLICT, EXPLAIN, triggers);
+those tests are marked ``postgres`` and skipped.
+"""
+import asyncio
+import os
+import uuid
+from datetime import timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ.setdefault("EVENT_LISTENER_ENABLED", "false")
+os.environ.setdefault("OUTBOX_WORKER_ENABLED", "false")
+
+import pytest
+from sqlalchemy import DateTime, create_engine, event, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.types import TypeDecorator
+
+from app import database
+from app.cache import _lru_caches
+from app.database import AsyncSessionLocal, Base, SessionLocal
+from app.geoindex import duplicate_index
+from app.models import District, Governorate, Municipality, ServiceRequest, User
+from app.sessions import create_session, revoked_sessions
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs PostgreSQL (TEST_DATABASE_URL)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if TEST_DATABASE_URL:
+        return
+    skip = pytest.mark.skip(reason="TEST_DATABASE_URL is not set")
+    for item in items:
+        if "postgres" in item.keywords:
+            item.add_marker(skip)
+
+
+# ─── SQLite stand-in ─────────────────────────────────────────────────────────
+
+class _UTCDateTime(TypeDecorator):
+    """SQLite drops the UTC offset; hand values back aware, as PostgreSQL does."""
+    impl = DateTime
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+
+if not TEST_DATABASE_URL:
+    @compiles(JSONB, "sqlite")
+    def _jsonb_on_sqlite(type_, compiler, **kw):
+        return "JSON"
+
+    for _table in Base.metadata.tables.values():
+        for _column in _table.columns:
+            if isinstance(_column.type, DateTime):
+                _column.type = _UTCDateTime()
+
+
+def _sqlite_functions(dbapi_conn, _record):
+    # events.publish issues pg_notify; local delivery happens after commit
+    dbapi_conn.create_function("pg_notify", 2, lambda channel, payload: None)
+
+
+# ─── Database ────────────────────────────────────────────────────────────────
+
+@pytest.fixture(scope="session")
+def _migrated():
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(config, "head")
+
+
+def _truncate_all() -> None:
+    tables = ", ".join(f'"{table.name}"' for table in Base.metadata.sorted_tables)
+    with database.engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+
+@pytest.fixture
+def db_engine(request, tmp_path):
+    """The engine behind SessionLocal / AsyncSessionLocal for this test."""
+    if TEST_DATABASE_URL:
+        request.getfixturevalue("_migrated")
+        yield database.engine
+        _truncate_all()
+        return
+
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", _sqlite_functions)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(async_engine.sync_engine, "connect", _sqlite_functions)
+    Base.metadata.create_all(engine)
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    try:
+        yield engine
+    finally:
+        SessionLocal.configure(bind=database.engine)
+        AsyncSessionLocal.configure(bind=database.async_engine)
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def db(db_engine):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_worker_state():
+    """Per-worker in-memory state must not leak between tests."""
+    yield
+    for cache in _lru_caches.values():
+        cache.clear()
+    duplicate_index.reset()
+    revoked_sessions.reset()
+
+
+@pytest.fixture
+def client(db_engine):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def pg_async_session():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    url = make_url(TEST_DATABASE_URL).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(url)
+    try:
+        async with engine.connect() as conn:
+            async with AsyncSession(bind=conn) as session:
+                yield session
+    finally:
+        await engine.dispose()
+
+
+# ─── Data ────────────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def area(db):
+    """One governorate with two municipalities, each with one district."""
+    governorate = Governorate(name="محافظة الاختبار")
+    db.add(governorate)
+    db.flush()
+    municipalities, districts = [], []
+    for n in (1, 2):
+        municipality = Municipality(name=f"بلدية {n}", governorate_id=governorate.id)
+        db.add(municipality)
+        db.flush()
+        district = District(name=f"حي {n}", municipality_id=municipality.id)
+        db.add(district)
+        db.flush()
+        municipalities.append(municipality)
+        districts.append(district)
+    db.commit()
+    return SimpleNamespace(governorate=governorate, municipalities=municipalities, districts=districts)
+
+
+@pytest.fixture
+def make_user(db, area):
+    """Create a user scoped to the first municipality / district; returns (user, auth headers)."""
+    def _make(role: str, district: District = None):
+        district = district or area.districts[0]
+        municipality = next(m for m in area.municipalities if m.id == district.municipality_id)
+        user = User(
+            username=f"{role}-{uuid.uuid4().hex[:8]}",
+            full_name=role,
+            role=role,
+            password_hash="x",
+            governorate_id=area.governorate.id,
+            municipality_id=None if role == "governor" else municipality.id,
+            district_id=district.id if role in ("mukhtar", "district_admin") else None,
+        )
+        db.add(user)
+        db.flush()
+        tokens = create_session(db, user)
+        db.commit()
+        return user, {"Authorization": f"Bearer {tokens.access_token}"}
+    return _make
+
+
+@pytest.fixture
+def make_request(db, area):
+    """Insert a service request in the first district unless told otherwise."""
+    def _make(district: District = None, **values) -> ServiceRequest:
+        district = district or area.districts[0]
+        req = ServiceRequest(
+            municipality_id=district.municipality_id,
+            governorate_id=area.governorate.id,
+            district_id=district.id,
+            tracking_code=uuid.uuid4().hex[:8].upper(),
+            category=values.pop("category", "water"),
+            priority=values.pop("priority", "normal"),
+            status=values.pop("status", "new"),
+            description=values.pop("description", "تسرب مياه"),
+            **values,
+        )
+        db.add(req)
+        db.commit()
+        return req
+    return _make
@@ -0,0 +1,80 @@
+import pytest
+
+from app.models import AuditLog, Notification, OutboxEvent, RequestUpdate, ServiceRequest
+from app.routers.admin import _handle_requests_bulk_created
+
+
+def _item(district_id, **values):
+    return {
+        "district_id": str(district_id),
+        "category": "water",
+        "description": "انقطاع المياه منذ يومين",
+        **values,
+    }
+
+
+def test_batch_without_valid_items_is_422_with_per_item_errors(client, db, area, make_user):
+    _, headers = make_user("mukhtar")
+    items = [
+        _item(area.districts[0].id, category="unknown"),
+        _item(area.districts[1].id),
+        {"description": "بلا حي"},
+    ]
+
+    response = client.post("/admin/requests/bulk", json={"items": items}, headers=headers)
+
+    assert response.status_code == 422
+    body = response.json()
+    assert (body["created"], body["failed"]) == (0, 3)
+    assert [r["index"] for r in body["results"]] == [0, 1, 2]
+    assert not any(r["ok"] for r in body["results"])
+    assert body["results"][1]["error"] == "يمكنك إضافة طلبات في حيّك فقط"
+    assert db.query(ServiceRequest).count() == 0
+    assert db.query(OutboxEvent).count() == 0
+
+
+def test_bulk_intake_is_limited_to_mukhtars_and_district_admins(client, area, make_user):
+    _, headers = make_user("mayor")
+    response = client.post("/admin/requests/bulk", json={"items": [_item(area.districts[0].id)]}, headers=headers)
+    assert response.status_code == 403
+
+
+@pytest.mark.postgres
+def test_valid_items_are_created_and_fanned_out_as_one_event(client, db, area, make_user):
+    _, headers = make_user("mukhtar")
+    items = [_item(area.districts[0].id), _item(area.districts[0].id, category="bogus"), _item(area.districts[0].id)]
+
+    response = client.post("/admin/requests/bulk", json={"items": items}, headers=headers)
+
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 1)
+    assert [r["ok"] for r in body["results"]] == [True, False, True]
+    numbers = [r["request"]["complaint_number"] for r in body["results"] if r["ok"]]
+    assert len(set(numbers)) == 2
+    assert db.query(RequestUpdate).count() == 2
+    events = db.query(OutboxEvent).all()
+    assert [e.kind for e in events] == ["requests_bulk_created"]
+    assert len(events[0].payload["request_ids"]) == 2
+
+
+def test_fan_out_handler_notifies_each_scope_and_audits_each_request(db, area, make_user, make_request):
+    mukhtar, _ = make_user("mukhtar")
+    make_user("mayor")
+    make_user("governor")
+    other_mukhtar, _ = make_user("mukhtar", district=area.districts[1])
+    reqs = [make_request(complaint_number=f"00000{n}") for n in (1, 2, 3)]
+
+    _handle_requests_bulk_created(db, {
+        "request_ids": [str(r.id) for r in reqs],
+        "actor_user_id": str(mukhtar.id),
+    })
+    db.commit()
+
+    # mukhtar, mayor and governor of the first district, once per request
+    notified = db.query(Notification.user_id, Notification.related_entity_id).all()
+    assert len(notified) == 9
+    assert other_mukhtar.id not in {user_id for user_id, _ in notified}
+    audits = db.query(AuditLog).all()
+    assert sorted(a.entity_id for a in audits) == sorted(str(r.id) for r in reqs)
+    assert {(a.action, a.details, a.actor_user_id) for a in audits} == {("create_request", "bulk", mukhtar.id)}
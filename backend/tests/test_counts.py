@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import column, func, select, table, text
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app import counts
+from app.models import ServiceRequest
+from app.routers import admin
+
+numbers = table("count_test_numbers", column("n"))
+
+
+STEP_START = datetime.fromtimestamp(1_800_000_000, timezone.utc)
+
+
+def _overdue_count_query(now):
+    q = select(ServiceRequest).where(
+        ServiceRequest.closed_at.is_(None),
+        ServiceRequest.sla_deadline < now,
+    )
+    return select(func.count()).select_from(q.subquery())
+
+
+def test_clock_steps_by_cache_ttl(monkeypatch):
+    monkeypatch.setattr(counts.settings, "request_count_cache_ttl_seconds", 30.0)
+    assert counts._clock_step(STEP_START + timedelta(seconds=12.5)) == STEP_START
+    assert counts._clock_step(STEP_START + timedelta(seconds=29.9)) == STEP_START
+    assert counts._clock_step(STEP_START + timedelta(seconds=30)) == STEP_START + timedelta(seconds=30)
+
+
+def test_overdue_filter_reuses_the_cache_key_within_a_step(monkeypatch):
+    db = SimpleNamespace(bind=SimpleNamespace(dialect=asyncpg.dialect()))
+    monkeypatch.setattr(counts.settings, "request_count_cache_ttl_seconds", 30.0)
+
+    def _key(seconds):
+        now = STEP_START + timedelta(seconds=seconds)
+        return counts._fingerprint(db, _overdue_count_query(now), now)
+
+    assert _key(1) == _key(29)
+    assert _key(31) != _key(1)
+
+
+def test_only_the_clock_parameter_is_rounded():
+    db = SimpleNamespace(bind=SimpleNamespace(dialect=asyncpg.dialect()))
+    now = STEP_START + timedelta(seconds=5)
+    stmt = select(func.count()).select_from(
+        select(ServiceRequest).where(ServiceRequest.created_at >= STEP_START + timedelta(seconds=1)).subquery()
+    )
+    other = select(func.count()).select_from(
+        select(ServiceRequest).where(ServiceRequest.created_at >= STEP_START + timedelta(seconds=2)).subquery()
+    )
+    assert counts._fingerprint(db, stmt, now) != counts._fingerprint(db, other, now)
+
+
+async def _numbers_table(db, rows: int) -> None:
+    await db.execute(text(
+        f"CREATE TEMP TABLE count_test_numbers AS SELECT n FROM generate_series(1, {rows}) AS n"
+    ))
+    await db.execute(text("ANALYZE count_test_numbers"))
+
+
+@pytest.mark.postgres
+@pytest.mark.anyio
+async def test_estimate_uses_the_planner_on_large_results(pg_async_session, monkeypatch):
+    monkeypatch.setattr(counts.settings, "request_count_estimate_threshold", 10000)
+    await _numbers_table(pg_async_session, 50000)
+
+    total, is_estimate = await counts.count_requests(pg_async_session, select(numbers.c.n), "estimate")
+
+    assert is_estimate is True
+    assert 40000 <= total <= 60000
+
+
+@pytest.mark.postgres
+@pytest.mark.anyio
+async def test_estimate_counts_exactly_below_the_threshold(pg_async_session, monkeypatch):
+    monkeypatch.setattr(counts.settings, "request_count_estimate_threshold", 10000)
+    await _numbers_table(pg_async_session, 50000)
+    q = select(numbers.c.n).where(numbers.c.n <= 250).order_by(numbers.c.n)
+
+    total, is_estimate = await counts.count_requests(pg_async_session, q, "estimate")
+
+    assert (total, is_estimate) == (250, False)
+
+
+# ─── Through the request list ────────────────────────────────────────────────
+
+def _list(client, headers, **params):
+    response = client.get("/admin/requests", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_count_false_skips_the_total(client, make_user, make_request):
+    _, headers = make_user("mayor")
+    for _ in range(3):
+        make_request()
+
+    body = _list(client, headers, count="false", page_size=2)
+
+    assert (body["total"], body["total_is_estimate"], body["has_next"]) == (None, False, True)
+
+
+def test_unknown_count_strategy_is_rejected(client, make_user):
+    _, headers = make_user("mayor")
+    assert client.get("/admin/requests", params={"count": "approx"}, headers=headers).status_code == 422
+
+
+def test_exact_totals_are_cached_per_filter_until_a_write(client, make_user, make_request):
+    _, headers = make_user("mayor")
+    req = make_request()
+    assert _list(client, headers, priority="urgent")["total"] == 0
+    hits = counts._count_cache.hits
+    assert _list(client, headers, priority="urgent")["total"] == 0
+    assert counts._count_cache.hits == hits + 1
+
+    # A committed request write moves the version on
+    changed = client.post(f"/admin/requests/{req.id}/priority", json={"priority": "urgent"}, headers=headers)
+    assert changed.status_code == 200
+    assert _list(client, headers, priority="urgent")["total"] == 1
+    assert counts._count_cache.hits == hits + 1
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    """Pin the request list's clock; set `.current` to move it."""
+    class _Clock(datetime):
+        current = STEP_START
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current
+
+    monkeypatch.setattr(counts.settings, "request_count_cache_ttl_seconds", 30.0)
+    monkeypatch.setattr(admin, "datetime", _Clock)
+    return _Clock
+
+
+def test_overdue_rows_use_the_real_clock_and_share_the_total(client, make_user, make_request, frozen_clock):
+    _, headers = make_user("mayor")
+    make_request(sla_deadline=STEP_START - timedelta(hours=1))
+    just_due = make_request(sla_deadline=STEP_START + timedelta(seconds=10))
+    make_request(sla_deadline=STEP_START + timedelta(days=1))
+
+    frozen_clock.current = STEP_START + timedelta(seconds=5)
+    assert _list(client, headers, overdue="true")["total"] == 1
+    hits = counts._count_cache.hits
+
+    # Same clock step: the cached total is reused, but the rows are current
+    frozen_clock.current = STEP_START + timedelta(seconds=20)
+    body = _list(client, headers, overdue="true")
+    assert counts._count_cache.hits == hits + 1
+    assert str(just_due.id) in {item["id"] for item in body["items"]}
+
+    frozen_clock.current = STEP_START + timedelta(seconds=35)
+    assert _list(client, headers, overdue="true")["total"] == 2
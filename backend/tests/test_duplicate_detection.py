@@ -0,0 +1,170 @@
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.geoindex import DuplicateIndex, duplicate_index, publish_geo
+from app.models import AuditLog, Notification, ServiceRequest
+from app.routers.admin import _handle_request_created
+
+LAT, LNG = 33.5138, 36.2765
+# About 50 m and 500 m north of (LAT, LNG)
+NEAR_LAT = LAT + 50 / 111_320
+FAR_LAT = LAT + 500 / 111_320
+
+
+@pytest.fixture
+def located(make_request):
+    def _make(**values):
+        values.setdefault("location_lat", LAT)
+        values.setdefault("location_lng", LNG)
+        return make_request(**values)
+    return _make
+
+
+def test_finds_the_nearby_open_request_of_the_same_category(db, area, located):
+    original = located()
+    municipality_id = area.municipalities[0].id
+
+    index = DuplicateIndex()
+    assert index.find_duplicate(db, municipality_id, "water", NEAR_LAT, LNG) == original.id
+    assert index.find_duplicate(db, municipality_id, "water", FAR_LAT, LNG) is None
+    assert index.find_duplicate(db, municipality_id, "lighting", NEAR_LAT, LNG) is None
+
+
+def test_never_matches_across_municipalities(db, area, located):
+    located(district=area.districts[1])
+
+    index = DuplicateIndex()
+    assert index.find_duplicate(db, area.municipalities[0].id, "water", LAT, LNG) is None
+    assert index.find_duplicate(db, area.municipalities[1].id, "water", LAT, LNG) is not None
+
+
+def test_ignores_closed_merged_and_expired_requests(db, area, located, monkeypatch):
+    monkeypatch.setattr("app.geoindex.settings.duplicate_window_hours", 72)
+    original = located()
+    located(status="resolved")
+    located(duplicate_of_id=original.id)
+    located(created_at=datetime.now(timezone.utc) - timedelta(hours=73))
+
+    index = DuplicateIndex()
+    assert index.find_duplicate(db, area.municipalities[0].id, "water", LAT, LNG) == original.id
+    assert index.stats()["requests"] == 1
+
+
+def test_events_keep_a_loaded_index_current(db, area):
+    municipality_id = area.municipalities[0].id
+    index = DuplicateIndex()
+    assert index.find_duplicate(db, municipality_id, "water", LAT, LNG) is None
+
+    request_id = uuid.uuid4()
+    index.apply(json.dumps({"add": [{
+        "id": str(request_id),
+        "municipality_id": str(municipality_id),
+        "category": "water",
+        "lat": LAT,
+        "lng": LNG,
+        "created_at": time.time(),
+    }]}))
+    assert index.find_duplicate(db, municipality_id, "water", NEAR_LAT, LNG) == request_id
+
+    index.apply(json.dumps({"remove": [str(request_id)]}))
+    assert index.find_duplicate(db, municipality_id, "water", NEAR_LAT, LNG) is None
+
+
+def test_published_requests_reach_the_index_on_commit(db, area, located):
+    municipality_id = area.municipalities[0].id
+    assert duplicate_index.find_duplicate(db, municipality_id, "water", LAT, LNG) is None
+
+    req = located()
+    publish_geo(db, req)
+    assert duplicate_index.find_duplicate(db, municipality_id, "water", LAT, LNG) is None
+    db.commit()
+    assert duplicate_index.find_duplicate(db, municipality_id, "water", LAT, LNG) == req.id
+
+
+def test_likely_duplicates_still_notify_their_scope(db, make_user, located):
+    mayor, _ = make_user("mayor")
+    original = located()
+    duplicate = located(duplicate_of_id=original.id)
+
+    _handle_request_created(db, {"request_id": str(duplicate.id)})
+    db.commit()
+
+    assert db.query(Notification.user_id).filter(
+        Notification.related_entity_id == str(duplicate.id),
+    ).all() == [(mayor.id,)]
+
+
+# ─── Merging ─────────────────────────────────────────────────────────────────
+
+def _merge(client, headers, target, *duplicates):
+    return client.post(
+        f"/admin/requests/{target.id}/merge",
+        json={"duplicate_ids": [str(d.id) for d in duplicates]},
+        headers=headers,
+    )
+
+
+def test_merge_rejects_duplicates_with_audit_and_notifications(client, db, make_user, make_request):
+    mayor, headers = make_user("mayor")
+    target = make_request()
+    duplicate = make_request(status="under_review")
+
+    response = _merge(client, headers, target, duplicate)
+
+    assert response.status_code == 200
+    db.expire_all()
+    merged = db.get(ServiceRequest, duplicate.id)
+    assert (merged.status, merged.duplicate_of_id) == ("rejected", target.id)
+    assert merged.closed_at is not None
+    audit = {(a.action, a.entity_id, a.details) for a in db.query(AuditLog)}
+    assert ("status_change", str(duplicate.id), "under_review -> rejected") in audit
+    assert ("merge_requests", str(target.id), str(duplicate.id)) in audit
+    assert db.query(Notification).filter(
+        Notification.user_id == mayor.id,
+        Notification.kind == "rejected",
+        Notification.related_entity_id == str(duplicate.id),
+    ).count() == 1
+
+
+def test_merge_follows_the_role_status_transitions(client, db, make_user, make_request):
+    _, headers = make_user("mayor")
+    target = make_request()
+    duplicate = make_request(status="new")
+
+    response = _merge(client, headers, target, duplicate)
+
+    assert response.status_code == 403
+    db.expire_all()
+    assert db.get(ServiceRequest, duplicate.id).status == "new"
+
+
+def test_governors_cannot_merge(client, make_user, make_request):
+    _, headers = make_user("governor")
+    target = make_request()
+    duplicate = make_request(status="under_review")
+
+    assert _merge(client, headers, target, duplicate).status_code == 403
+
+
+def test_merge_refuses_requests_from_another_municipality(client, area, make_user, make_request):
+    _, headers = make_user("municipal_admin")
+    target = make_request()
+    foreign = make_request(district=area.districts[1], status="under_review")
+
+    # Outside the caller's scope, so it is not even found
+    assert _merge(client, headers, target, foreign).status_code == 404
+
+
+@pytest.mark.parametrize("target_values", [{"status": "resolved"}, {"status": "deferred"}, {"is_archived": True}])
+def test_merge_refuses_a_closed_or_archived_target(client, db, make_user, make_request, target_values):
+    _, headers = make_user("mayor")
+    target = make_request(**target_values)
+    duplicate = make_request(status="under_review")
+
+    assert _merge(client, headers, target, duplicate).status_code == 422
+    db.expire_all()
+    assert db.get(ServiceRequest, duplicate.id).duplicate_of_id is None
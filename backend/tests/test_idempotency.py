@@ -0,0 +1,105 @@
+import asyncio
+import uuid
+
+import pytest
+from starlette.requests import Request
+
+from app import idempotency
+from app.auth import create_access_token
+from app.models import ServiceRequest
+
+
+def _request(authorization: str = None, client_host: str = "10.0.0.7") -> Request:
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/public/requests",
+        "headers": headers,
+        "client": (client_host, 50000),
+    })
+
+
+def test_anonymous_keys_are_scoped_per_client_ip():
+    assert idempotency._caller(_request()) == "ip:10.0.0.7"
+    assert idempotency._caller(_request(client_host="10.0.0.8")) == "ip:10.0.0.8"
+
+
+def test_authenticated_keys_are_scoped_per_user():
+    user_id = uuid.uuid4()
+    token = create_access_token({"sub": str(user_id)})
+    assert idempotency._caller(_request(f"Bearer {token}")) == f"user:{user_id}"
+    # A token that does not verify falls back to the client IP
+    assert idempotency._caller(_request("Bearer not-a-token")) == "ip:10.0.0.7"
+
+
+@pytest.mark.anyio
+async def test_running_request_keeps_extending_its_claim(monkeypatch):
+    extended = []
+    monkeypatch.setattr(idempotency.settings, "idempotency_lock_seconds", 0.03)
+    monkeypatch.setattr(idempotency, "_extend_lock", extended.append)
+
+    heartbeat = asyncio.create_task(idempotency._hold_claim("k"))
+    await asyncio.sleep(0.1)
+    heartbeat.cancel()
+    count = len(extended)
+    await asyncio.sleep(0.05)
+
+    assert count >= 2
+    assert len(extended) == count
+    assert set(extended) == {"k"}
+
+
+def _create(client, headers, district_id, key, description="انقطاع المياه منذ يومين"):
+    return client.post(
+        "/admin/requests",
+        json={"district_id": str(district_id), "category": "water", "description": description},
+        headers={**headers, "Idempotency-Key": key},
+    )
+
+
+@pytest.mark.postgres
+def test_retry_with_the_same_key_replays_the_stored_response(client, db, area, make_user):
+    _, headers = make_user("mukhtar")
+
+    first = _create(client, headers, area.districts[0].id, "create-1")
+    retry = _create(client, headers, area.districts[0].id, "create-1")
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert db.query(ServiceRequest).count() == 1
+
+
+@pytest.mark.postgres
+def test_same_key_with_a_different_body_is_rejected(client, area, make_user):
+    _, headers = make_user("mukhtar")
+
+    assert _create(client, headers, area.districts[0].id, "create-2").status_code == 201
+    response = _create(client, headers, area.districts[0].id, "create-2", description="إنارة الشارع معطلة")
+
+    assert response.status_code == 422
+
+
+@pytest.mark.postgres
+def test_keys_of_different_users_do_not_collide(client, db, area, make_user):
+    _, first_headers = make_user("mukhtar")
+    _, second_headers = make_user("mukhtar")
+
+    _create(client, first_headers, area.districts[0].id, "shared-key")
+    response = _create(client, second_headers, area.districts[0].id, "shared-key")
+
+    assert response.status_code == 201
+    assert "Idempotent-Replayed" not in response.headers
+    assert db.query(ServiceRequest).count() == 2
+
+
+@pytest.mark.postgres
+def test_failed_request_releases_its_key(client, db, area, make_user):
+    _, headers = make_user("mukhtar")
+
+    assert _create(client, headers, area.districts[1].id, "create-3").status_code == 403
+    response = _create(client, headers, area.districts[0].id, "create-3")
+
+    assert response.status_code == 201
+    assert db.query(ServiceRequest).count() == 1
@@ -0,0 +1,89 @@
+import ipaddress
+
+import pytest
+from starlette.requests import Request
+
+from app import auth, deps, login_throttle
+from app.models import User
+from app.routers import auth as auth_router
+
+PROXY = "172.18.0.5"
+
+
+def _request(peer: str, **headers: str) -> Request:
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/auth/login",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+        "client": (peer, 50000),
+    })
+
+
+@pytest.fixture
+def behind_proxy(monkeypatch):
+    monkeypatch.setattr(deps, "_trusted_proxies", [ipaddress.ip_network("172.16.0.0/12")])
+
+
+def test_forwarded_headers_are_ignored_from_untrusted_peers(behind_proxy):
+    spoofed = _request("198.51.100.7", x_forwarded_for="203.0.113.1", x_real_ip="203.0.113.1")
+    assert deps.client_ip(spoofed) == "198.51.100.7"
+
+
+def test_trusted_proxy_hops_are_skipped_from_the_right(behind_proxy):
+    # The client prepended a fake hop; nginx appended the real peer
+    request = _request(PROXY, x_forwarded_for="203.0.113.1, 198.51.100.7, 172.18.0.9")
+    assert deps.client_ip(request) == "198.51.100.7"
+    assert deps.client_ip(_request(PROXY, x_real_ip="198.51.100.8")) == "198.51.100.8"
+    assert deps.client_ip(_request(PROXY)) == PROXY
+
+
+@pytest.fixture
+def member(db, area):
+    """An active user with a known password; returns the login form."""
+    user = User(username="clerk", full_name="clerk", role="mayor", password_hash=auth.hash_password("s3cret"),
+                governorate_id=area.governorate.id, municipality_id=area.municipalities[0].id)
+    db.add(user)
+    db.commit()
+    return {"username": "clerk", "password": "s3cret"}
+
+
+@pytest.fixture
+def quick_login(monkeypatch):
+    monkeypatch.setattr(auth_router, "verify_password", auth.verify_password)
+    monkeypatch.setattr(login_throttle.settings, "login_throttle_ip_soft_delay_seconds", 0.01)
+
+
+def _lock_the_shared_ip(ip: str) -> None:
+    # A password spray: one failure per username, enough to lock the IP
+    for n in range(login_throttle.settings.login_throttle_ip_threshold):
+        login_throttle.record_failure(f"sprayed-{n}", ip)
+
+
+@pytest.mark.postgres
+def test_users_behind_a_locked_proxy_ip_can_still_log_in(client, member, quick_login):
+    _lock_the_shared_ip("testclient")
+    assert login_throttle.lockouts(member["username"], "testclient")[1] is not None
+
+    assert client.post("/auth/login", json=member).status_code == 200
+
+
+@pytest.mark.postgres
+def test_hard_ip_block_refuses_every_user_of_the_ip(client, member, quick_login, monkeypatch):
+    monkeypatch.setattr(login_throttle.settings, "login_throttle_ip_hard_block", True)
+    _lock_the_shared_ip("testclient")
+
+    response = client.post("/auth/login", json=member)
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.postgres
+def test_a_locked_username_does_not_lock_others_on_the_same_ip(client, member, quick_login):
+    attacked = {"username": "mayor-of-elsewhere", "password": "guess"}
+    for _ in range(login_throttle.settings.login_throttle_user_threshold):
+        assert client.post("/auth/login", json=attacked).status_code == 401
+
+    assert client.post("/auth/login", json=attacked).status_code == 429
+    assert client.post("/auth/login", json=member).status_code == 200
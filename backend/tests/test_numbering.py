@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import numbering
+from app.database import SessionLocal
+from app.models import ComplaintNumberSeries
+from app.numbering import (
+    TRACKING_CHARS,
+    TRACKING_CODE_LENGTH,
+    allocate_complaint_number,
+    allocate_complaint_numbers,
+    insert_service_request,
+    insert_service_requests,
+    next_tracking_code,
+)
+
+# Below the default pool size plus overflow, so workers do not wait on the pool
+CONCURRENT_WORKERS = 8
+
+
+def test_tracking_codes_use_the_unambiguous_alphabet():
+    codes = [next_tracking_code() for _ in range(numbering.TRACKING_CODE_BLOCK + 10)]
+    assert all(len(code) == TRACKING_CODE_LENGTH for code in codes)
+    assert set("".join(codes)) <= set(TRACKING_CHARS)
+    assert len(set(codes)) == len(codes)
+
+
+@pytest.mark.postgres
+def test_global_series_hands_out_increasing_numbers(db, area):
+    municipality_id = area.municipalities[0].id
+    first = allocate_complaint_number(db, municipality_id)
+    batch = allocate_complaint_numbers(db, area.municipalities[1].id, 3)
+
+    values = [int(n) for n in [first, *batch]]
+    assert values == sorted(values)
+    assert len(set(values)) == 4
+    assert all(len(n) == 6 for n in [first, *batch])
+
+
+@pytest.mark.postgres
+def test_rolled_back_numbers_are_not_reused(db, area):
+    municipality_id = area.municipalities[0].id
+    lost = allocate_complaint_number(db, municipality_id)
+    db.rollback()
+    assert int(allocate_complaint_number(db, municipality_id)) > int(lost)
+
+
+@pytest.mark.postgres
+def test_per_municipality_series_are_independent(db, area, monkeypatch):
+    monkeypatch.setattr(numbering.settings, "complaint_number_per_municipality", True)
+    first, second = area.municipalities
+
+    a = allocate_complaint_numbers(db, first.id, 2)
+    b = allocate_complaint_number(db, second.id)
+    c = allocate_complaint_number(db, first.id)
+
+    prefix_a, prefix_b = first.id.hex[:6].upper(), second.id.hex[:6].upper()
+    assert a == [f"{prefix_a}-000001", f"{prefix_a}-000002"]
+    assert b == f"{prefix_b}-000001"
+    assert c == f"{prefix_a}-000003"
+
+
+@pytest.mark.postgres
+def test_series_keeps_the_prefix_stored_on_its_row(db, area, monkeypatch):
+    monkeypatch.setattr(numbering.settings, "complaint_number_per_municipality", True)
+    municipality = area.municipalities[0]
+    db.add(ComplaintNumberSeries(municipality_id=municipality.id, prefix="07", last_value=41))
+    db.flush()
+
+    assert allocate_complaint_number(db, municipality.id) == "07-000042"
+
+
+def _allocate_concurrently(count_per_worker: int, municipality_id) -> list[str]:
+    def _worker() -> list[str]:
+        numbers = []
+        for _ in range(count_per_worker):
+            db = SessionLocal()
+            try:
+                numbers.append(allocate_complaint_number(db, municipality_id))
+                db.commit()
+            finally:
+                db.close()
+        return numbers
+
+    with ThreadPoolExecutor(max_workers=CONCURRENT_WORKERS) as pool:
+        futures = [pool.submit(_worker) for _ in range(CONCURRENT_WORKERS)]
+        return [n for f in futures for n in f.result()]
+
+
+@pytest.mark.postgres
+@pytest.mark.parametrize("per_municipality", [False, True])
+def test_concurrent_allocations_never_repeat_a_number(db, area, monkeypatch, per_municipality):
+    monkeypatch.setattr(numbering.settings, "complaint_number_per_municipality", per_municipality)
+
+    numbers = _allocate_concurrently(25, area.municipalities[0].id)
+
+    assert len(numbers) == CONCURRENT_WORKERS * 25
+    assert len(set(numbers)) == len(numbers)
+    if per_municipality:
+        prefix = area.municipalities[0].id.hex[:6].upper()
+        assert sorted(numbers) == [f"{prefix}-{n:06d}" for n in range(1, len(numbers) + 1)]
+
+
+def _values(area, **extra):
+    district = area.districts[0]
+    return dict(
+        municipality_id=district.municipality_id,
+        district_id=district.id,
+        category="water",
+        priority="normal",
+        status="new",
+        description="انقطاع المياه منذ يومين",
+        **extra,
+    )
+
+
+@pytest.mark.postgres
+def test_tracking_code_collision_retries_with_the_next_code(db, area, make_request, monkeypatch):
+    taken = make_request().tracking_code
+    codes = iter([taken, "FRESHCDE"])
+    monkeypatch.setattr(numbering, "next_tracking_code", lambda: next(codes))
+
+    req = insert_service_request(db, _values(area))
+
+    assert req.tracking_code == "FRESHCDE"
+    assert req.governorate_id == area.governorate.id
+
+
+@pytest.mark.postgres
+def test_batch_insert_keeps_row_order(db, area):
+    rows = [_values(area, complaint_number=f"B{n}") for n in range(5)]
+
+    created = insert_service_requests(db, rows)
+
+    assert [r.complaint_number for r in created] == [f"B{n}" for n in range(5)]
+    assert len({r.tracking_code for r in created}) == 5
+    assert {r.governorate_id for r in created} == {area.governorate.id}
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import outbox
+from app.models import OutboxEvent
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Register throwaway handlers; `calls` records every invocation by kind."""
+    calls = []
+    registry = dict(outbox._handlers)
+
+    def _ok(db, payload):
+        calls.append("ok")
+
+    def _boom(db, payload):
+        calls.append("boom")
+        raise RuntimeError("downstream unavailable")
+
+    registry.update({"test_ok": _ok, "test_boom": _boom})
+    monkeypatch.setattr(outbox, "_handlers", registry)
+    return calls
+
+
+def test_retry_delay_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(outbox.settings, "outbox_retry_base_seconds", 5.0)
+    monkeypatch.setattr(outbox.settings, "outbox_retry_max_seconds", 60.0)
+    delays = [outbox.retry_delay(n).total_seconds() for n in range(1, 7)]
+    assert delays == [5.0, 10.0, 20.0, 40.0, 60.0, 60.0]
+
+
+def test_event_is_only_written_with_the_transaction(db):
+    outbox.enqueue(db, "test_ok", {})
+    db.rollback()
+    assert db.query(OutboxEvent).count() == 0
+
+    outbox.enqueue(db, "test_ok", {"n": 1})
+    db.commit()
+    assert db.query(OutboxEvent.payload).scalar() == {"n": 1}
+
+
+def test_drain_processes_due_events_once(db, handlers):
+    outbox.enqueue(db, "test_ok", {})
+    outbox.enqueue(db, "test_ok", {})
+    db.commit()
+
+    worker = outbox.OutboxWorker()
+    assert worker.drain() == 2
+    assert worker.drain() == 0
+    assert handlers == ["ok", "ok"]
+    assert db.query(OutboxEvent).filter(OutboxEvent.processed_at.is_(None)).count() == 0
+
+
+def test_failed_event_waits_for_its_backoff(db, handlers, monkeypatch):
+    monkeypatch.setattr(outbox.settings, "outbox_retry_base_seconds", 30.0)
+    outbox.enqueue(db, "test_boom", {})
+    outbox.enqueue(db, "test_ok", {})
+    db.commit()
+
+    worker = outbox.OutboxWorker()
+    assert worker.drain() == 1
+    # The failure is not picked up again until next_attempt_at has passed
+    assert worker.drain() == 0
+    assert sorted(handlers) == ["boom", "ok"]
+
+    evt = db.query(OutboxEvent).filter(OutboxEvent.kind == "test_boom").one()
+    assert evt.attempts == 1
+    assert evt.processed_at is None
+    assert evt.last_error == "downstream unavailable"
+    wait = evt.next_attempt_at - datetime.now(timezone.utc)
+    assert timedelta(seconds=25) < wait <= timedelta(seconds=30)
+
+
+def test_event_gives_up_after_max_attempts(db, handlers, monkeypatch):
+    monkeypatch.setattr(outbox.settings, "outbox_max_attempts", 2)
+    outbox.enqueue(db, "test_boom", {})
+    db.commit()
+
+    worker = outbox.OutboxWorker()
+    worker.drain()
+    evt = db.query(OutboxEvent).one()
+    evt.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+    worker.drain()
+
+    db.refresh(evt)
+    assert handlers == ["boom", "boom"]
+    assert evt.attempts == 2
+    assert evt.processed_at is not None
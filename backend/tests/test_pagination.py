@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+BASE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def listing(make_user, make_request, area):
+    """23 requests across both municipalities, with tied timestamps and missing deadlines."""
+    _, headers = make_user("governor")
+    for i in range(23):
+        make_request(
+            district=area.districts[i % 2],
+            created_at=BASE + timedelta(hours=i // 3),
+            sla_deadline=None if i % 4 == 0 else BASE + timedelta(hours=i % 5),
+        )
+    return headers
+
+
+def _walk(client, headers, sort_by, sort_dir, page_size=4):
+    ids, totals, cursor = [], [], None
+    while True:
+        params = {"sort_by": sort_by, "sort_dir": sort_dir, "pagination": "cursor", "page_size": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/admin/requests", params=params, headers=headers).json()
+        ids += [item["id"] for item in body["items"]]
+        totals.append(body["total"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            assert body["has_next"] is False
+            return ids, totals
+
+
+@pytest.mark.parametrize("sort_by", ["created_at", "updated_at", "sla_deadline"])
+@pytest.mark.parametrize("sort_dir", ["asc", "desc"])
+def test_cursor_pages_cover_the_list_once_in_order(client, listing, sort_by, sort_dir):
+    full = client.get(
+        "/admin/requests",
+        params={"sort_by": sort_by, "sort_dir": sort_dir, "page_size": 100},
+        headers=listing,
+    ).json()
+    expected = [item["id"] for item in full["items"]]
+
+    ids, totals = _walk(client, listing, sort_by, sort_dir)
+
+    assert ids == expected
+    assert len(ids) == 23
+    # The total comes with the first page only
+    assert totals[0] == 23
+    assert set(totals[1:]) == {None}
+
+
+def test_page_mode_reports_page_and_has_next(client, listing):
+    body = client.get("/admin/requests", params={"page": 5, "page_size": 5}, headers=listing).json()
+    assert (body["page"], body["total"], body["has_next"], len(body["items"])) == (5, 23, False, 3)
+    assert body["next_cursor"] is None
+
+
+def test_unknown_sort_column_is_rejected(client, listing):
+    assert client.get("/admin/requests", params={"sort_by": "priority"}, headers=listing).status_code == 422
+
+
+def test_cursor_is_bound_to_its_sort(client, listing):
+    first = client.get("/admin/requests", params={"pagination": "cursor", "page_size": 4}, headers=listing).json()
+
+    reused = client.get(
+        "/admin/requests",
+        params={"pagination": "cursor", "sort_dir": "asc", "cursor": first["next_cursor"]},
+        headers=listing,
+    )
+    garbage = client.get("/admin/requests", params={"pagination": "cursor", "cursor": "zzz"}, headers=listing)
+
+    assert reused.status_code == garbage.status_code == 422
+
+
+def test_cursor_round_trip_keeps_null_sort_values():
+    row = SimpleNamespace(id=uuid.uuid4(), sla_deadline=None, created_at=BASE)
+
+    assert decode_cursor(encode_cursor("sla_deadline", "asc", row), "sla_deadline", "asc").value is None
+    cursor = decode_cursor(encode_cursor("created_at", "desc", row), "created_at", "desc")
+    assert (cursor.value, cursor.id) == (BASE, row.id)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor("created_at", "desc", row), "updated_at", "desc")
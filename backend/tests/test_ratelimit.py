@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import event
+
+from app import ratelimit
+from app.database import ratelimit_engine
+from app.ratelimit import RateLimit, consume
+
+
+def test_memory_buckets_refuse_once_empty(monkeypatch):
+    monkeypatch.setattr(ratelimit.settings, "rate_limit_backend", "memory")
+    monkeypatch.setattr(ratelimit, "_memory_buckets", {})
+    limit = RateLimit(capacity=3, period_seconds=3600)
+
+    assert [consume("test:memory", limit) for _ in range(4)] == [True, True, True, False]
+    assert consume("test:other", limit) is True
+
+
+@pytest.mark.postgres
+def test_postgres_buckets_refuse_once_empty(db_engine):
+    limit = RateLimit(capacity=2, period_seconds=3600)
+
+    assert [consume("test:pg", limit) for _ in range(3)] == [True, True, False]
+
+
+@pytest.mark.postgres
+def test_a_check_is_one_statement_outside_a_transaction(db_engine):
+    limit = RateLimit(capacity=100, period_seconds=3600)
+    consume("test:warm", limit)  # first connect runs the dialect's setup queries
+    statements = []
+    autocommit = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        autocommit.append(conn.connection.dbapi_connection.autocommit)
+
+    event.listen(ratelimit_engine, "before_cursor_execute", _record)
+    try:
+        for _ in range(5):
+            consume("test:trips", limit)
+    finally:
+        event.remove(ratelimit_engine, "before_cursor_execute", _record)
+
+    assert len(statements) == 5
+    assert all(s.lstrip().upper().startswith("INSERT") for s in statements)
+    # psycopg2 sends no BEGIN/COMMIT in autocommit mode, and the pool does not ping
+    assert all(autocommit)
+    assert ratelimit_engine.pool._pre_ping is False
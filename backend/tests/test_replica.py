@@ -0,0 +1,63 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import replica
+from app.database import get_db
+from app.models import Governorate
+from app.replica import READ_AFTER_HEADER, READ_AFTER_WRITE_HEADER, ReadAfterWriteMiddleware, parse_lsn
+
+AUTH = {"Authorization": "Bearer token"}
+OPT_IN = {**AUTH, READ_AFTER_WRITE_HEADER: "1"}
+
+
+@pytest.fixture
+def wal_reads(db_engine, monkeypatch):
+    """An app behind the middleware; returns (client, number of WAL position reads)."""
+    calls = []
+
+    def _position() -> str:
+        calls.append(1)
+        return "16/B374D848"
+
+    monkeypatch.setattr(replica, "_primary_wal_position", _position)
+    app = FastAPI()
+
+    @app.post("/write")
+    def write(db: Session = Depends(get_db)):
+        db.add(Governorate(name="حلب"))
+        db.commit()
+
+    @app.post("/noop")
+    def noop(db: Session = Depends(get_db)):
+        db.commit()
+
+    app.add_middleware(ReadAfterWriteMiddleware)
+    return TestClient(app), calls
+
+
+def test_opted_in_write_returns_the_wal_position(wal_reads):
+    client, calls = wal_reads
+    response = client.post("/write", headers=OPT_IN)
+    assert response.headers[READ_AFTER_HEADER] == "16/B374D848"
+    assert len(calls) == 1
+
+
+def test_writes_without_opt_in_skip_the_wal_query(wal_reads):
+    client, calls = wal_reads
+    assert READ_AFTER_HEADER not in client.post("/write", headers=AUTH).headers
+    assert READ_AFTER_HEADER not in client.post("/write", headers={READ_AFTER_WRITE_HEADER: "1"}).headers
+    assert calls == []
+
+
+def test_requests_that_commit_nothing_skip_the_wal_query(wal_reads):
+    client, calls = wal_reads
+    assert READ_AFTER_HEADER not in client.post("/noop", headers=OPT_IN).headers
+    assert calls == []
+
+
+def test_parse_lsn():
+    assert parse_lsn("16/B374D848") == (0x16 << 32) | 0xB374D848
+    assert parse_lsn("garbage") is None
+    assert parse_lsn(None) is None
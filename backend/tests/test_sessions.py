@@ -0,0 +1,115 @@
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import pytest
+
+from app import sessions
+from app.models import AuthSession
+
+
+@pytest.fixture
+def login(db, make_user):
+    """A fresh session for a mayor; returns its first token pair."""
+    def _login():
+        user, _ = make_user("mayor")
+        tokens = sessions.create_session(db, user)
+        db.commit()
+        return tokens
+    return _login
+
+
+def _session(db, tokens) -> AuthSession:
+    db.expire_all()
+    return db.get(AuthSession, UUID(tokens.refresh_token.partition(".")[0]))
+
+
+def _refresh(client, refresh_token):
+    return client.post("/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def test_refresh_rotates_the_secret(client, db, login):
+    tokens = login()
+
+    response = _refresh(client, tokens.refresh_token)
+
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens.refresh_token
+    assert rotated["refresh_token"].partition(".")[0] == tokens.refresh_token.partition(".")[0]
+    assert _refresh(client, rotated["refresh_token"]).status_code == 200
+
+
+def test_two_tabs_refreshing_together_keep_the_session(client, db, login):
+    tokens = login()
+
+    first_tab = _refresh(client, tokens.refresh_token)
+    second_tab = _refresh(client, tokens.refresh_token)
+
+    assert first_tab.status_code == second_tab.status_code == 200
+    assert _session(db, tokens).revoked_at is None
+    # Either tab's new secret carries the session on
+    assert _refresh(client, second_tab.json()["refresh_token"]).status_code == 200
+
+
+def test_replaced_secret_after_the_grace_window_revokes_the_session(client, db, login):
+    tokens = login()
+    rotated = _refresh(client, tokens.refresh_token).json()
+    session = _session(db, tokens)
+    session.rotated_at = datetime.now(timezone.utc) - timedelta(seconds=sessions.settings.refresh_token_reuse_grace_seconds + 1)
+    db.commit()
+
+    assert _refresh(client, tokens.refresh_token).status_code == 401
+    assert _session(db, tokens).revoked_at is not None
+    # The legitimate holder is logged out too: the session was copied
+    assert _refresh(client, rotated["refresh_token"]).status_code == 401
+
+
+def test_secret_older_than_the_last_rotation_revokes_the_session(client, db, login):
+    tokens = login()
+    second = _refresh(client, tokens.refresh_token).json()
+    _refresh(client, second["refresh_token"])
+
+    assert _refresh(client, tokens.refresh_token).status_code == 401
+    assert _session(db, tokens).revoked_at is not None
+
+
+def test_access_tokens_of_a_revoked_session_are_refused(client, db, login):
+    tokens = login()
+    headers = {"Authorization": f"Bearer {tokens.access_token}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    assert client.post("/auth/logout", headers=headers).status_code == 204
+
+    assert client.get("/auth/me", headers=headers).status_code == 401
+    assert _refresh(client, tokens.refresh_token).status_code == 401
+
+
+def test_revocation_checks_never_wait_on_the_database(db, login, monkeypatch):
+    revoked = sessions.RevokedSessions()
+    revoked._sync()
+
+    def _unreachable():
+        raise AssertionError("checked the database on the request path")
+
+    monkeypatch.setattr(revoked, "_load", _unreachable)
+    monkeypatch.setattr(revoked, "_synced_at", revoked._synced_at - 3600)
+    assert revoked.is_revoked("b5f4b2a6-0000-4000-8000-000000000000") is False
+
+
+def test_background_resync_picks_up_revocations_missed_by_events(db, login, monkeypatch):
+    monkeypatch.setattr(sessions.settings, "session_revocation_resync_seconds", 0.05)
+    revoked = sessions.RevokedSessions()
+    revoked.start()
+    try:
+        tokens = login()
+        session = _session(db, tokens)
+        session.revoked_at = datetime.now(timezone.utc)
+        db.commit()
+
+        deadline = time.monotonic() + 2
+        while not revoked.is_revoked(str(session.id)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert revoked.is_revoked(str(session.id))
+    finally:
+        revoked.stop()
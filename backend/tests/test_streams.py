@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import streams
+from app.models import RequestUpdate
+from app.streams import TrackingStreamHub, resolve_stream_start
+
+BASE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def tracked(db, make_request):
+    """A request with one public update; `post(minutes)` adds another that many minutes after BASE."""
+    req = make_request()
+
+    def _post(minutes: float) -> RequestUpdate:
+        update = RequestUpdate(request_id=req.id, message="تحديث", is_internal=False,
+                               created_at=BASE + timedelta(minutes=minutes))
+        db.add(update)
+        db.commit()
+        return update
+
+    _post(0)
+    return req, _post
+
+
+async def _settle(hub: TrackingStreamHub) -> None:
+    while hub._tasks:
+        await asyncio.gather(*list(hub._tasks))
+
+
+def _drain(stream) -> list:
+    items = []
+    while not stream.queue.empty():
+        items.append(stream.queue.get_nowait().id)
+    return items
+
+
+def _open(hub, req, start):
+    request_id, cursor, _, seen = start
+    return hub.open(req.tracking_code, request_id, cursor, seen)
+
+
+@pytest.mark.anyio
+async def test_joining_stream_gets_updates_fetched_before_it_registered(tracked):
+    req, post = tracked
+    hub = TrackingStreamHub()
+    hub.attach(asyncio.get_running_loop())
+    first = _open(hub, req, resolve_stream_start(req.tracking_code, None))
+    await _settle(hub)
+
+    # The second client snapshots, then the topic fetches a new entry before
+    # the second stream is registered
+    start = resolve_stream_start(req.tracking_code, None)
+    missed = post(0.5)
+    hub._on_change(req.tracking_code)
+    await _settle(hub)
+    second = _open(hub, req, start)
+    await _settle(hub)
+
+    assert _drain(first) == [missed.id]
+    assert _drain(second) == [missed.id]
+
+
+@pytest.mark.anyio
+async def test_stream_seen_is_pruned_to_the_overlap_window(tracked, monkeypatch):
+    monkeypatch.setattr(streams.settings, "tracking_stream_overlap_seconds", 60.0)
+    req, post = tracked
+    hub = TrackingStreamHub()
+    hub.attach(asyncio.get_running_loop())
+    stream = _open(hub, req, resolve_stream_start(req.tracking_code, None))
+
+    posted = []
+    for minute in range(1, 11):
+        posted.append(post(minute * 5).id)
+        hub._on_change(req.tracking_code)
+        await _settle(hub)
+
+    assert _drain(stream) == posted
+    assert list(stream.seen) == [posted[-1]]
+    assert stream.floor == BASE + timedelta(minutes=50) - timedelta(seconds=60)
@@ -685,7 +685,7 @@ function RequestsView({ user }: { user: User }) {
     api.getRequests(filters)
       .then((result) => {
         setRequests(result.items.map(toServiceRequest))
-        setTotal(result.total)
+        setTotal(result.total ?? 0)
       })
       .catch(() => {})
   }, [page, pageSize, statusFilter, categoryFilter, priorityFilter, responsibleTeamFilter,
@@ -1006,9 +1006,8 @@ function RequestsView({ user }: { user: User }) {
                     <SelectContent>
                       <SelectItem value="created_at">تاريخ الإنشاء</SelectItem>
                       <SelectItem value="updated_at">آخر تحديث</SelectItem>
-                      <SelectItem value="priority">الأولوية</SelectItem>
-                      <SelectItem value="status">الحالة</SelectItem>
                       <SelectItem value="sla_deadline">الموعد النهائي</SelectItem>
+                      <SelectItem value="relevance">الأكثر صلة بالبحث</SelectItem>
                     </SelectContent>
                   </Select>
                   <Select value={sortDir} onValueChange={(v) => { setSortDir(v); setPage(1) }}>
@@ -20,14 +20,13 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     if (token) {
       api.me()
         .then((u) => setCurrentUser(toUser(u)))
-        .catch(() => api.setToken(null))
+        .catch(() => api.setTokens(null))
     }
   }, [])
 
   const login = async (username: string, password: string): Promise<boolean> => {
     try {
-      const { access_token } = await api.login(username, password)
-      api.setToken(access_token)
+      api.setTokens(await api.login(username, password))
       const me = await api.me()
       setCurrentUser(toUser(me))
       return true
@@ -37,7 +36,7 @@ export function AuthProvider({ children }: { children: ReactNode }) {
   }
 
   const logout = () => {
-    api.setToken(null)
+    api.logout().catch(() => {})
     setCurrentUser(null)
   }
 
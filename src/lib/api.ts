@@ -5,8 +5,7 @@
  *   import { api } from '@/lib/api'
  *
  *   // Auth
- *   const { access_token } = await api.login('admin@mun.sa', 'admin123')
- *   api.setToken(access_token)
+ *   api.setTokens(await api.login('admin@mun.sa', 'admin123'))
  *
  *   // Public
  *   const req = await api.submitRequest({ district_id, category, description })
@@ -26,6 +25,8 @@ const BASE_URL = (import.meta as any).env?.VITE_API_URL ?? '/api'
 export interface TokenResponse {
   access_token: string
   token_type: string
+  refresh_token?: string
+  expires_in?: number
 }
 
 export interface UserOut {
@@ -142,9 +143,16 @@ export interface AttachmentOut {
 
 export interface PaginatedRequests {
   items: ServiceRequestOut[]
-  total: number
-  page: number
+  /** null with count=false and on cursor pages after the first */
+  total: number | null
+  /** true when total is the planner's estimate (count=estimate on a large scope) */
+  total_is_estimate: boolean
+  /** page mode only */
+  page: number | null
   page_size: number
+  has_next: boolean
+  /** cursor mode: pass back as `cursor` for the next page; null on the last page */
+  next_cursor: string | null
 }
 
 // ─── Monthly Reports ──────────────────────────────────────────────────────────
@@ -384,6 +392,9 @@ export interface RequestsFilter {
   sort_by?: string
   sort_dir?: string
   assigned_to_me?: boolean
+  pagination?: 'page' | 'cursor'
+  cursor?: string
+  count?: 'exact' | 'estimate' | 'false'
   page?: number
   page_size?: number
 }
@@ -520,6 +531,10 @@ export function toUser(u: UserOut): User {
 
 class ApiClient {
   private token: string | null = null
+  private refreshToken: string | null = null
+  private refreshing: Promise<boolean> | null = null
+  // Primary WAL position after this client's last write (read-your-writes on replica reads)
+  private readAfter: string | null = null
 
   setToken(token: string | null) {
     this.token = token
@@ -530,8 +545,87 @@ class ApiClient {
     }
   }
 
+  setRefreshToken(token: string | null) {
+    this.refreshToken = token
+    if (token) {
+      localStorage.setItem('api_refresh_token', token)
+    } else {
+      localStorage.removeItem('api_refresh_token')
+    }
+  }
+
+  setTokens(tokens: TokenResponse | null) {
+    this.setToken(tokens?.access_token ?? null)
+    this.setRefreshToken(tokens?.refresh_token ?? null)
+  }
+
   loadToken() {
     this.token = localStorage.getItem('api_token')
+    this.refreshToken = localStorage.getItem('api_refresh_token')
+  }
+
+  /** Follow token changes made by other tabs (refresh, login, logout). */
+  syncAcrossTabs() {
+    window.addEventListener('storage', (e) => {
+      if (e.key === 'api_token' || e.key === 'api_refresh_token' || e.key === null) this.loadToken()
+    })
+  }
+
+  /**
+   * Trade the refresh token for a new pair; concurrent callers share one attempt.
+   * The tokens are re-read from localStorage first: another tab may already have
+   * rotated them, in which case its pair is used instead of refreshing again.
+   */
+  private refreshAccessToken(failedToken: string | null): Promise<boolean> {
+    if (!this.refreshing) {
+      this.loadToken()
+      if (this.token && this.token !== failedToken) return Promise.resolve(true)
+      const sent = this.refreshToken
+      if (!sent) return Promise.resolve(false)
+      this.refreshing = fetch(`${BASE_URL}/auth/refresh`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: sent }),
+      })
+        .then(async (res) => {
+          if (!res.ok) {
+            // Another tab rotated the pair while this request was in flight
+            if (localStorage.getItem('api_refresh_token') !== sent) {
+              this.loadToken()
+              return !!this.token
+            }
+            this.setTokens(null)
+            return false
+          }
+          this.setTokens(await res.json())
+          return true
+        })
+        .catch(() => false)
+        .finally(() => {
+          this.refreshing = null
+        })
+    }
+    return this.refreshing
+  }
+
+  /** fetch with the bearer token, refreshing it once when it has expired. */
+  private async send(path: string, options: RequestInit, headers: Record<string, string>): Promise<Response> {
+    const attempt = () => {
+      const h = { ...headers }
+      if (this.token) h['Authorization'] = `Bearer ${this.token}`
+      if (this.readAfter) h['X-Read-After'] = this.readAfter
+      // Ask for the WAL position after writes so later replica reads include them
+      if (options.method && options.method !== 'GET') h['X-Read-After-Write'] = '1'
+      return fetch(`${BASE_URL}${path}`, { ...options, headers: h })
+    }
+    const usedToken = this.token
+    let res = await attempt()
+    if (res.status === 401 && path !== '/auth/login' && path !== '/auth/refresh' && (await this.refreshAccessToken(usedToken))) {
+      res = await attempt()
+    }
+    const position = res.headers.get('X-Read-After')
+    if (position) this.readAfter = position
+    return res
   }
 
   private async request<T>(
@@ -542,11 +636,8 @@ class ApiClient {
       'Content-Type': 'application/json',
       ...(options.headers as Record<string, string> | undefined),
     }
-    if (this.token) {
-      headers['Authorization'] = `Bearer ${this.token}`
-    }
 
-    const res = await fetch(`${BASE_URL}${path}`, { ...options, headers })
+    const res = await this.send(path, options, headers)
     if (!res.ok) {
       const body = await res.json().catch(() => ({}))
       throw new Error(body?.detail ?? `HTTP ${res.status}`)
@@ -568,6 +659,14 @@ class ApiClient {
     return this.request<UserOut>('/auth/me')
   }
 
+  async logout(): Promise<void> {
+    try {
+      if (this.token) await this.request<void>('/auth/logout', { method: 'POST' })
+    } finally {
+      this.setTokens(null)
+    }
+  }
+
   // ── Public ────────────────────────────────────────────────────────────────
 
   async getDistricts(): Promise<DistrictOut[]> {
@@ -752,13 +851,10 @@ class ApiClient {
   async uploadAttachment(requestId: string, file: File, kind: 'before' | 'after' | 'other' = 'other'): Promise<AttachmentOut> {
     const form = new FormData()
     form.append('file', file)
-    const headers: Record<string, string> = {}
-    if (this.token) headers['Authorization'] = `Bearer ${this.token}`
-    const res = await fetch(`${BASE_URL}/admin/requests/${requestId}/attachments?kind=${kind}`, {
+    const res = await this.send(`/admin/requests/${requestId}/attachments?kind=${kind}`, {
       method: 'POST',
-      headers,
       body: form,
-    })
+    }, {})
     if (!res.ok) {
       const body = await res.json().catch(() => ({}))
       throw new Error(body?.detail ?? `HTTP ${res.status}`)
@@ -934,3 +1030,4 @@ export const api = new ApiClient()
 
 // Auto-load token from localStorage on module initialisation
 api.loadToken()
+api.syncAcrossTabs()